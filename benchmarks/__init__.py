@@ -0,0 +1,3 @@
+"""
+Solver throughput and memory benchmarks.
+"""
@@ -0,0 +1,308 @@
+"""
+Utility for benchmarking the solver throughput and memory on fixed scenarios with fixed seeds.
+
+Each scenario runs in a fresh process, so that its peak memory is measured on its own. Results are written
+as JSON and compared against a stored baseline, e.g.:
+
+    python -m benchmarks.run --output bench_output.txt --baseline benchmarks/baseline.json
+
+The stored baseline was measured on another machine, so only its histories, which do not depend on the hardware,
+fail the run when they differ; its throughput and memory are reported for reference. To check those as well,
+measure a git revision of the repository on the same machine in the same run, best of a few repeats:
+
+    python -m benchmarks.run --against HEAD~1 --repeats 3
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scenarios  # noqa: E402
+from tower_defence_solver import TowerDefenceSolver, utils, reproduction  # noqa: E402
+from tower_defence_solver.candidate import Candidate  # noqa: E402
+from tower_defence_solver.genome import PURCHASE_DTYPE, get_empty_genome, sort_genome  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Sizes of the measurements of each scenario: simulated candidates, offspring reproduced and solve parameters
+CONFIGS = {
+    "small": dict(n_candidates=100, n_offspring=2000, solve=dict(
+        epochs=5, candidate_pool=100, premature_death_reincarnation=3, survivors_per_epoch=20, weighted_by="time"
+    )),
+    "medium": dict(n_candidates=100, n_offspring=2000, solve=dict(
+        epochs=5, candidate_pool=100, premature_death_reincarnation=3, survivors_per_epoch=20, weighted_by="time"
+    )),
+    "large": dict(n_candidates=20, n_offspring=500, solve=dict(
+        epochs=2, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10, weighted_by="time"
+    )),
+    "huge": dict(n_candidates=4, n_offspring=200, solve=dict(
+        epochs=1, candidate_pool=8, premature_death_reincarnation=0, survivors_per_epoch=4, weighted_by="time"
+    )),
+}
+
+# Metrics with higher values being better, the others are better lower
+THROUGHPUTS = ("ticks_per_sec", "offspring_per_sec")
+
+
+def get_random_genomes(game: TowerDefenceSolver, n_genomes: int) -> List[np.ndarray]:
+    """
+    Random purchases lists spending about the initial gold.
+
+    :param game: instance of the solver
+    :param n_genomes: number of genomes
+    :return:
+    """
+    mean_cost = np.mean([tower["cost"] for tower in game.tower_types.values()])
+    n_purchases = max(1, int(2 * game.initial_gold / mean_cost))
+
+    genomes = []
+    for _ in range(n_genomes):
+        genome = get_empty_genome()
+        for _ in range(n_purchases):
+            purchase = utils.get_random_purchase(game, genome, np.random.randint(0, 4 * len(game.path)))
+            genome = np.append(genome, np.array([purchase], dtype=PURCHASE_DTYPE))
+        genomes.append(sort_genome(genome))
+    return genomes
+
+
+def get_peak_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def run_scenario(name: str, engine: str, seed: int, dtype: str = "float64") -> Dict:
+    """
+    Measure a single scenario.
+
+    :param name: name of the scenario
+    :param engine: engine of the solver
+    :param seed: seed of the random generator
+    :param dtype: type of the simulation state
+    :return: dictionary of the metrics
+    """
+    config = CONFIGS[name]
+    np.random.seed(seed)
+
+    start = time.perf_counter()
+    game = TowerDefenceSolver(**scenarios.SCENARIOS[name](), engine=engine, dtype=dtype)
+    setup_time = time.perf_counter() - start
+
+    candidates = [Candidate(genome, game) for genome in get_random_genomes(game, config["n_candidates"])]
+    ticks = 0
+    start = time.perf_counter()
+    for candidate in candidates:
+        while candidate.base_hp > 0:
+            candidate.simulate_step()
+            ticks += 1
+    simulation_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    offspring = reproduction.reproduction(game, candidates, config["n_offspring"], weighted_by="time")
+    reproduction_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, history = game.solve(**config["solve"])
+    solve_time = time.perf_counter() - start
+
+    return {
+        "setup_sec": setup_time,
+        "ticks": ticks,
+        "ticks_per_sec": ticks / simulation_time,
+        "offspring_per_sec": (len(offspring) - len(candidates)) / reproduction_time,
+        "epoch_sec": solve_time / config["solve"]["epochs"],
+        "peak_rss_mb": get_peak_rss_mb(),
+        "history": history,
+    }
+
+
+def run_scenario_in_process(name: str, engine: str, seed: int, dtype: str = "float64") -> Dict:
+    """
+    Measure a single scenario in a fresh process.
+
+    :param name: name of the scenario
+    :param engine: engine of the solver
+    :param seed: seed of the random generator
+    :param dtype: type of the simulation state
+    :return: dictionary of the metrics
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_scenario, (name, engine, seed, dtype))
+
+
+def run_revision(revision: str, names: List[str], engine: str, seed: int, dtype: str = "float64") -> Dict:
+    """
+    Measure scenarios on a git revision of the repository, with its own benchmarks, on this machine.
+
+    :param revision: git revision, e.g. HEAD~1, with the benchmarks already in its tree
+    :param names: names of the scenarios
+    :param engine: engine of the solver
+    :param seed: seed of the random generator
+    :param dtype: type of the simulation state
+    :return: results of the revision
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    archive = subprocess.run(["git", "archive", revision], cwd=root, check=True, capture_output=True).stdout
+    with tempfile.TemporaryDirectory() as directory:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tree:
+            tree.extractall(directory, filter="data")
+        if not os.path.exists(os.path.join(directory, "benchmarks", "run.py")):
+            raise ValueError(f"Revision '{revision}' has no benchmarks")
+
+        output = os.path.join(directory, "results.json")
+        command = [
+            sys.executable, "-m", "benchmarks.run", "--scenarios", *names, "--engine", engine, "--seed", str(seed),
+            "--output", output, "--baseline", os.path.join(directory, "no_baseline.json")
+        ]
+        # Revisions older than the dtype option measure double precision only
+        if dtype != "float64":
+            command += ["--dtype", dtype]
+        subprocess.run(command, cwd=directory, check=True)
+        with open(output) as file:
+            return json.load(file)
+
+
+def get_best(runs: List[Dict]) -> Dict:
+    """
+    Best values of the metrics of each scenario over repeated runs, which are the least disturbed by the load
+    of the machine.
+
+    :param runs: results of the scenarios of each run
+    :return: results of the scenarios
+    """
+    best = {}
+    for name, metrics in runs[0].items():
+        best[name] = dict(metrics)
+        for metric, value in metrics.items():
+            if isinstance(value, float):
+                values = [run[name][metric] for run in runs]
+                best[name][metric] = max(values) if metric in THROUGHPUTS else min(values)
+    return best
+
+
+def compare_metrics(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Metrics which got worse than the baseline by more than the tolerance.
+
+    :param results: results of the run
+    :param baseline: results of the baseline run
+    :param tolerance: allowed relative change
+    :return: list of regression descriptions
+    """
+    regressions = []
+    for name, metrics in results["scenarios"].items():
+        for metric, value in metrics.items():
+            base_value = baseline.get("scenarios", {}).get(name, {}).get(metric)
+            if not isinstance(value, float) or not base_value:
+                continue
+
+            change = value / base_value - 1
+            if metric in THROUGHPUTS:
+                worse = change < -tolerance
+            else:
+                worse = change > tolerance
+            if worse:
+                regressions.append(f"{name}.{metric}: {base_value:.4g} -> {value:.4g} ({change:+.1%})")
+
+    return regressions
+
+
+def compare_histories(results: Dict, baseline: Dict) -> List[str]:
+    """
+    Scenarios whose histories differ from the baseline.
+
+    :param results: results of the run
+    :param baseline: results of the baseline run
+    :return: list of difference descriptions
+    """
+    return [
+        f"{name}.history differs from the baseline" for name, metrics in results["scenarios"].items()
+        if baseline.get("scenarios", {}).get(name, {}).get("history") not in (None, metrics["history"])
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the solver throughput and memory.")
+    parser.add_argument("--scenarios", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--engine", default="path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dtype", default="float64", help="type of the simulation state")
+    parser.add_argument("--output", help="file to write the JSON results to, standard output if not given")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON results to compare the histories against")
+    parser.add_argument("--against", help="git revision to measure on this machine and compare the metrics against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change of the metrics")
+    parser.add_argument("--repeats", type=int, default=1, help="runs of each scenario, the best values are kept")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = {
+        "engine": args.engine,
+        "seed": args.seed,
+        "dtype": args.dtype,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "scenarios": {},
+    }
+    # Runs of this tree and of the revision alternate, so that both face the same load of the machine
+    runs, revision_runs = [], []
+    for _ in range(args.repeats):
+        scenario_results = {}
+        for name in args.scenarios:
+            scenario_results[name] = run_scenario_in_process(name, args.engine, args.seed, args.dtype)
+            print(f"{name}: {json.dumps(scenario_results[name])}", file=sys.stderr)
+        runs.append(scenario_results)
+        if args.against:
+            revision_runs.append(
+                run_revision(args.against, args.scenarios, args.engine, args.seed, args.dtype)["scenarios"]
+            )
+    results["scenarios"] = get_best(runs)
+
+    regressions, notes = [], []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions += compare_histories(results, baseline)
+        # Measured on another machine, the metrics are reported only
+        notes += [
+            f"{change} against the stored baseline" for change in compare_metrics(results, baseline, args.tolerance)
+        ]
+    if args.against:
+        results["against"] = dict(revision=args.against, scenarios=get_best(revision_runs))
+        regressions += compare_metrics(results, results["against"], args.tolerance)
+    results["regressions"] = regressions
+    results["notes"] = notes
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, mode="w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.baseline, mode="w") as file:
+            file.write(output + "\n")
+
+    for note in notes:
+        print(f"Note: {note}", file=sys.stderr)
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,6 +26,11 @@ def spawn4(iteration: int) -> int:
     return int(np.abs(np.random.normal(15 * iteration, 20)))
 
 
+# All the candidates of an epoch face the same realization of these
+spawn3.stochastic = True
+spawn4.stochastic = True
+
+
 def spawn5(iteration: int) -> int:
     """Custom spawning function"""
     return int(np.sqrt(100 * iteration))
@@ -4,6 +4,7 @@ Utility for plotting the improvements over number of epochs.
 import sys
 import numpy as np
 import matplotlib.pyplot as plt
+from tower_defence_solver.results import ResultsStore, aggregate, read_text_histories
 
 
 if __name__ == "__main__":
@@ -18,23 +19,21 @@ if __name__ == "__main__":
         plt.ylabel("Minimalna liczba przeżytych kwantów czasu ocaleńców", fontsize=18)
         plt.xticks(fontsize=18)
         plt.yticks(fontsize=18)
-        ys = []
-        I_FROM = 0
+        if filepath.endswith(".txt"):
+            ys = read_text_histories(filepath)
+        else:
+            # Results store, given with or without the extension of its data file
+            ys = ResultsStore(filepath[:-4] if filepath.endswith(".bin") else filepath).get_histories()
+        summary = aggregate(ys)
 
-        with open(filepath, mode="r") as file:
-            for line in file:
-                y = np.array(line.split(), dtype="int")
-                ys += [y]
+        x = np.arange(ys.shape[1])
+        for y in ys:
+            plt.plot(x, y, linewidth=0.5, color="g")
 
-                x = np.arange(I_FROM, I_FROM + len(y))
-                plt.plot(x, y, linewidth=0.5, color="g")
-
-        plt.plot(x, np.mean(np.array(ys), axis=0), color="r")
-        plt.errorbar(
-            x, np.mean(np.array(ys), axis=0), np.std(np.array(ys), axis=0), fmt="o", capsize=5, color="r", linewidth=0.5
-        )
+        plt.plot(x, summary["mean"], color="r")
+        plt.errorbar(x, summary["mean"], summary["std"], fmt="o", capsize=5, color="r", linewidth=0.5)
         plt.grid(axis="y")
         plt.tight_layout()
         plt.savefig("lifespans/" + filepath[:-4].split('\\')[1] + ".png")
 
-        print("Mean result: {:.3f} (std. {:.3f})".format(np.mean(np.array(ys), axis=0)[-1], np.std(np.array(ys), axis=0)[-1]))
+        print("Mean result: {:.3f} (std. {:.3f})".format(summary["mean"][-1], summary["std"][-1]))
@@ -0,0 +1,211 @@
+"""
+Utility for running sweeps of solver experiments.
+
+A sweep spec is a JSON file naming a scenario of scenarios.py, fixed parameters of the solver constructor and of
+solve, a grid of parameters (of either of them) to try all the combinations of, and the number of repetitions:
+
+    {
+        "name": "population",
+        "scenario": "medium",
+        "game": {"binary_op_prob": 0.6},
+        "solve": {"epochs": 20, "premature_death_reincarnation": 3, "weighted_by": "time"},
+        "grid": {"candidate_pool": [50, 100, 200], "survivors_per_epoch": [10, 20]},
+        "repetitions": 10,
+        "seed": 0
+    }
+
+    python main.py population.json --results results --workers 4
+
+Each job writes <results>/<name>/jobs/<job>.json with its parameters, seed, history and best purchases; jobs whose
+file exists are skipped, so an interrupted sweep is continued by running it again. The identifier of a job hashes
+its scenario, parameters and seed, so the jobs affected by a change of the spec are run again. Histories of all the
+jobs are gathered in the results store <results>/<name>/histories, with the grid point of each run in its metadata,
+which improvement_plot.py reads. Repetitions with the same number share the seed across the grid points.
+"""
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from typing import List, Dict, Optional
+
+import scenarios
+from tower_defence_solver import TowerDefenceSolver
+from tower_defence_solver.genome import to_purchases
+from tower_defence_solver.results import ResultsStore
+
+# Jobs take the best candidate and the history only
+SOLVE_PARAMETERS = set(inspect.signature(TowerDefenceSolver.solve).parameters) - {"self", "return_archive"}
+
+
+def get_jobs(spec: Dict) -> List[Dict]:
+    """
+    Jobs of a sweep, one for each combination of the grid values and repetition.
+
+    :param spec: sweep spec
+    :return: list of jobs with their constructor and solve parameters, seed and identifiers
+    """
+    grid = spec.get("grid", {})
+    names = sorted(grid)
+    jobs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        point = dict(zip(names, values))
+        point_id = "_".join(f"{name}={value}" for name, value in point.items()) or "default"
+
+        game_params = dict(spec.get("game", {}))
+        solve_params = dict(spec.get("solve", {}))
+        for name, value in point.items():
+            (solve_params if name in SOLVE_PARAMETERS else game_params)[name] = value
+
+        for repetition in range(spec.get("repetitions", 1)):
+            seed = spec.get("seed", 0) + repetition
+            # Everything the result depends on, so that changing the spec never reuses a stale result
+            digest = hashlib.sha1(json.dumps(
+                dict(scenario=spec["scenario"], game=game_params, solve=solve_params, seed=seed), sort_keys=True
+            ).encode()).hexdigest()[:12]
+            jobs.append(dict(
+                sweep=spec["name"],
+                scenario=spec["scenario"],
+                point=point,
+                point_id=point_id,
+                repetition=repetition,
+                job_id=f"{repetition:03}_{digest}",
+                seed=seed,
+                game=game_params,
+                solve=solve_params,
+            ))
+    return jobs
+
+
+def write_json(path: str, data: Dict) -> None:
+    """
+    Write a JSON file atomically, so that an interrupted job never leaves its output behind.
+
+    :param path: path of the file
+    :param data: content
+    :return:
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, mode="w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(temporary_path, path)
+
+
+def run_job(job: Dict, jobs_dir: str) -> str:
+    """
+    Run a single job and write its result.
+
+    :param job: job of a sweep
+    :param jobs_dir: directory of the job results
+    :return: identifier of the job
+    """
+    np.random.seed(job["seed"])
+    game = TowerDefenceSolver(**dict(scenarios.SCENARIOS[job["scenario"]](), **job["game"]))
+
+    start = time.perf_counter()
+    solution, history = game.solve(**job["solve"])
+    elapsed = time.perf_counter() - start
+
+    write_json(os.path.join(jobs_dir, job["job_id"] + ".json"), dict(
+        job,
+        history=history,
+        best_time=solution.time if solution is not None else None,
+        best_purchases=[
+            {"time": purchase["time"], "coords": list(purchase["coords"]), "type": purchase["type"]}
+            for purchase in to_purchases(solution.genome)
+        ] if solution is not None else None,
+        elapsed=elapsed,
+    ))
+    return job["job_id"]
+
+
+def run_job_star(args) -> str:
+    """Run a job given as a tuple of the arguments of run_job, for the pool"""
+    return run_job(*args)
+
+
+def gather_histories(jobs: List[Dict], sweep_dir: str) -> ResultsStore:
+    """
+    Gather the histories of the finished jobs in the results store of the sweep, written anew.
+
+    :param jobs: jobs of the sweep
+    :param sweep_dir: directory of the sweep results
+    :return:
+    """
+    store_path = os.path.join(sweep_dir, "histories")
+    for extension in (".bin", ".index.jsonl", ".maps.bin"):
+        if os.path.exists(store_path + extension):
+            os.remove(store_path + extension)
+
+    store = ResultsStore(store_path)
+    for job in jobs:
+        path = os.path.join(sweep_dir, "jobs", job["job_id"] + ".json")
+        if os.path.exists(path):
+            with open(path) as file:
+                result = json.load(file)
+            store.append_run(
+                [int(score) for score in result["history"]],
+                dict(job["point"], point_id=job["point_id"], repetition=job["repetition"], seed=job["seed"],
+                     job_id=job["job_id"])
+            )
+    return store
+
+
+def run_sweep(spec: Dict, results_dir: str, workers: Optional[int] = None) -> List[str]:
+    """
+    Run the jobs of a sweep which have no results yet, in parallel.
+
+    :param spec: sweep spec
+    :param results_dir: directory of the results of all the sweeps
+    :param workers: number of processes, all the CPUs if None
+    :return: identifiers of the jobs run
+    """
+    if spec["scenario"] not in scenarios.SCENARIOS:
+        raise ValueError(f"Unknown scenario '{spec['scenario']}', expected one of {list(scenarios.SCENARIOS)}")
+
+    sweep_dir = os.path.join(results_dir, spec["name"])
+    jobs_dir = os.path.join(sweep_dir, "jobs")
+    os.makedirs(jobs_dir, exist_ok=True)
+
+    jobs = get_jobs(spec)
+    to_run = [job for job in jobs if not os.path.exists(os.path.join(jobs_dir, job["job_id"] + ".json"))]
+    print(f"{spec['name']}: {len(jobs) - len(to_run)} of {len(jobs)} jobs done, running {len(to_run)}")
+
+    finished = []
+    workers = min(workers or os.cpu_count() or 1, max(len(to_run), 1))
+    if workers == 1:
+        for job in to_run:
+            finished.append(run_job(job, jobs_dir))
+            print(f"[{len(finished):4}/{len(to_run)}] {finished[-1]}")
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for job_id in pool.imap_unordered(run_job_star, [(job, jobs_dir) for job in to_run]):
+                finished.append(job_id)
+                print(f"[{len(finished):4}/{len(to_run)}] {job_id}")
+
+    gather_histories(jobs, sweep_dir)
+    return finished
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a sweep of solver experiments.")
+    parser.add_argument("spec", help="JSON file of the sweep spec")
+    parser.add_argument("--results", default="results", help="directory of the results")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all the CPUs by default")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as file:
+        spec = json.load(file)
+    spec.setdefault("name", os.path.splitext(os.path.basename(args.spec))[0])
+
+    run_sweep(spec, args.results, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
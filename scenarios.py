@@ -0,0 +1,98 @@
+"""
+Utility for game scenarios shared by the tests and benchmarks
+"""
+import numpy as np
+from scipy.signal import convolve2d
+import enemy_health_functions as enemy
+from typing import List, Tuple, Dict
+
+TOWER_TYPES = {
+    0: {"dmg": 5 * np.ones((3, 3)), "cost": 200},
+    1: {"dmg": 15 * np.ones((3, 3)), "cost": 700},
+    2: {"dmg": 40 * np.ones((3, 3)), "cost": 2000},
+    3: {"dmg": 10 * np.ones((5, 5)), "cost": 500},
+    4: {"dmg": 18 * np.ones((5, 5)), "cost": 1200},
+    5: {"dmg": 25 * np.ones((5, 5)), "cost": 2000},
+    6: {"dmg": 10 * (convolve2d(np.ones((5, 5)), np.ones((3, 3)), "same") < 9), "cost": 700},
+    7: {"dmg": 20 * (convolve2d(np.ones((5, 5)), np.ones((3, 3)), "same") < 9), "cost": 1900},
+    8: {"dmg": 35 * (convolve2d(np.ones((5, 5)), np.ones((3, 3)), "same") < 9), "cost": 4000},
+    9: {"dmg": 15 * (convolve2d(np.ones((7, 7)), np.ones((3, 3)), "same") < 9), "cost": 2000},
+    10: {"dmg": 25 * (convolve2d(np.ones((7, 7)), np.ones((3, 3)), "same") < 9), "cost": 4200},
+    11: {"dmg": 40 * (convolve2d(np.ones((7, 7)), np.ones((3, 3)), "same") < 9), "cost": 6800},
+}
+
+SMALL_PATH = [(1, 8), (1, 7), (1, 6), (1, 5), (1, 4), (2, 4), (3, 4), (4, 4), (4, 3), (4, 2), (4, 1), (4, 0)]
+
+MEDIUM_PATH = [(13, 13), (13, 12), (13, 11), (13, 10), (13, 9), (13, 8), (12, 8), (12, 7), (12, 6), (12, 5),
+               (12, 4), (12, 3), (12, 2), (11, 2), (10, 2), (10, 3), (10, 4), (9, 4), (8, 4), (7, 4), (6, 4),
+               (6, 5), (6, 6), (7, 6), (7, 7), (7, 8), (8, 8), (9, 8), (10, 8), (10, 9), (10, 10), (10, 11),
+               (10, 12), (9, 12), (8, 12), (8, 11), (7, 11), (6, 11), (6, 12), (5, 12), (4, 12), (4, 11),
+               (4, 10), (4, 9), (4, 8), (4, 7), (4, 6), (3, 6), (3, 5), (3, 4), (4, 4), (4, 3), (4, 2),
+               (5, 2), (6, 2), (7, 2), (7, 1), (7, 0)]
+
+
+def get_snake_path(map_width: int, map_height: int, length: int, spacing: int = 6) -> List[Tuple[int, int]]:
+    """
+    Path winding through the map in horizontal runs connected at the map edges.
+
+    :param map_width: Width of the map.
+    :param map_height: Height of the map.
+    :param length: number of cells of the path, at most what fits in the map
+    :param spacing: number of rows between the horizontal runs
+    :return:
+    """
+    path = []
+    for k, row in enumerate(range(1, map_height - 1, spacing)):
+        cols = range(1, map_width - 1) if k % 2 == 0 else range(map_width - 2, 0, -1)
+        path += [(row, col) for col in cols]
+        if row + spacing < map_height - 1:
+            path += [(row + step, path[-1][1]) for step in range(1, spacing)]
+
+    if len(path) < length:
+        raise ValueError(f"Path of {length} cells does not fit in a {map_width}x{map_height} map")
+
+    return path[:length]
+
+
+def get_small_scenario() -> Dict:
+    """Scenario of the 9x8 map"""
+    return dict(
+        map_width=9, map_height=8, path=SMALL_PATH, tower_types=TOWER_TYPES, enemy_spawning_function=enemy.spawn1,
+        initial_hp=100, initial_gold=2000, binary_op_prob=0.4,
+        unary_ops_prob_distribution=[0.8, 0.06, 0.07, 0.07, 0.0], dmg_to_gold_factor=1.0
+    )
+
+
+def get_medium_scenario() -> Dict:
+    """Scenario of the 14x16 map"""
+    return dict(
+        map_width=14, map_height=16, path=MEDIUM_PATH, tower_types=TOWER_TYPES, enemy_spawning_function=enemy.spawn1,
+        initial_hp=100, initial_gold=2000, binary_op_prob=0.6,
+        unary_ops_prob_distribution=[0.76, 0.05, 0.06, 0.06, 0.07], dmg_to_gold_factor=0.2
+    )
+
+
+def get_large_scenario() -> Dict:
+    """Scenario of a generated 100x100 map with a path of 1000 cells"""
+    return dict(
+        map_width=100, map_height=100, path=get_snake_path(100, 100, 1000), tower_types=TOWER_TYPES,
+        enemy_spawning_function=enemy.spawn5, initial_hp=3000, initial_gold=4000, binary_op_prob=0.6,
+        unary_ops_prob_distribution=[0.76, 0.05, 0.06, 0.06, 0.07], dmg_to_gold_factor=0.2
+    )
+
+
+def get_huge_scenario() -> Dict:
+    """Scenario of a generated 500x500 map with a path of 5000 cells"""
+    return dict(
+        map_width=500, map_height=500, path=get_snake_path(500, 500, 5000, spacing=10), tower_types=TOWER_TYPES,
+        enemy_spawning_function=enemy.spawn5, initial_hp=10000, initial_gold=6000, binary_op_prob=0.6,
+        unary_ops_prob_distribution=[0.76, 0.05, 0.06, 0.06, 0.07], dmg_to_gold_factor=0.2
+    )
+
+
+SCENARIOS = {
+    "small": get_small_scenario,
+    "medium": get_medium_scenario,
+    "large": get_large_scenario,
+    "huge": get_huge_scenario,
+}
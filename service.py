@@ -0,0 +1,322 @@
+"""
+Utility for running the solver as a long-running local service.
+
+The service keeps a pool of worker processes with NumPy and the solver imported, and each worker keeps the solvers
+of the scenarios it has solved recently, so that their precomputation (influence index, spawn table, fitness cache)
+is reused by later requests of the same scenario. A request is a JSON object with a scenario, parameters of solve
+and a seed:
+
+    {
+        "scenario": {
+            "map_width": 9, "map_height": 8, "path": [[1, 8], [1, 7], ...],
+            "tower_types": {"0": {"dmg": [[5, 5, 5], [5, 5, 5], [5, 5, 5]], "cost": 200}, ...},
+            "enemy_spawning_function": "spawn1", "initial_hp": 100, "initial_gold": 2000, "engine": "path"
+        },
+        "solve": {"epochs": 20, "candidate_pool": 50, "survivors_per_epoch": 10},
+        "seed": 0
+    }
+
+POST /solve streams the response as JSON lines: one {"type": "epoch", ...} line with the record of each epoch,
+then a {"type": "result", ...} line with the best solution, or an {"type": "error", ...} line. GET /health reports
+the number of workers.
+
+    python service.py serve --port 8765 --workers 4
+    python service.py solve small --url http://127.0.0.1:8765 --solve '{"epochs": 20}' --seed 0
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import urllib.error
+import urllib.request
+import numpy as np
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, List
+
+import enemy_health_functions as enemy
+import scenarios
+from tower_defence_solver import TowerDefenceSolver
+from tower_defence_solver.genome import to_purchases
+from tower_defence_solver.telemetry import EpochRecord, log_epoch
+
+GAME_PARAMETERS = set(inspect.signature(TowerDefenceSolver.__init__).parameters) - {"self", "profiler"}
+REQUIRED_GAME_PARAMETERS = {
+    "map_width", "map_height", "path", "tower_types", "enemy_spawning_function", "initial_hp", "initial_gold"
+}
+# Worker processes cannot start processes of their own, checkpoints and callables do not fit a request
+SOLVE_PARAMETERS = set(inspect.signature(TowerDefenceSolver.solve_iter).parameters) - {
+    "self", "workers", "migration", "checkpoint", "checkpoint_interval", "resume"
+}
+GAME_CACHE_SIZE = 16
+
+# Solvers of the recently solved scenarios of a worker process, by the hash of the scenario
+games = OrderedDict()
+
+
+def get_game_params(scenario: Dict) -> Dict:
+    """
+    Parameters of the solver constructor of a scenario given as JSON.
+
+    :param scenario: scenario with the spawning function given by its name in enemy_health_functions
+    :return:
+    """
+    unknown = set(scenario) - GAME_PARAMETERS
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters {sorted(unknown)}")
+    missing = REQUIRED_GAME_PARAMETERS - set(scenario)
+    if missing:
+        raise ValueError(f"Missing scenario parameters {sorted(missing)}")
+
+    name = scenario["enemy_spawning_function"]
+    if not name.startswith("spawn") or not callable(getattr(enemy, name, None)):
+        raise ValueError(f"Unknown spawning function '{name}'")
+
+    return dict(
+        scenario,
+        path=[tuple(cell) for cell in scenario["path"]],
+        tower_types={
+            int(tower_id): {"dmg": np.array(tower["dmg"], dtype=float), "cost": tower["cost"]}
+            for tower_id, tower in scenario["tower_types"].items()
+        },
+        enemy_spawning_function=getattr(enemy, name),
+    )
+
+
+def get_scenario_spec(game_params: Dict) -> Dict:
+    """
+    Scenario as JSON, e.g. of scenarios.py, the inverse of get_game_params.
+
+    :param game_params: parameters of the solver constructor
+    :return:
+    """
+    return dict(
+        game_params,
+        path=[list(cell) for cell in game_params["path"]],
+        tower_types={
+            str(tower_id): {"dmg": np.asarray(tower["dmg"]).tolist(), "cost": tower["cost"]}
+            for tower_id, tower in game_params["tower_types"].items()
+        },
+        enemy_spawning_function=game_params["enemy_spawning_function"].__name__,
+    )
+
+
+def get_game(scenario: Dict) -> TowerDefenceSolver:
+    """
+    Solver of a scenario, reused if the worker has solved the scenario recently. Solvers with adaptive operator
+    selection are not reused, as what they have learned would change the results of the next request. Solvers with
+    a random spawning function are, as their spawn table draws each realization anew from the seeded generator.
+
+    :param scenario: scenario given as JSON
+    :return:
+    """
+    key = hashlib.sha1(json.dumps(scenario, sort_keys=True).encode()).hexdigest()
+    if key in games:
+        games.move_to_end(key)
+        return games[key]
+
+    game = TowerDefenceSolver(**get_game_params(scenario))
+    if game.operator_bandit is None:
+        games[key] = game
+        if len(games) > GAME_CACHE_SIZE:
+            games.popitem(last=False)
+    return game
+
+
+def run_request(request: Dict, progress, cancelled) -> None:
+    """
+    Solve a request in a worker process, putting the messages of its progress to the queue.
+
+    :param request: request of the service
+    :param progress: queue of the messages
+    :param cancelled: event set once the client is gone, solving stops at the end of the epoch then
+    :return:
+    """
+    try:
+        game = get_game(request["scenario"])
+        np.random.seed(request.get("seed"))
+
+        record = None
+        history = []
+        for record in game.solve_iter(**request.get("solve", {})):
+            history.append(record.all_time_high)
+            progress.put(dict(record.to_dict(), type="epoch"))
+            if cancelled.is_set():
+                break
+
+        solution = record.best_candidate if record is not None else None
+        progress.put(dict(
+            type="result",
+            history=history,
+            best_time=solution.time if solution is not None else None,
+            best_purchases=[
+                {"time": purchase["time"], "coords": list(purchase["coords"]), "type": purchase["type"]}
+                for purchase in to_purchases(solution.genome)
+            ] if solution is not None else None,
+        ))
+    except Exception as error:
+        progress.put(dict(type="error", error=f"{type(error).__name__}: {error}"))
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server: "SolverService"
+
+    def send_json(self, status: int, data: Dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+            return
+        self.send_json(200, {"status": "ok", "workers": self.server.workers})
+
+    def do_POST(self) -> None:
+        if self.path != "/solve":
+            self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            get_game_params(request["scenario"])
+            unknown = set(request.get("solve", {})) - SOLVE_PARAMETERS
+            if unknown:
+                raise ValueError(f"Unknown solve parameters {sorted(unknown)}")
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self.send_json(400, {"error": f"{type(error).__name__}: {error}"})
+            return
+
+        progress = self.server.manager.Queue()
+        cancelled = self.server.manager.Event()
+        result = self.server.pool.apply_async(run_request, (request, progress, cancelled))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            while True:
+                try:
+                    message = progress.get(timeout=1.0)
+                except queue.Empty:
+                    if result.ready() and progress.empty():
+                        message = dict(type="error", error="Worker exited without a result")
+                    else:
+                        continue
+                self.wfile.write((json.dumps(message) + "\n").encode())
+                self.wfile.flush()
+                if message["type"] != "epoch":
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            cancelled.set()
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SolverService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, workers: Optional[int] = None,
+                 verbose: bool = True) -> None:
+        """
+        HTTP server of the solver, handling each request in a thread waiting for a worker of the pool.
+
+        :param host: address to listen on
+        :param port: port to listen on, any free one if 0
+        :param workers: number of worker processes, all the CPUs if None
+        :param verbose: log the requests
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.verbose = verbose
+        self.manager = multiprocessing.Manager()
+        self.pool = multiprocessing.Pool(self.workers)
+        super().__init__((host, port), ServiceHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
+        self.manager.shutdown()
+
+
+def solve(url: str, scenario: Dict, solve_params: Optional[Dict] = None, seed: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Client of the service: solve a scenario, yielding the messages of the progress as they arrive.
+
+    :param url: address of the service, e.g. http://127.0.0.1:8765
+    :param scenario: scenario given as JSON, see get_scenario_spec
+    :param solve_params: parameters of solve
+    :param seed: seed of the random generator, drawn from the system if None
+    :return:
+    :raises ValueError: if the service rejects the request
+    :raises RuntimeError: if solving fails
+    """
+    request = urllib.request.Request(
+        url.rstrip("/") + "/solve",
+        data=json.dumps(dict(scenario=scenario, solve=solve_params or {}, seed=seed)).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        response = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as error:
+        raise ValueError(json.loads(error.read()).get("error", str(error))) from None
+
+    with response:
+        for line in response:
+            message = json.loads(line)
+            if message["type"] == "error":
+                raise RuntimeError(message["error"])
+            yield message
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the solver as a local service, or solve with it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the service")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    serve_parser.add_argument("--workers", type=int, default=None, help="number of processes, all the CPUs by default")
+
+    solve_parser = commands.add_parser("solve", help="solve a scenario with a running service")
+    solve_parser.add_argument("scenario", help=f"one of {list(scenarios.SCENARIOS)} or a JSON file of a scenario")
+    solve_parser.add_argument("--url", default="http://127.0.0.1:8765", help="address of the service")
+    solve_parser.add_argument("--solve", default="{}", help="parameters of solve as JSON")
+    solve_parser.add_argument("--seed", type=int, default=None, help="seed of the random generator")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        with SolverService(args.host, args.port, args.workers) as service:
+            print(f"Serving on http://{args.host}:{service.server_address[1]} with {service.workers} workers")
+            try:
+                service.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    if args.scenario in scenarios.SCENARIOS:
+        scenario = get_scenario_spec(scenarios.SCENARIOS[args.scenario]())
+    else:
+        with open(args.scenario) as file:
+            scenario = json.load(file)
+
+    for message in solve(args.url, scenario, json.loads(args.solve), args.seed):
+        if message["type"] == "epoch":
+            log_epoch(EpochRecord(**{name: value for name, value in message.items() if name != "type"}))
+        else:
+            print(f"Best time: {message['best_time']}")
+            print(json.dumps(message["best_purchases"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
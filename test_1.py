@@ -5,6 +5,7 @@ import unittest
 import numpy as np
 from scipy.signal import convolve2d
 from tower_defence_solver import TowerDefenceSolver
+from tower_defence_solver.telemetry import log_epoch
 import enemy_health_functions as enemy
 
 
@@ -45,14 +46,16 @@ class TestTDSolver(unittest.TestCase):
             binary_op_prob=0.4,
             unary_ops_prob_distribution=[0.8, 0.06, 0.07, 0.07, 0.0],
             binary_ops_prob_distribution=None,
-            dmg_to_gold_factor=1.0
+            dmg_to_gold_factor=1.0,
+            record_delays=True
         )
         solution, history = game.solve(
             epochs=20,
             candidate_pool=100,
             premature_death_reincarnation=3,
             survivors_per_epoch=20,
-            weighted_by='time'
+            weighted_by='time',
+            callback=log_epoch
         )
         print(solution)
 
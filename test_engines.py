@@ -0,0 +1,826 @@
+"""
+Testing utility.
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from scipy.signal import convolve2d
+from tower_defence_solver import TowerDefenceSolver, utils, reproduction
+from tower_defence_solver.candidate import Candidate
+from tower_defence_solver.batch import BatchSimulator
+from tower_defence_solver.cache import FitnessCache, Fitness
+from tower_defence_solver.spawns import SpawnTable
+from tower_defence_solver.profiler import Profiler
+from tower_defence_solver.telemetry import EpochRecord, JsonLinesLog
+from tower_defence_solver.checkpoint import load_checkpoint
+from tower_defence_solver.adaptive import OperatorBandit
+from tower_defence_solver.archive import EliteArchive
+from tower_defence_solver.results import ResultsStore, aggregate, read_text_histories
+from tower_defence_solver.genome import (
+    PURCHASE_DTYPE, get_empty_genome, get_occupancy, sort_genome, to_genome, to_purchases
+)
+import enemy_health_functions as enemy
+import scenarios
+import main
+import service
+
+
+class TestEngines(unittest.TestCase):
+    """
+    Simulation engines TestCase.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.path = [(13, 13), (13, 12), (13, 11), (13, 10), (13, 9), (13, 8), (12, 8), (12, 7), (12, 6), (12, 5),
+                    (12, 4), (12, 3), (12, 2), (11, 2), (10, 2), (10, 3), (10, 4), (9, 4), (8, 4), (7, 4), (6, 4),
+                    (6, 5), (6, 6), (7, 6), (7, 7), (7, 8), (8, 8), (9, 8), (10, 8), (10, 9), (10, 10), (10, 11),
+                    (10, 12), (9, 12), (8, 12), (8, 11), (7, 11), (6, 11), (6, 12), (5, 12), (4, 12), (4, 11),
+                    (4, 10), (4, 9), (4, 8), (4, 7), (4, 6), (3, 6), (3, 5), (3, 4), (4, 4), (4, 3), (4, 2),
+                    (5, 2), (6, 2), (7, 2), (7, 1), (7, 0)]
+        cls.tower_types = {
+            0: {"dmg": 5 * np.ones((3, 3)), "cost": 200},
+            1: {"dmg": 15 * np.ones((3, 3)), "cost": 700},
+            2: {"dmg": 10 * np.ones((5, 5)), "cost": 500},
+            3: {"dmg": 20 * (convolve2d(np.ones((5, 5)), np.ones((3, 3)), "same") < 9), "cost": 1900},
+            4: {"dmg": 15 * (convolve2d(np.ones((7, 7)), np.ones((3, 3)), "same") < 9), "cost": 2000},
+        }
+
+    def get_game(self, engine: str, **kwargs) -> TowerDefenceSolver:
+        return TowerDefenceSolver(
+            map_width=14,
+            map_height=16,
+            path=self.path,
+            tower_types=self.tower_types,
+            enemy_spawning_function=enemy.spawn2,
+            initial_hp=100,
+            initial_gold=2000,
+            dmg_to_gold_factor=0.2,
+            engine=engine,
+            **kwargs
+        )
+
+    def get_random_schedules(self, game: TowerDefenceSolver, n_schedules: int):
+        np.random.seed(0)
+        schedules = []
+        for _ in range(n_schedules):
+            purchases = get_empty_genome()
+            for _ in range(np.random.randint(1, 12)):
+                purchase = utils.get_random_purchase(game, purchases, np.random.randint(0, 40))
+                purchases = np.append(purchases, np.array([purchase], dtype=PURCHASE_DTYPE))
+                # Some purchases rebuy an already occupied spot
+                if np.random.rand() < 0.2:
+                    rebuy = purchases[np.random.choice(len(purchases))].copy()
+                    rebuy["time"] += np.random.randint(1, 20)
+                    purchases = np.append(purchases, rebuy)
+            schedules.append(sort_genome(purchases))
+        return schedules
+
+    @staticmethod
+    def run_to_death(candidate: Candidate) -> Candidate:
+        while candidate.base_hp > 0:
+            candidate.simulate_step()
+        return candidate
+
+    def test_path_engine_matches_map_engine(self):
+        """Path-space engine gives the same survival times as the map engine"""
+        map_game, path_game = self.get_game("map"), self.get_game("path")
+
+        for purchases in self.get_random_schedules(map_game, 30):
+            on_map = self.run_to_death(Candidate(purchases, map_game))
+            on_path = self.run_to_death(Candidate(purchases, path_game))
+
+            self.assertEqual(on_map.time, on_path.time)
+            self.assertEqual(on_map.gold, on_path.gold)
+            self.assertEqual(on_map.base_hp, on_path.base_hp)
+            np.testing.assert_array_equal(on_map.opponent_hp[path_game.path_rows, path_game.path_cols],
+                                          on_path.opponent_hp)
+            np.testing.assert_array_equal(on_map.dmg_map, on_path.get_dmg_map())
+
+    def test_batch_engine_matches_path_engine(self):
+        """Population-batched simulation gives the same survival times as simulating one by one"""
+        path_game, batch_game = self.get_game("path"), self.get_game("batch")
+        schedules = self.get_random_schedules(path_game, 30)
+
+        one_by_one = [self.run_to_death(Candidate(purchases, path_game)) for purchases in schedules]
+        batched = [Candidate(purchases, batch_game) for purchases in schedules]
+        BatchSimulator(batch_game, batched).run_to_death()
+
+        for on_path, in_batch in zip(one_by_one, batched):
+            self.assertEqual(on_path.time, in_batch.time)
+            self.assertEqual(on_path.gold, in_batch.gold)
+            self.assertEqual(on_path.base_hp, in_batch.base_hp)
+            self.assertEqual(on_path.purchases, in_batch.purchases)
+            self.assertEqual(on_path.bought_purchases, in_batch.bought_purchases)
+            np.testing.assert_array_equal(on_path.opponent_hp, in_batch.opponent_hp)
+            np.testing.assert_array_equal(on_path.dmg_map, in_batch.dmg_map)
+
+    def test_fast_forward_matches_simulation(self):
+        """Death time computed directly once purchases are exhausted matches the step by step simulation"""
+        for engine in ("map", "path"):
+            game = self.get_game(engine)
+            for purchases in self.get_random_schedules(game, 30):
+                simulated = Candidate(purchases, game)
+                fast_forwarded = Candidate(purchases, game)
+
+                self.run_to_death(simulated)
+                fast_forwarded.simulate_until_death(fast_forward=True)
+
+                self.assertEqual(simulated.time, fast_forwarded.time)
+                self.assertEqual(simulated.base_hp, fast_forwarded.base_hp)
+                self.assertAlmostEqual(simulated.gold, fast_forwarded.gold)
+                np.testing.assert_array_equal(simulated.opponent_hp, fast_forwarded.opponent_hp)
+
+    def test_snapshot_reuse_matches_simulation(self):
+        """Offspring resumed from their parent's snapshots survive as long as when simulated from the beginning"""
+        for engine in ("map", "path", "batch"):
+            game = self.get_game(engine)
+            for purchases in self.get_random_schedules(game, 20):
+                parent = Candidate(purchases, game, record_snapshots=True)
+                parent.simulate_until_death()
+
+                offspring = [parent] + [operator(game, parent) for operator in reproduction.UNARY_REPRODUCTION]
+                offspring = [candidate for candidate in offspring if candidate is not None]
+                # Offspring of offspring not simulated yet share their grandparent's snapshots
+                offspring += [reproduction.time_translation(game, candidate) for candidate in offspring[1:]]
+                offspring = [candidate for candidate in offspring if candidate is not None]
+
+                for candidate in offspring:
+                    candidate.refresh(reuse_snapshots=True)
+                if engine == "batch":
+                    BatchSimulator(game, offspring).run_to_death()
+                else:
+                    for candidate in offspring:
+                        candidate.simulate_until_death()
+
+                for candidate in offspring:
+                    simulated = Candidate(candidate.genome, game)
+                    simulated.simulate_until_death()
+
+                    self.assertEqual(simulated.time, candidate.time)
+                    self.assertEqual(simulated.gold, candidate.gold)
+                    self.assertEqual(simulated.base_hp, candidate.base_hp)
+                    self.assertEqual(simulated.bought_purchases, candidate.bought_purchases)
+                    np.testing.assert_array_equal(simulated.opponent_hp, candidate.opponent_hp)
+                    np.testing.assert_array_equal(simulated.dmg_map, candidate.dmg_map)
+
+    def test_path_space_solve(self):
+        """Solving with the path-space engines"""
+        for engine in ("path", "batch"):
+            np.random.seed(0)
+            solution, history = self.get_game(engine).solve(
+                epochs=3, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10,
+                weighted_by="time"
+            )
+            self.assertEqual(len(history), 3)
+            self.assertEqual(int(history[-1]), solution.time)
+
+            np.random.seed(0)
+            _, fast_forwarded_history = self.get_game(engine).solve(
+                epochs=3, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10,
+                weighted_by="time", fast_forward=True
+            )
+            self.assertEqual(history, fast_forwarded_history)
+
+            np.random.seed(0)
+            _, resumed_history = self.get_game(engine).solve(
+                epochs=3, candidate_pool=30, premature_death_reincarnation=0, survivors_per_epoch=10,
+                weighted_by="time", reuse_snapshots=True
+            )
+            np.random.seed(0)
+            _, simulated_history = self.get_game(engine).solve(
+                epochs=3, candidate_pool=30, premature_death_reincarnation=0, survivors_per_epoch=10,
+                weighted_by="time"
+            )
+            self.assertEqual(simulated_history, resumed_history)
+
+    def test_fitness_cache(self):
+        """Solving with cached simulation results"""
+        for engine in ("map", "path", "batch"):
+            np.random.seed(0)
+            _, simulated_history = self.get_game(engine).solve(
+                epochs=4, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10,
+                weighted_by="time"
+            )
+            np.random.seed(0)
+            game = self.get_game(engine, fitness_cache_size=1000)
+            _, cached_history = game.solve(
+                epochs=4, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10,
+                weighted_by="time"
+            )
+            self.assertEqual(simulated_history, cached_history)
+            self.assertGreater(game.fitness_cache.get_stats()["hits"], 0)
+
+        # Results of a realization of a random spawning function are not reused in the next epochs
+        scenario = dict(scenarios.get_small_scenario(), enemy_spawning_function=enemy.spawn4)
+        solve_params = dict(epochs=6, candidate_pool=30, survivors_per_epoch=10, weighted_by="time")
+        np.random.seed(0)
+        _, simulated_history = TowerDefenceSolver(**scenario).solve(**solve_params)
+        np.random.seed(0)
+        game = TowerDefenceSolver(**scenario, fitness_cache_size=1000)
+        _, cached_history = game.solve(**solve_params)
+        self.assertEqual(simulated_history, cached_history)
+        self.assertEqual(game.fitness_cache.get_stats()["hits"], 0)
+
+        cache = FitnessCache(2)
+        purchases = [{"time": 0, "coords": (1, 1), "type": 0}, {"time": 2, "coords": (3, 3), "type": 1}]
+        cache.put(purchases, Fitness(10, 1.0, -1.0))
+        cache.put(purchases[::-1], Fitness(11, 2.0, -2.0))
+        self.assertEqual(cache.get([dict(purchase) for purchase in purchases]), Fitness(10, 1.0, -1.0))
+        cache.put(purchases[:1], Fitness(12, 3.0, -3.0))
+        self.assertIsNone(cache.get(purchases[::-1]))
+        self.assertEqual(cache.get_stats(), {"size": 2, "hits": 1, "misses": 1, "evictions": 1})
+
+    def test_parallel_solve(self):
+        """Solving with the candidates simulated in worker processes"""
+        for engine, reincarnation in (("map", 0), ("path", 3), ("batch", 0), ("batch", 3)):
+            np.random.seed(0)
+            serial_solution, serial_history = self.get_game(engine).solve(
+                epochs=3, candidate_pool=30, premature_death_reincarnation=reincarnation, survivors_per_epoch=10,
+                weighted_by="time"
+            )
+            np.random.seed(0)
+            parallel_solution, parallel_history = self.get_game(engine, fitness_cache_size=1000).solve(
+                epochs=3, candidate_pool=30, premature_death_reincarnation=reincarnation, survivors_per_epoch=10,
+                weighted_by="time", workers=2
+            )
+            self.assertEqual(serial_history, parallel_history)
+            self.assertEqual(serial_solution.initial_purchases, parallel_solution.initial_purchases)
+            np.testing.assert_array_equal(serial_solution.get_dmg_map(), parallel_solution.get_dmg_map())
+
+        # Workers face the realization of a random spawning function of the epoch
+        scenario = dict(scenarios.get_small_scenario(), enemy_spawning_function=enemy.spawn4)
+        solve_params = dict(epochs=3, candidate_pool=30, survivors_per_epoch=10, weighted_by="time")
+        np.random.seed(0)
+        _, serial_history = TowerDefenceSolver(**scenario).solve(**solve_params)
+        np.random.seed(0)
+        _, parallel_history = TowerDefenceSolver(**scenario).solve(**solve_params, workers=2)
+        self.assertEqual(serial_history, parallel_history)
+
+    def test_select_survivors(self):
+        """First candidates to die are eliminated by death time, ties in the population order"""
+        game = self.get_game("path")
+        candidates = [Candidate(get_empty_genome(), game) for _ in range(6)]
+        for candidate, time in zip(candidates, [7, 3, 5, 3, 9, 5]):
+            candidate.time = time
+
+        survivors, threshold_time = game._TowerDefenceSolver__select_survivors(candidates, 4)
+        self.assertEqual(threshold_time, 5)
+        self.assertEqual([candidates.index(candidate) for candidate in survivors], [0, 4, 5])
+
+    def test_island_solve(self):
+        """Solving with populations evolving in separate processes"""
+        for topology in ("ring", "random"):
+            np.random.seed(0)
+            solution, history, island_histories = self.get_game("path").solve_islands(
+                islands=3, migration_interval=2, migrants=2, topology=topology,
+                epochs=5, candidate_pool=20, premature_death_reincarnation=0, survivors_per_epoch=8
+            )
+            self.assertEqual(len(island_histories), 3)
+            self.assertEqual(len(history), 5)
+            for i, score in enumerate(history):
+                self.assertEqual(int(score), max(int(island_history[i]) for island_history in island_histories))
+            self.assertEqual(solution.time, int(history[-1]))
+
+        with self.assertRaises(ValueError):
+            self.get_game("path").solve_islands(topology="star")
+
+    def test_profiler(self):
+        """Profiled solving records the phases, steps and operators without changing the results"""
+        np.random.seed(0)
+        _, history = self.get_game("path").solve(
+            epochs=3, candidate_pool=20, premature_death_reincarnation=2, survivors_per_epoch=8, weighted_by="time"
+        )
+        np.random.seed(0)
+        profiler = Profiler(per_epoch=True)
+        game = self.get_game("path", fitness_cache_size=100, profiler=profiler)
+        _, profiled_history = game.solve(
+            epochs=3, candidate_pool=20, premature_death_reincarnation=2, survivors_per_epoch=8, weighted_by="time"
+        )
+        self.assertEqual(history, profiled_history)
+
+        stats = profiler.to_dict()
+        for phase in ("initial_population", "elimination", "tail", "archive", "reproduction", "refresh"):
+            self.assertIn(phase, stats["phases"])
+        self.assertEqual(stats["phases"]["reproduction"]["calls"], 3)
+        self.assertGreater(stats["ticks"], 0)
+        self.assertEqual(
+            sum(operator["successes"] for operator in stats["operators"].values()), 3 * (20 + 2 - 8)
+        )
+        self.assertEqual(stats["cache"], game.fitness_cache.get_stats())
+        self.assertEqual([record["epoch"] for record in profiler.epochs], [0, 1, 2])
+
+    def test_solve_iter(self):
+        """Epoch records yielded while solving agree with the result of solve"""
+        np.random.seed(0)
+        solution, history = self.get_game("path").solve(
+            epochs=4, candidate_pool=20, premature_death_reincarnation=2, survivors_per_epoch=8, weighted_by="time"
+        )
+        np.random.seed(0)
+        records = list(self.get_game("path").solve_iter(
+            epochs=4, candidate_pool=20, premature_death_reincarnation=2, survivors_per_epoch=8, weighted_by="time"
+        ))
+        self.assertEqual([str(record.all_time_high) for record in records], history)
+        self.assertEqual(records[-1].best_genome.tolist(), solution.genome.tolist())
+        self.assertEqual(records[-1].best_candidate.genome.tolist(), solution.genome.tolist())
+        self.assertEqual(records[-1].best_candidate.time, records[-1].all_time_high)
+
+        # Elites are not simulated until a record is asked for its best candidate
+        np.random.seed(0)
+        game = self.get_game("path")
+        records = list(game.solve_iter(epochs=3, candidate_pool=20, survivors_per_epoch=8))
+        self.assertTrue(all(elite.candidate is None for elite in game.archive))
+        first_best = records[0].best_candidate
+        self.assertEqual(first_best.time, records[0].all_time_high)
+        self.assertEqual(first_best.genome.tolist(), records[0].best_genome.tolist())
+        self.assertIs(records[-1].best_candidate, game.archive.best.candidate)
+        for i, record in enumerate(records):
+            self.assertIsInstance(record, EpochRecord)
+            self.assertEqual(record.epoch, i)
+            self.assertGreaterEqual(record.population_size, 20)
+            self.assertLessEqual(record.min_time, record.median_time)
+            self.assertLessEqual(record.max_time, record.all_time_high)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "epochs.jsonl")
+            iterator = self.get_game("path").solve_iter(epochs=10, candidate_pool=10, survivors_per_epoch=4)
+            for record in iterator:
+                JsonLinesLog(path)(record)
+                if record.epoch == 1:
+                    break
+            iterator.close()
+            with open(path) as file:
+                lines = [json.loads(line) for line in file]
+            self.assertEqual([line["epoch"] for line in lines], [0, 1])
+            self.assertNotIn("best_candidate", lines[0])
+
+    def test_checkpoint_resume(self):
+        """Solving resumed from a checkpoint continues exactly like the uninterrupted run"""
+        params = dict(candidate_pool=20, premature_death_reincarnation=2, survivors_per_epoch=8, weighted_by="time")
+        np.random.seed(0)
+        solution, history = self.get_game("path").solve(epochs=6, **params)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.npz")
+            np.random.seed(0)
+            _, interrupted_history = self.get_game("path").solve(epochs=3, checkpoint=path, **params)
+            self.assertEqual(interrupted_history, history[:3])
+
+            state = load_checkpoint(path)
+            self.assertEqual(state.epoch, 2)
+            self.assertEqual(state.all_time_highs, history[:3])
+            self.assertGreaterEqual(len(state.genomes), 20)
+            self.assertEqual(os.listdir(directory), ["checkpoint.npz"])
+
+            np.random.seed(1)
+            resumed_solution, resumed_history = self.get_game("path").solve(
+                epochs=6, checkpoint=path, checkpoint_interval=2, resume=True, **params
+            )
+            self.assertEqual(resumed_history, history)
+            self.assertEqual(resumed_solution.genome.tolist(), solution.genome.tolist())
+            self.assertEqual(load_checkpoint(path).epoch, 5)
+
+            # Resuming a finished run gives its result without solving further
+            finished_solution, finished_history = self.get_game("path").solve(
+                epochs=6, checkpoint=path, resume=True, **params
+            )
+            self.assertEqual(finished_history, history)
+            self.assertEqual(finished_solution.genome.tolist(), solution.genome.tolist())
+            self.assertEqual(finished_solution.time, int(history[-1]))
+
+            with self.assertRaises(ValueError):
+                TowerDefenceSolver(
+                    map_width=14, map_height=16, path=self.path, tower_types=self.tower_types,
+                    enemy_spawning_function=enemy.spawn1, initial_hp=100, initial_gold=2000
+                ).solve(epochs=7, checkpoint=path, resume=True, **params)
+
+    def test_spawn_table(self):
+        """Spawned enemies computed once for the population"""
+        for spawning_function, vectorized in ((enemy.spawn1, True), (enemy.spawn2, False), (enemy.spawn5, False)):
+            table = SpawnTable(spawning_function)
+            self.assertEqual(table.get(3000), spawning_function(3000))
+            self.assertEqual(table.vectorized, vectorized)
+            self.assertGreaterEqual(len(table), 3001)
+            np.testing.assert_array_equal(table.get_range(10, 5), [spawning_function(t) for t in range(10, 15)])
+
+        np.random.seed(0)
+        game = self.get_game("path")
+        game.spawn_table = SpawnTable(enemy.spawn4, stochastic=True)
+        candidates = [Candidate([], game) for _ in range(2)]
+        for candidate in candidates:
+            candidate.simulate_until_death()
+        self.assertEqual(candidates[0].time, candidates[1].time)
+        realization = game.spawn_table.get_range(0, 100).copy()
+        game.spawn_table.reset()
+        self.assertFalse(np.array_equal(realization, game.spawn_table.get_range(0, 100)))
+        # A realization is recreated from its seed, whatever is drawn from the global generator in between
+        seed = game.spawn_table.seed
+        realization = game.spawn_table.get_range(0, 3000).copy()
+        game.spawn_table.reset(seed)
+        game.spawn_table.get_range(0, 10)
+        np.random.rand(100)
+        np.testing.assert_array_equal(game.spawn_table.get_range(0, 3000), realization)
+
+        # The same seed gives the same results on a solver that has solved before
+        scenario = dict(scenarios.get_small_scenario(), enemy_spawning_function=enemy.spawn4)
+        game = TowerDefenceSolver(**scenario)
+        histories = []
+        for _ in range(2):
+            np.random.seed(0)
+            histories.append(game.solve(epochs=3, candidate_pool=10, survivors_per_epoch=4)[1])
+        np.random.seed(0)
+        fresh_history = TowerDefenceSolver(**scenario).solve(epochs=3, candidate_pool=10, survivors_per_epoch=4)[1]
+        self.assertEqual(histories, [fresh_history, fresh_history])
+
+    def test_genome(self):
+        """Purchases kept as a structured array"""
+        purchases = [
+            {"time": 5, "coords": (1, 2), "type": 0}, {"time": 3, "coords": (3, 4), "type": 1},
+            {"time": 5, "coords": (0, 6), "type": 2}
+        ]
+        genome = to_genome(purchases)
+        self.assertEqual(genome.dtype, PURCHASE_DTYPE)
+        self.assertEqual(to_purchases(genome), purchases)
+        self.assertIs(to_genome(genome), genome)
+        sorted_coords = [purchase["coords"] for purchase in to_purchases(sort_genome(genome))]
+        self.assertEqual(sorted_coords, [(3, 4), (1, 2), (0, 6)])
+
+        candidate = Candidate(genome, self.get_game("path"))
+        self.assertEqual(candidate.initial_purchases, purchases)
+        candidate.simulate_until_death()
+        self.assertEqual(to_purchases(genome), purchases)
+
+    def test_occupancy(self):
+        """Positions validated against the path mask and the occupied cells"""
+        game = self.get_game("path")
+        occupancy = get_occupancy(to_genome([{"time": 0, "coords": (3, 3), "type": 0}]))
+        self.assertEqual(occupancy, {(3, 3)})
+        self.assertFalse(utils.validate_pos(game, self.path[5], occupancy))
+        self.assertFalse(utils.validate_pos(game, (3, 3), occupancy))
+        self.assertFalse(utils.validate_pos(game, (-1, 3), occupancy))
+        self.assertFalse(utils.validate_pos(game, (3, 14), occupancy))
+        free = next(
+            (row, col) for row in range(16) for col in range(14)
+            if (row, col) not in self.path and (row, col) != (3, 3)
+        )
+        self.assertTrue(utils.validate_pos(game, free, occupancy))
+
+    def test_coverage_placement(self):
+        """Coverage sampler draws free cells reaching the path, proportionally to their coverage"""
+        game = self.get_game("path", placement="coverage")
+        sampler = game.placement_sampler
+        coverage = np.where(game.path_mask, 0.0, game.influence_index.path_coverage[0])
+
+        np.random.seed(0)
+        counts = np.zeros((16, 14))
+        for index in sampler.cells[0][sampler.tables[0].sample(200000)]:
+            counts.flat[index] += 1
+        np.testing.assert_allclose(counts / counts.sum(), coverage / coverage.sum(), atol=2e-3)
+
+        occupancy = {divmod(int(index), 14) for index in sampler.cells[0][:-5]}
+        positions = sampler.sample(0, occupancy, size=10)
+        self.assertEqual(len(positions), 5)
+        self.assertEqual(len(set(positions)), 5)
+        for position in positions:
+            self.assertTrue(utils.validate_pos(game, position, occupancy))
+            self.assertGreater(coverage[position], 0)
+
+        occupancy.update(positions)
+        self.assertEqual(sampler.sample(0, occupancy), [])
+
+        # Many positions drawn in one call, up to all the free cells
+        occupancy = {divmod(int(index), 14) for index in sampler.cells[0][::7]}
+        free_cells = {divmod(int(index), 14) for index in sampler.cells[0]} - occupancy
+        for size in (len(free_cells) // 2, len(free_cells) + 5):
+            positions = sampler.sample(0, occupancy, size=size)
+            self.assertEqual(len(positions), min(size, len(free_cells)))
+            self.assertTrue(set(positions) <= free_cells)
+            self.assertEqual(len(set(positions)), len(positions))
+
+        # Occupied cells are excluded, the free ones drawn proportionally to their coverage
+        occupancy = {divmod(int(index), 14) for index in sampler.cells[0][::3]}
+        free_coverage = coverage.copy()
+        for position in occupancy:
+            free_coverage[position] = 0
+        counts = np.zeros((16, 14))
+        for _ in range(20000):
+            position, = sampler.sample(0, occupancy)
+            counts[position] += 1
+        np.testing.assert_allclose(counts / counts.sum(), free_coverage / free_coverage.sum(), atol=1e-2)
+
+        candidate, history = game.solve(epochs=2, candidate_pool=10, premature_death_reincarnation=2,
+                                        survivors_per_epoch=4, weighted_by="time")
+        self.assertEqual(len(history), 2)
+        for genome in game._TowerDefenceSolver__get_initial_population(5):
+            self.assertEqual(len(get_occupancy(genome)), len(genome))
+            for time, row, col, tower_type in genome.tolist():
+                self.assertGreater(game.influence_index.path_coverage[tower_type][row, col], 0)
+
+    def test_influence_index(self):
+        """Footprints follow the patch orientation and cover the path cells they reach"""
+        game = TowerDefenceSolver(
+            map_width=14, map_height=16, path=self.path,
+            tower_types={0: {"dmg": np.arange(1, 16).reshape((3, 5)), "cost": 100}},
+            enemy_spawning_function=enemy.spawn1, initial_hp=100, initial_gold=2000
+        )
+
+        dmg_map = utils.get_dmg_patch(game, (5, 5), 0)
+        np.testing.assert_array_equal(dmg_map[4:7, 3:8], np.arange(1, 16).reshape((3, 5)) / 2)
+        self.assertEqual(np.count_nonzero(dmg_map), 15)
+
+        for coords in [(0, 0), (5, 5), (12, 3), (15, 13)]:
+            path_dmg = utils.get_dmg_patch(game, coords, 0)[game.path_rows, game.path_cols]
+            footprint = game.influence_index.get_footprint(coords, 0)
+            np.testing.assert_array_equal(utils.get_path_dmg_patch(game, coords, 0), path_dmg)
+            self.assertEqual(len(footprint.path_indices), np.count_nonzero(path_dmg))
+            self.assertEqual(game.influence_index.get_path_coverage(coords, 0), np.sum(path_dmg))
+
+    def test_snake_path(self):
+        """Generated paths of the benchmark scenarios are connected and fit in the map"""
+        path = scenarios.get_snake_path(100, 100, 1000)
+        self.assertEqual(len(path), 1000)
+        self.assertEqual(len(set(path)), 1000)
+        for (row_a, col_a), (row_b, col_b) in zip(path, path[1:]):
+            self.assertEqual(abs(row_a - row_b) + abs(col_a - col_b), 1)
+        self.assertTrue(all(0 <= row < 100 and 0 <= col < 100 for row, col in path))
+
+        with self.assertRaises(ValueError):
+            scenarios.get_snake_path(20, 20, 1000)
+
+    def test_float32_state(self):
+        """Single precision state gives the same survival times as double precision"""
+        path_game = self.get_game("path")
+        for engine in ("map", "path", "batch"):
+            game = self.get_game(engine, dtype="float32")
+            schedules = self.get_random_schedules(path_game, 20)
+            in_single = [Candidate(purchases, game) for purchases in schedules]
+            if engine == "batch":
+                BatchSimulator(game, in_single).run_to_death()
+            else:
+                for candidate in in_single:
+                    candidate.simulate_until_death(fast_forward=True)
+
+            for purchases, candidate in zip(schedules, in_single):
+                in_double = self.run_to_death(Candidate(purchases, path_game))
+                self.assertEqual(candidate.time, in_double.time)
+                self.assertEqual(candidate.bought_purchases, in_double.bought_purchases)
+                self.assertAlmostEqual(candidate.gold / in_double.gold, 1.0, places=6)
+                self.assertEqual(candidate.opponent_hp.dtype, np.float32)
+                self.assertEqual(candidate.get_dmg_map().dtype, np.float32)
+                np.testing.assert_array_equal(candidate.get_dmg_map(), in_double.get_dmg_map())
+
+        with self.assertRaises(ValueError):
+            self.get_game("path", dtype="float16")
+
+    def test_sweep(self):
+        """Sweep runs every grid point and repetition once, skipping the jobs already done"""
+        spec = dict(
+            name="tiny", scenario="small", solve=dict(epochs=2, candidate_pool=10, survivors_per_epoch=4),
+            grid=dict(weighted_by=["time", "order"], binary_op_prob=[0.4]), repetitions=2, seed=3
+        )
+        jobs = main.get_jobs(spec)
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(jobs[0]["game"], {"binary_op_prob": 0.4})
+        self.assertEqual(jobs[0]["solve"]["weighted_by"], "time")
+        self.assertEqual(len({job["job_id"] for job in jobs}), 4)
+        # Jobs of an unchanged grid point keep their identifiers, the others are run again
+        self.assertEqual(main.get_jobs(dict(spec, name="renamed"))[0]["job_id"], jobs[0]["job_id"])
+        for changed_spec in (
+            dict(spec, seed=4), dict(spec, scenario="medium"), dict(spec, game=dict(initial_gold=3000)),
+            dict(spec, solve=dict(spec["solve"], epochs=3))
+        ):
+            self.assertNotEqual(main.get_jobs(changed_spec)[0]["job_id"], jobs[0]["job_id"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(len(main.run_sweep(spec, directory, workers=2)), 4)
+            sweep_dir = os.path.join(directory, "tiny")
+            store = ResultsStore(os.path.join(sweep_dir, "histories"))
+            runs = store.select(weighted_by="time")
+            self.assertEqual(len(runs), 2)
+            histories = store.get_histories(runs)
+            self.assertEqual(histories.shape, (2, 2))
+
+            os.remove(os.path.join(sweep_dir, "jobs", jobs[1]["job_id"] + ".json"))
+            self.assertEqual(main.run_sweep(spec, directory, workers=1), [jobs[1]["job_id"]])
+            store = ResultsStore(os.path.join(sweep_dir, "histories"))
+            self.assertEqual(len(store), 4)
+            np.testing.assert_array_equal(store.get_histories(store.select(weighted_by="time")), histories)
+
+    def test_results_store(self):
+        """Histories appended to the results store are read back and aggregated per epoch"""
+        histories = [[3, 5, 8], [4, 4, 9], [1, 2]]
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultsStore(os.path.join(directory, "experiment"))
+            for i, history in enumerate(histories):
+                store.append_run(history, {"config": i % 2}, dmg_map=np.full((2, 3), i, dtype=np.float32))
+
+            store = ResultsStore(os.path.join(directory, "experiment"))
+            self.assertEqual(len(store), 3)
+            self.assertEqual(store.select(config=0), [0, 2])
+            np.testing.assert_array_equal(store.get_histories([2, 0]), [[1, 2, np.nan], [3, 5, 8]])
+            np.testing.assert_array_equal(store.get_dmg_map(2), np.full((2, 3), 2))
+
+            summary = store.aggregate(config=0)
+            np.testing.assert_array_equal(summary["count"], [2, 2, 1])
+            np.testing.assert_allclose(summary["mean"], [2, 3.5, 8])
+            np.testing.assert_allclose(summary["std"], [1, 1.5, 0])
+            np.testing.assert_allclose(summary["quantiles"][0.5], [2, 3.5, 8])
+
+            path = os.path.join(directory, "history.txt")
+            with open(path, mode="w") as file:
+                file.write("".join(" ".join(map(str, history)) + "\n" for history in histories))
+            np.testing.assert_array_equal(read_text_histories(path), store.get_histories())
+            np.testing.assert_allclose(aggregate(read_text_histories(path))["mean"], store.aggregate()["mean"])
+
+            # Data of a run interrupted before its metadata was written is skipped
+            with open(store.data_path, mode="ab") as file:
+                file.write(np.zeros(2, dtype=store.get_records().dtype).tobytes())
+            store.append_run([6, 7], {"config": 2})
+            store = ResultsStore(os.path.join(directory, "experiment"))
+            np.testing.assert_array_equal(store.get_histories(), [[3, 5, 8], [4, 4, 9], [1, 2, np.nan], [6, 7, np.nan]])
+
+    def test_batched_reproduction(self):
+        """Batched reproduction adds the requested number of offspring of the given candidates"""
+        game = self.get_game("path", binary_op_prob=0.5)
+        np.random.seed(0)
+        parents = [self.run_to_death(Candidate(genome, game)) for genome in self.get_random_schedules(game, 10)]
+        candidates = reproduction.batched_reproduction(game, parents, 50, weighted_by="time")
+        self.assertEqual(len(candidates), 60)
+        self.assertEqual([id(candidate) for candidate in candidates[:10]],
+                         [id(candidate) for candidate in sorted(parents, key=lambda candidate: candidate.time)])
+        self.assertFalse({id(candidate) for candidate in candidates[10:]} & {id(parent) for parent in parents})
+
+        np.random.seed(0)
+        solution, history = self.get_game("batch", reproduction="batched").solve(
+            epochs=3, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10, weighted_by="order"
+        )
+        self.assertEqual(len(history), 3)
+        self.assertEqual(int(history[-1]), solution.time)
+
+        with self.assertRaises(ValueError):
+            self.get_game("path", reproduction="parallel")
+
+    def test_operator_bandit(self):
+        """Operators whose offspring gain more survival time per second are drawn more often"""
+        bandit = OperatorBandit(["addition", "deletion"], ["cross"], min_probability=0.1)
+        for _ in range(4):
+            bandit.record("addition", 0.5, 10, SimpleNamespace(time=30))
+            bandit.record("deletion", 0.5, 10, SimpleNamespace(time=15))
+            bandit.record("deletion", 0.5, 10)
+            bandit.record("cross", 1.0, 10, SimpleNamespace(time=5))
+        bandit.update(seconds_per_candidate=0.5)
+
+        probabilities = bandit.get_probabilities()
+        # Gains per second: addition 80 / 4, deletion 20 / 6, cross 0 / 6
+        self.assertAlmostEqual(probabilities["unary"]["addition"], 0.1 + 0.8 * 20 / (20 + 10 / 3))
+        self.assertAlmostEqual(probabilities["kind"]["unary"], 0.9)
+        self.assertEqual(probabilities["binary"]["cross"], 1.0)
+        self.assertEqual(bandit.history, [probabilities])
+        self.assertEqual(bandit.offspring, [])
+
+        np.random.seed(0)
+        game = self.get_game("batch", binary_op_prob=0.4, operator_selection="adaptive")
+        solution, history = game.solve(
+            epochs=4, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10, weighted_by="time"
+        )
+        self.assertEqual(int(history[-1]), solution.time)
+        self.assertEqual(len(game.operator_bandit.history), 4)
+        for group, arms in game.operator_bandit.get_probabilities().items():
+            self.assertAlmostEqual(sum(arms.values()), 1.0)
+        np.testing.assert_array_equal(game.p_unary_ops, game.operator_bandit.probabilities["unary"])
+
+    def test_service(self):
+        """Solving with the service gives the same result as solving directly, also with a warm worker"""
+        scenario = dict(scenarios.get_small_scenario(), engine="path")
+        # Random spawning functions too, whose realizations are drawn from the seeded generator
+        stochastic_scenario = dict(scenario, enemy_spawning_function=enemy.spawn4)
+        solve_params = dict(epochs=3, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10)
+        solutions = []
+        for game_params in (scenario, stochastic_scenario):
+            np.random.seed(0)
+            solutions.append(TowerDefenceSolver(**game_params).solve(**solve_params))
+
+        with service.SolverService(port=0, workers=1, verbose=False) as server:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            try:
+                for game_params, (solution, history) in zip((scenario, stochastic_scenario), solutions):
+                    for _ in range(2):
+                        messages = list(
+                            service.solve(url, service.get_scenario_spec(game_params), solve_params, seed=0)
+                        )
+                        self.assertEqual([message["type"] for message in messages], ["epoch"] * 3 + ["result"])
+                        self.assertEqual([str(score) for score in messages[-1]["history"]], history)
+                        self.assertEqual(messages[-1]["best_time"], solution.time)
+
+                with self.assertRaises(ValueError):
+                    list(service.solve(url, dict(service.get_scenario_spec(scenario), enemy_spawning_function="eval")))
+                with self.assertRaises(ValueError):
+                    list(service.solve(url, service.get_scenario_spec(scenario), dict(solve_params, workers=2)))
+            finally:
+                server.shutdown()
+                thread.join()
+
+    def test_lean_candidate(self):
+        """State is allocated once simulated, delays recorded only on request and the memory budget enforced"""
+        game = self.get_game("path")
+        genome = self.get_random_schedules(game, 1)[0]
+        candidate = Candidate(genome, game)
+        self.assertFalse(hasattr(candidate, "__dict__"))
+        self.assertIsNone(candidate.opponent_hp)
+        self.run_to_death(candidate)
+        self.assertEqual(candidate.opponent_hp.shape, (len(self.path),))
+        self.assertEqual(candidate.delayed_purchases, [])
+
+        copied = copy.deepcopy(candidate)
+        self.assertIs(copied.game, game)
+        np.testing.assert_array_equal(copied.get_dmg_map(), candidate.get_dmg_map())
+        candidate.release_state()
+        self.assertIsNone(candidate.dmg_map)
+        self.assertIsNotNone(copied.dmg_map)
+
+        recording = self.run_to_death(Candidate(genome, self.get_game("path", record_delays=True)))
+        self.assertEqual(recording.time, candidate.time)
+
+        # Every engine records the same delays
+        path_game, batch_game = self.get_game("path", record_delays=True), self.get_game("batch", record_delays=True)
+        schedules = self.get_random_schedules(path_game, 20)
+        one_by_one = [self.run_to_death(Candidate(purchases, path_game)) for purchases in schedules]
+        batched = [Candidate(purchases, batch_game) for purchases in schedules]
+        BatchSimulator(batch_game, batched).run_to_death()
+        self.assertGreater(sum(len(on_path.delayed_purchases) for on_path in one_by_one), 0)
+        for on_path, in_batch in zip(one_by_one, batched):
+            self.assertEqual(on_path.delayed_purchases, in_batch.delayed_purchases)
+            self.assertEqual(on_path.get_unique_delays(), in_batch.get_unique_delays())
+
+        solve_params = dict(
+            epochs=3, candidate_pool=30, premature_death_reincarnation=0, survivors_per_epoch=10, weighted_by="time"
+        )
+        with self.assertRaises(ValueError):
+            self.get_game("map").solve(**solve_params, memory_budget=30 * game.get_state_nbytes())
+
+        np.random.seed(0)
+        _, history = self.get_game("path").solve(**solve_params, reuse_snapshots=True)
+        np.random.seed(0)
+        # Room for the state only, the snapshots are dropped at the end of each epoch
+        _, budgeted_history = game.solve(
+            **solve_params, reuse_snapshots=True, memory_budget=31 * game.get_state_nbytes() + 4096
+        )
+        self.assertEqual(history, budgeted_history)
+
+    def test_elite_archive(self):
+        """Archive keeps the best distinct purchases lists and simulates their candidates on demand"""
+        game = self.get_game("path")
+        genomes = self.get_random_schedules(game, 4)
+        archive = EliteArchive(size=3)
+        self.assertTrue(archive.add(genomes[0], 50))
+        self.assertTrue(archive.add(genomes[1], 70))
+        self.assertFalse(archive.add(genomes[0], 50))
+        self.assertTrue(archive.add(genomes[2], 50))
+        self.assertTrue(archive.add(genomes[0], 60))
+        self.assertTrue(archive.add(genomes[3], 55))
+        self.assertFalse(archive.admits(genomes[2], 40))
+        self.assertEqual([elite.time for elite in archive], [70, 60, 55])
+        self.assertEqual(archive.best.genome.tolist(), genomes[1].tolist())
+
+        simulated = self.run_to_death(Candidate(genomes[1], game))
+        candidate = archive.get_candidate(game)
+        self.assertEqual(candidate.time, simulated.time)
+        self.assertIs(archive.get_candidate(game), candidate)
+
+        for engine in ("path", "batch"):
+            np.random.seed(0)
+            game = self.get_game(engine)
+            solution, history = game.solve(
+                epochs=4, candidate_pool=30, premature_death_reincarnation=3, survivors_per_epoch=10,
+                weighted_by="time", archive_size=5
+            )
+            times = [elite.time for elite in game.archive]
+            self.assertEqual(len(times), 5)
+            self.assertEqual(times, sorted(times, reverse=True))
+            self.assertEqual(times[0], int(history[-1]))
+            self.assertEqual(solution.time, int(history[-1]))
+            self.assertEqual(len({elite.genome.tobytes() for elite in game.archive}), 5)
+
+        np.random.seed(0)
+        solution, history, archive = self.get_game("path").solve(
+            epochs=2, candidate_pool=10, survivors_per_epoch=4, archive_size=3, return_archive=True
+        )
+        self.assertIsInstance(archive, EliteArchive)
+        self.assertEqual(len(archive), 3)
+        self.assertEqual(archive.best.time, solution.time)
+        self.assertIs(archive.get_candidate(solution.game), solution)
+
+    def test_unknown_engine(self):
+        """Unknown engine is rejected"""
+        with self.assertRaises(ValueError):
+            self.get_game("gpu")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,12 +5,34 @@ Tower Defence Solver.
 
 This algorithm employs evolutionary approach to find as good solution as possible to the Tower Defence gameplay problem.
 """
+import os
 import numpy as np
 import copy
+import heapq
+from time import perf_counter
 import tower_defence_solver.utils as utils
 import tower_defence_solver.reproduction as reproduction
 from tower_defence_solver.candidate import Candidate
-from typing import List, Tuple, Dict, Callable, Optional
+from tower_defence_solver.batch import BatchSimulator
+from tower_defence_solver.influence import TowerInfluenceIndex
+from tower_defence_solver.spawns import SpawnTable
+from tower_defence_solver.placement import PlacementSampler
+from tower_defence_solver.adaptive import OperatorBandit
+from tower_defence_solver.profiler import Profiler, NullProfiler
+from tower_defence_solver.telemetry import EpochRecord, get_epoch_record
+from tower_defence_solver.checkpoint import save_checkpoint, load_checkpoint
+from tower_defence_solver.archive import EliteArchive
+from tower_defence_solver.genome import Genome, PURCHASE_DTYPE, get_empty_genome, get_purchase, sort_genome
+from tower_defence_solver.cache import FitnessCache, Fitness, get_scenario_fingerprint
+from tower_defence_solver.parallel import ParallelEvaluator
+import tower_defence_solver.islands as islands_model
+from typing import List, Tuple, Dict, Callable, Iterator, Optional, Union
+
+ENGINES = ("map", "path", "batch")
+PLACEMENTS = ("gaussian", "coverage")
+DTYPES = ("float64", "float32")
+REPRODUCTIONS = ("sequential", "batched")
+OPERATOR_SELECTIONS = ("fixed", "adaptive")
 
 
 class TowerDefenceSolver:
@@ -26,7 +48,16 @@ class TowerDefenceSolver:
         binary_op_prob: Optional[float] = None,
         unary_ops_prob_distribution: Optional[List[float]] = None,
         binary_ops_prob_distribution: Optional[List[float]] = None,
-        dmg_to_gold_factor: float = 1.0
+        dmg_to_gold_factor: float = 1.0,
+        engine: str = "map",
+        fitness_cache_size: Optional[int] = None,
+        stochastic_spawning: Optional[bool] = None,
+        placement: str = "gaussian",
+        profiler: Optional[Profiler] = None,
+        dtype: str = "float64",
+        reproduction: str = "sequential",
+        operator_selection: str = "fixed",
+        record_delays: bool = False
     ) -> None:
         """
         Main instance of the solver.
@@ -42,7 +73,45 @@ class TowerDefenceSolver:
         :param unary_ops_prob_distribution:
         :param binary_ops_prob_distribution:
         :param dmg_to_gold_factor:
+        :param engine: 'map' - simulation state kept as full map arrays,
+                       'path' - simulation state kept as vectors indexed by position on the path,
+                       'batch' - path-space state of the whole population simulated at once in stacked arrays
+        :param fitness_cache_size: Number of simulation results kept to skip simulating the same purchases list
+                                   again, None disables the cache (exact for deterministic spawning functions).
+        :param stochastic_spawning: Whether the spawning function is random, all the candidates of an epoch face
+                                    the same realization then. Taken from its 'stochastic' attribute if None.
+        :param placement: 'gaussian' - towers placed with normal distribution around random path cells,
+                          'coverage' - towers placed proportionally to the damage they deal on the path
+        :param profiler: Record of the time spent in the phases of solving, None disables profiling.
+        :param dtype: Type of the simulation state: health of enemies, damage, gold and health of the base.
+                      'float32' halves the memory of the state and is exact as long as the damage patches
+                      are integers, spawned health is a multiple of 1/2 and every health and damage total stays
+                      below 2**23. Gold accumulated with a dmg_to_gold_factor which is not a multiple of 1/2
+                      is rounded to about 7 significant digits (relative error of 6e-8 per step), which may shift
+                      a purchase by a step when the gold is within that error of the tower's cost.
+        :param reproduction: 'sequential' - parents drawn one offspring at a time, offspring included,
+                             'batched' - operators and parents of all the offspring of an epoch drawn at once
+                             from the survivors only, faster for large populations
+        :param operator_selection: 'fixed' - operators drawn with the given probabilities,
+                                   'adaptive' - probabilities, starting from the given ones, updated each epoch
+                                   from the survival gain of the offspring of each operator per second spent on it;
+                                   the learned probabilities are kept in operator_bandit, not in checkpoints
+        :param record_delays: Record every step a purchase is postponed for in the delayed purchases of candidates,
+                              shown by their string representation; the list grows with the delays.
         """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Unknown placement '{placement}', expected one of {PLACEMENTS}")
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype '{dtype}', expected one of {DTYPES}")
+        if reproduction not in REPRODUCTIONS:
+            raise ValueError(f"Unknown reproduction '{reproduction}', expected one of {REPRODUCTIONS}")
+        if operator_selection not in OPERATOR_SELECTIONS:
+            raise ValueError(
+                f"Unknown operator selection '{operator_selection}', expected one of {OPERATOR_SELECTIONS}"
+            )
+
         self.map_width = map_width
         self.map_height = map_height
         self.path = path
@@ -65,9 +134,57 @@ class TowerDefenceSolver:
         )
         self.dmg_to_gold_factor = dmg_to_gold_factor
 
+        self.operator_selection = operator_selection
+        self.operator_bandit = self.__get_operator_bandit() if operator_selection == "adaptive" else None
+        # Best purchases lists found by the last solving
+        self.archive = EliteArchive()
+
+        self.engine = engine
+        self.reproduction = reproduction
+        self.record_delays = record_delays
+        self.dtype = np.dtype(dtype)
+        self.profiler = profiler if profiler is not None else NullProfiler()
+
         self.move_generator = list(zip(self.path[::-1], self.path[-2::-1]))
+        self.path_rows, self.path_cols = np.array(self.path).T
+        self.path_mask = np.zeros((self.map_height, self.map_width), dtype=bool)
+        self.path_mask[self.path_rows, self.path_cols] = True
+        self.influence_index = TowerInfluenceIndex(
+            self.map_width, self.map_height, self.path, self.tower_types, self.dtype
+        )
+
+        self.placement = placement
+        self.placement_sampler = None
+        if placement == "coverage":
+            self.placement_sampler = PlacementSampler(
+                self.map_width, self.map_height, self.path_mask, self.influence_index.path_coverage
+            )
+
+        if stochastic_spawning is None:
+            stochastic_spawning = getattr(enemy_spawning_function, "stochastic", False)
+        self.spawn_table = SpawnTable(enemy_spawning_function, stochastic_spawning, self.dtype)
+
+        self.scenario = get_scenario_fingerprint(
+            map_width, map_height, path, tower_types, enemy_spawning_function, initial_hp, initial_gold,
+            dmg_to_gold_factor, dtype
+        )
+        self.fitness_cache = None
+        if fitness_cache_size:
+            self.fitness_cache = FitnessCache(fitness_cache_size, self.scenario)
 
-    def __get_initial_population(self, n_candidates: int) -> List[List[Dict]]:
+    def __get_operator_bandit(self) -> OperatorBandit:
+        """
+        Bandit choosing the reproduction operators, starting from the given probabilities.
+
+        :return:
+        """
+        return OperatorBandit(
+            [operator.__name__ for operator in reproduction.UNARY_REPRODUCTION],
+            [operator.__name__ for operator in reproduction.BINARY_REPRODUCTION],
+            self.p_binary, self.p_unary_ops, self.p_binary_ops
+        )
+
+    def __get_initial_population(self, n_candidates: int) -> List[Genome]:
         """
         Function returning the candidates of initial population.
 
@@ -76,10 +193,14 @@ class TowerDefenceSolver:
         """
         population = []
         for _ in range(n_candidates):
-            sample = []
+            sample = get_empty_genome()
             gold_for_sample = self.initial_gold
             possible_options = [item for item in self.tower_types.items() if item[1]["cost"] <= gold_for_sample]
 
+            if self.placement_sampler is not None:
+                population.append(self.__get_initial_sample_by_coverage(possible_options))
+                continue
+
             while possible_options:
                 purchase_time = utils.get_random_initial_purchase_time(0.3)
                 tower_idx, tower = utils.choose_random_tower(possible_options)
@@ -90,28 +211,318 @@ class TowerDefenceSolver:
                     game=self,
                     cov_xx=dmg_width // 2,
                     cov_yy=dmg_height // 2,
-                    purchased_towers=sample
+                    purchased_towers=sample,
+                    tower_type=tower_idx
                 )
 
                 gold_for_sample -= tower["cost"]
                 possible_options = list(filter(lambda x: x[1]["cost"] <= gold_for_sample, self.tower_types.items()))
-                sample.append(
-                    {"time": purchase_time, "coords": position, "type": tower_idx},
+                sample = np.append(
+                    sample, np.array([get_purchase(purchase_time, position, tower_idx)], dtype=PURCHASE_DTYPE)
                 )
 
-            sample = sorted(sample, key=lambda x: x["time"])
-            population.append(sample)
+            population.append(sort_genome(sample))
 
         return population
 
+    def __get_initial_sample_by_coverage(self, possible_options: List[Tuple[int, Dict]]) -> Genome:
+        """
+        Candidate of initial population with towers placed by the coverage sampler, positions of all
+        the towers of a type drawn at once.
+
+        :param possible_options: tower types affordable with the initial gold
+        :return:
+        """
+        gold_for_sample = self.initial_gold
+        times, tower_ids = [], []
+        while possible_options:
+            times.append(utils.get_random_initial_purchase_time(0.3))
+            tower_idx, tower = utils.choose_random_tower(possible_options)
+            tower_ids.append(tower_idx)
+
+            gold_for_sample -= tower["cost"]
+            possible_options = list(filter(lambda x: x[1]["cost"] <= gold_for_sample, self.tower_types.items()))
+
+        sample = get_empty_genome(len(tower_ids))
+        sample["time"], sample["type"] = times, tower_ids
+        is_placed = np.zeros(len(tower_ids), dtype=bool)
+        occupancy = set()
+        for tower_idx in dict.fromkeys(tower_ids):
+            indices = np.flatnonzero(sample["type"] == tower_idx)
+            positions = self.placement_sampler.sample(tower_idx, occupancy, len(indices))
+            occupancy.update(positions)
+
+            # Towers left without a free cell covering the path are not bought
+            indices = indices[:len(positions)]
+            if positions:
+                sample["row"][indices], sample["col"][indices] = zip(*positions)
+            is_placed[indices] = True
+
+        return sort_genome(sample[is_placed])
+
+    def __eliminate(
+        self,
+        candidates: List[Candidate],
+        n_must_die: int,
+        left_to_add: int,
+        fast_forward: bool,
+        evaluator: Optional[ParallelEvaluator]
+    ) -> Tuple[List[Candidate], int]:
+        """
+        Simulate candidates until the given number of them dies, then until death of the survivors.
+        Candidates are simulated step by step together only as long as the dead are replaced by mutation of
+        living ones, since only then they depend on each other. Afterwards each of them is simulated until death
+        on its own and the first to die are eliminated in the order of their death times.
+
+        :param candidates: candidates to simulate
+        :param n_must_die: number of candidates to die
+        :param left_to_add: number of dead candidates to replace by mutation of still living one
+        :param fast_forward: compute the death time directly once there are no pending purchases
+        :param evaluator: pool of worker processes simulating the candidates which have not been reincarnated,
+                          None to simulate in this process only
+        :return: surviving candidates and time at which the elimination has finished
+        """
+        time = min(candidate.time for candidate in candidates)
+        removed = set()
+        living = candidates
+        n_dead = 0
+        with self.profiler.phase("elimination"):
+            while left_to_add > 0 and n_dead < n_must_die:
+                for candidate in living:
+                    # Candidates resumed from a snapshot wait for the others to catch up
+                    if candidate.time > time or id(candidate) in removed:
+                        continue
+
+                    if candidate.fitness is not None:
+                        candidate.skip_step()
+                    else:
+                        candidate.simulate_step()
+
+                    if candidate.base_hp <= 0:
+                        n_dead += 1
+                        if n_dead >= n_must_die:
+                            break
+
+                        if left_to_add > 0:
+                            candidate.swap_sim([other for other in living if id(other) not in removed])
+                            left_to_add -= 1
+                        else:
+                            removed.add(id(candidate))
+                            candidate.release_state()
+
+                time += 1
+                living = [candidate for candidate in living if id(candidate) not in removed]
+
+        evaluated = []
+        with self.profiler.phase("tail"):
+            for candidate in living:
+                if candidate.fitness is not None:
+                    candidate.apply_fitness()
+                elif candidate.base_hp <= 0:
+                    continue
+                elif evaluator is None or candidate.reincarnated:
+                    candidate.simulate_until_death(fast_forward)
+                else:
+                    evaluated.append(candidate)
+
+        if evaluated:
+            # Not reincarnated candidates are simulated again from scratch
+            self.__evaluate_in_parallel(evaluator, evaluated, fast_forward)
+
+        if n_dead >= n_must_die:
+            return living, time
+
+        return self.__select_survivors(living, n_must_die - n_dead)
+
+    def __eliminate_batched(
+        self, candidates: List[Candidate], n_must_die: int, left_to_add: int
+    ) -> Tuple[List[Candidate], BatchSimulator]:
+        """
+        Simulate the whole population at once until the given number of candidates dies.
+        Candidates dying in the same step are handled in the population order.
+
+        :param candidates: candidates to simulate
+        :param n_must_die: number of candidates to die
+        :param left_to_add: number of dead candidates to replace by mutation of still living one
+        :return: surviving candidates and the simulator still holding those alive
+        """
+        simulator = BatchSimulator(
+            self,
+            [candidate for candidate in candidates if candidate.fitness is None],
+            time=min(candidate.time for candidate in candidates)
+        )
+        # Candidates with known fitness are not simulated
+        skipping = [candidate for candidate in candidates if candidate.fitness is not None]
+        position = {id(candidate): i for i, candidate in enumerate(candidates)}
+        removed = set()
+
+        n_dead = 0
+        while n_dead < n_must_die:
+            for candidate in skipping:
+                if candidate.time == simulator.time:
+                    candidate.skip_step()
+
+            dead = simulator.step() + [candidate for candidate in skipping if candidate.base_hp <= 0]
+            skipping = [candidate for candidate in skipping if candidate.base_hp > 0]
+
+            for candidate in sorted(dead, key=lambda x: position[id(x)]):
+                n_dead += 1
+                if n_dead >= n_must_die:
+                    break
+
+                if left_to_add > 0:
+                    simulator.store()
+                    candidate.swap_sim(simulator.candidates + skipping)
+                    # Candidates with known fitness chosen for the mutation have been simulated up to now
+                    simulator.add([candidate] + [other for other in skipping if other.fitness is None])
+                    skipping = [other for other in skipping if other.fitness is not None]
+                    left_to_add -= 1
+                else:
+                    removed.add(id(candidate))
+                    candidate.release_state()
+
+        for candidate in skipping:
+            candidate.apply_fitness()
+
+        return [candidate for candidate in candidates if id(candidate) not in removed], simulator
+
+    def __get_replay(self, candidate: Candidate) -> Optional[Candidate]:
+        """
+        Copy of a candidate entering the archive if simulating its purchases list again would not reproduce it.
+
+        :param candidate: survivor
+        :return: None if the purchases list reproduces the candidate
+        """
+        if not candidate.reincarnated and not self.spawn_table.stochastic:
+            return None
+
+        replay = copy.deepcopy(candidate)
+        # Only the final state summary is known, the state itself is needed for the solution
+        if replay.fitness is not None:
+            replay.catch_up()
+        return replay
+
+    def get_state_nbytes(self) -> int:
+        """
+        Bytes of the simulation state of a candidate, doubled for the batch engine, which stacks copies of it.
+
+        :return:
+        """
+        n_cells = len(self.path) if self.engine != "map" else self.map_width * self.map_height
+        return 2 * n_cells * self.dtype.itemsize * (2 if self.engine == "batch" else 1)
+
+    @staticmethod
+    def get_population_nbytes(candidates: List[Candidate]) -> int:
+        """
+        Bytes of the arrays held by the candidates: simulation state, purchases lists and snapshots,
+        each of the arrays shared by several candidates counted once.
+
+        :param candidates: population
+        :return:
+        """
+        arrays = {}
+        for candidate in candidates:
+            for array in (candidate.dmg_map, candidate.opponent_hp, candidate.genome, candidate.pending):
+                if array is not None:
+                    arrays[id(array)] = array.nbytes
+            for snapshot in candidate.snapshots:
+                arrays[id(snapshot.opponent_hp)] = snapshot.opponent_hp.nbytes
+        return sum(arrays.values())
+
+    def __enforce_memory_budget(self, candidates: List[Candidate], budget: int) -> None:
+        """
+        Drop the snapshots of the refreshed population, and the states resumed from them, if the population
+        holds more than the budget.
+
+        :param candidates: refreshed population
+        :param budget: bytes the population may take besides the simulation state
+        :return:
+        """
+        if self.get_population_nbytes(candidates) <= budget:
+            return
+
+        for candidate in candidates:
+            candidate.refresh()
+        nbytes = self.get_population_nbytes(candidates)
+        if nbytes > budget:
+            raise MemoryError(
+                f"Purchases lists of the population take {nbytes} bytes, more than the {budget} bytes of the memory "
+                f"budget left besides the simulation state"
+            )
+
+    @staticmethod
+    def __select_survivors(candidates: List[Candidate], n_must_die: int) -> Tuple[List[Candidate], int]:
+        """
+        Eliminate candidates with known death times the same way as simulating them in lockstep does:
+        candidates die in the order of their death times, those dying in the same step in the population order.
+
+        :param candidates: candidates which are all dead
+        :param n_must_die: number of candidates to die
+        :return: surviving candidates and time at which the elimination has finished
+        """
+        deaths = [(candidate.time, i) for i, candidate in enumerate(candidates)]
+        heapq.heapify(deaths)
+        dying = [heapq.heappop(deaths) for _ in range(n_must_die)]
+
+        # The last one to die stays in the population, like in the simulation
+        removed = {i for _, i in dying[:-1]}
+        return [candidate for i, candidate in enumerate(candidates) if i not in removed], dying[-1][0]
+
+    def __get_fitness_cache(self) -> Optional[FitnessCache]:
+        """
+        Cache of the simulation results, None if there is none or the spawning function is random,
+        as results of one realization of the enemies do not hold for the next one.
+
+        :return:
+        """
+        return self.fitness_cache if not self.spawn_table.stochastic else None
+
+    def __evaluate_in_parallel(
+        self, evaluator: ParallelEvaluator, candidates: List[Candidate], fast_forward: bool
+    ) -> None:
+        """
+        Set the final state summary of candidates, simulating from scratch in the worker processes
+        those of them whose fitness is not known.
+
+        :param evaluator: pool of worker processes
+        :param candidates: candidates to evaluate, not reincarnated ones
+        :param fast_forward: compute the death time directly once there are no pending purchases
+        :return:
+        """
+        evaluated = [candidate for candidate in candidates if candidate.fitness is None]
+        with self.profiler.phase("parallel"):
+            results = evaluator.evaluate(
+                [candidate.genome for candidate in evaluated], fast_forward, self.spawn_table.seed
+            )
+
+        fitness_cache = self.__get_fitness_cache()
+        for candidate, fitness in zip(evaluated, results):
+            if fitness_cache is not None:
+                fitness_cache.put(candidate.genome, fitness)
+            candidate.fitness = fitness
+
+        for candidate in candidates:
+            candidate.apply_fitness()
+
     def solve(
         self,
         epochs: int = 100,
         candidate_pool: int = 100,
         premature_death_reincarnation: int = 0,
         survivors_per_epoch: int = 20,
-        weighted_by: str = None
-    ) -> Tuple[Optional[Candidate], List[str]]:
+        weighted_by: str = None,
+        fast_forward: bool = False,
+        reuse_snapshots: bool = False,
+        workers: int = 1,
+        migration: Optional[Callable[[int, List[Candidate]], List[Genome]]] = None,
+        checkpoint: Optional[str] = None,
+        checkpoint_interval: int = 1,
+        resume: bool = False,
+        callback: Optional[Callable[[EpochRecord], None]] = None,
+        memory_budget: Optional[int] = None,
+        archive_size: int = 10,
+        return_archive: bool = False
+    ) -> Union[Tuple[Optional[Candidate], List[str]], Tuple[Optional[Candidate], List[str], EliteArchive]]:
         """
         Solve for best possible gameplay given provided parameters.
 
@@ -121,54 +532,270 @@ class TowerDefenceSolver:
         :param survivors_per_epoch: Number of candidates to remain alive by the end of each epoch's simulation.
         :param weighted_by: 'order' - weighted by order in list of candidates sorted by survival time,
                         'time' - weighted by survival time, None - uniform
+        :param fast_forward: once survivors have no pending purchases, compute their death time directly
+                             instead of simulating step by step (exact for deterministic spawning functions)
+        :param reuse_snapshots: record snapshots of the simulation at purchases, so that unchanged survivors and
+                                offspring resume from the state shared with their parent instead of simulating
+                                from the beginning (exact for deterministic spawning functions)
+        :param workers: number of processes simulating the candidates whose lives are independent of the others,
+                        i.e. the whole population if premature_death_reincarnation is 0, the survivors otherwise
+                        (exact, also for random spawning functions, whose realization is sent to the workers;
+                        snapshots are not recorded by the workers)
+        :param migration: function of the epoch number and the survivors returning genomes of candidates
+                          joining the next population in place of some of the offspring
+        :param checkpoint: path of the .npz file the state of solving is written to, None for no checkpoints
+        :param checkpoint_interval: number of epochs between checkpoints, the last epoch is always saved
+        :param resume: continue from the checkpoint file if it exists, at the epoch after the saved one and
+                       with the saved random generator state (exact for deterministic spawning functions)
+        :param callback: function called with the record of each epoch, e.g. telemetry.log_epoch printing
+                         the progress, nothing is logged if None
+        :param memory_budget: Bytes the arrays of the population may take: simulation state of the whole
+                              population, purchases lists and snapshots. Solving does not start if the state alone
+                              exceeds it, snapshots are dropped at the end of an epoch if they do not fit,
+                              None for no limit.
+        :param archive_size: Number of the best purchases lists kept in the archive of the game.
+        :param return_archive: Return the archive of the best purchases lists as well.
+        :return: best candidate and all time highs of the epochs, followed by the archive of the best purchases
+                 lists if return_archive is set; the archive is also kept in the archive attribute
+        """
+        all_time_highs = []
+        if resume and checkpoint is not None and os.path.exists(checkpoint):
+            all_time_highs = load_checkpoint(checkpoint).all_time_highs
+
+        for record in self.solve_iter(
+            epochs, candidate_pool, premature_death_reincarnation, survivors_per_epoch, weighted_by,
+            fast_forward, reuse_snapshots, workers, migration, checkpoint, checkpoint_interval, resume, memory_budget,
+            archive_size
+        ):
+            if callback is not None:
+                callback(record)
+            all_time_highs += [str(record.all_time_high)]
+
+        # Simulated once at the end, also when resuming a finished run, whose best candidate is restored to the archive
+        best_candidate = self.archive.get_candidate(self) if self.archive else None
+
+        if return_archive:
+            return best_candidate, all_time_highs, self.archive
+        return best_candidate, all_time_highs
+
+    def solve_iter(
+        self,
+        epochs: int = 100,
+        candidate_pool: int = 100,
+        premature_death_reincarnation: int = 0,
+        survivors_per_epoch: int = 20,
+        weighted_by: str = None,
+        fast_forward: bool = False,
+        reuse_snapshots: bool = False,
+        workers: int = 1,
+        migration: Optional[Callable[[int, List[Candidate]], List[Genome]]] = None,
+        checkpoint: Optional[str] = None,
+        checkpoint_interval: int = 1,
+        resume: bool = False,
+        memory_budget: Optional[int] = None,
+        archive_size: int = 10
+    ) -> Iterator[EpochRecord]:
+        """
+        Solve epoch by epoch, yielding the record of each epoch once its offspring are ready.
+        Solving stops when the generator is closed, e.g. by breaking out of the loop over it.
+
+        Parameters are the same as of solve.
+
         :return:
         """
-        initial_population = self.__get_initial_population(candidate_pool)
+        state_nbytes = (candidate_pool + premature_death_reincarnation) * self.get_state_nbytes()
+        if memory_budget is not None and state_nbytes > memory_budget:
+            raise ValueError(
+                f"Simulation state of {candidate_pool + premature_death_reincarnation} candidates takes "
+                f"{state_nbytes} bytes, more than the memory budget of {memory_budget} bytes"
+            )
+
+        start = perf_counter()
+        first_epoch = 0
         highest_score = -1
-        best_candidate = None
         all_time_highs = []
+        self.archive = EliteArchive(archive_size)
+        if resume and checkpoint is not None and os.path.exists(checkpoint):
+            state = load_checkpoint(checkpoint)
+            if state.scenario != self.scenario:
+                raise ValueError(f"Checkpoint '{checkpoint}' was saved for another scenario")
+
+            first_epoch = state.epoch + 1
+            initial_population = state.genomes
+            all_time_highs = state.all_time_highs
+            if all_time_highs:
+                highest_score = int(all_time_highs[-1])
+            if state.best_genome is not None:
+                best_candidate = Candidate(state.best_genome, self)
+                best_candidate.simulate_until_death()
+                self.archive.add(state.best_genome, highest_score, best_candidate)
+            # Restored last, as simulating the best candidate may draw random numbers
+            np.random.set_state(state.random_state)
+        else:
+            with self.profiler.phase("initial_population"):
+                initial_population = self.__get_initial_population(candidate_pool)
 
-        candidates = [Candidate(purchases, self) for purchases in initial_population]
+        candidates = [
+            Candidate(purchases, self, record_snapshots=reuse_snapshots) for purchases in initial_population
+        ]
         n_must_die = candidate_pool + premature_death_reincarnation - survivors_per_epoch
 
-        for i in range(epochs):
-            left_to_add = premature_death_reincarnation
+        evaluator = ParallelEvaluator(self, workers) if workers > 1 else None
+        try:
+            for i in range(first_epoch, epochs):
+                population_size = len(candidates)
+                simulation_start = perf_counter()
+                candidates, threshold_time = self.__simulate_epoch(
+                    candidates, n_must_die, premature_death_reincarnation, fast_forward, evaluator
+                )
 
-            n_dead = 0
-            while n_dead < n_must_die:
+                if self.operator_bandit is not None:
+                    self.operator_bandit.update((perf_counter() - simulation_start) / population_size)
+                    self.p_binary = self.operator_bandit.probabilities["kind"]
+                    self.p_unary_ops = self.operator_bandit.probabilities["unary"]
+                    self.p_binary_ops = self.operator_bandit.probabilities["binary"]
 
-                for candidate in candidates:
-                    candidate.simulate_step()
+                with self.profiler.phase("archive"):
+                    for candidate in candidates:
+                        highest_score = max(highest_score, candidate.time)
+                        if self.archive.admits(candidate.genome, candidate.time):
+                            self.archive.add(candidate.genome, candidate.time, self.__get_replay(candidate))
 
-                    if candidate.base_hp <= 0:
-                        n_dead += 1
-                        if n_dead >= n_must_die:
-                            break
+                survival_times = [candidate.time for candidate in candidates]
 
-                        if left_to_add > 0:
-                            candidate.swap_sim(candidates)
-                            left_to_add -= 1
-                        else:
-                            candidates.remove(candidate)
+                with self.profiler.phase("migration"):
+                    immigrants = migration(i, candidates) if migration is not None else []
+                with self.profiler.phase("reproduction"):
+                    reproduce = (
+                        reproduction.batched_reproduction if self.reproduction == "batched"
+                        else reproduction.reproduction
+                    )
+                    candidates = reproduce(self, candidates, n_must_die - len(immigrants), weighted_by=weighted_by)
+                candidates += [
+                    Candidate(purchases, self, record_snapshots=reuse_snapshots) for purchases in immigrants
+                ]
 
-            threshold_time = candidates[0].time
+                with self.profiler.phase("refresh"):
+                    for candidate in candidates:
+                        candidate.refresh(reuse_snapshots)
+                    if memory_budget is not None:
+                        self.__enforce_memory_budget(candidates, memory_budget - state_nbytes)
 
-            for candidate in candidates:
-                while True:
-                    candidate.simulate_step()
-                    if candidate.base_hp <= 0:
-                        break
+                all_time_highs += [str(highest_score)]
+                if checkpoint is not None and ((i + 1) % checkpoint_interval == 0 or i + 1 == epochs):
+                    with self.profiler.phase("checkpoint"):
+                        save_checkpoint(
+                            checkpoint, i, self.scenario, [candidate.genome for candidate in candidates],
+                            survival_times, self.archive.best.genome if self.archive else None,
+                            all_time_highs, np.random.get_state()
+                        )
 
-                if candidate.time > highest_score:
-                    highest_score = candidate.time
-                    best_candidate = copy.deepcopy(candidate)
+                self.profiler.end_epoch(
+                    i, self.fitness_cache.get_stats() if self.fitness_cache is not None else None
+                )
+                # The best candidate is simulated only if the record is asked for it
+                yield get_epoch_record(
+                    i, threshold_time, highest_score, survival_times, population_size, perf_counter() - start,
+                    self.archive.best.genome if self.archive else None,
+                    self.archive.get_lazy_candidate(self) if self.archive else None
+                )
+        finally:
+            if evaluator is not None:
+                evaluator.shutdown()
 
-            candidates = reproduction.reproduction(self, candidates, n_must_die, weighted_by=weighted_by)
+    def solve_islands(
+        self,
+        islands: int = 4,
+        migration_interval: int = 5,
+        migrants: int = 2,
+        topology: str = "ring",
+        seed: Optional[int] = None,
+        **solve_params
+    ) -> Tuple[Optional[Candidate], List[str], List[List[str]]]:
+        """
+        Solve with several populations evolving in separate processes and exchanging their best candidates.
+
+        :param islands: Number of populations, each evolving in its own process.
+        :param migration_interval: Number of epochs between migrations.
+        :param migrants: Number of best survivors sent to another island on each migration.
+        :param topology: 'ring' - each island sends to the next one, 'random' - each island receives
+                         from a random other one on each migration
+        :param seed: Seed of the islands' random generators, drawn from the global one if None.
+        :param solve_params: Parameters of solve used by each island.
+        :return: best candidate, all time highs over all islands and all time highs of each island
+        """
+        return islands_model.solve_islands(self, islands, migration_interval, migrants, topology, seed, **solve_params)
 
+    def __simulate_epoch(
+        self,
+        candidates: List[Candidate],
+        n_must_die: int,
+        premature_death_reincarnation: int,
+        fast_forward: bool,
+        evaluator: Optional[ParallelEvaluator]
+    ) -> Tuple[List[Candidate], int]:
+        """
+        Simulate the population until all the candidates die, eliminating the first of them.
+
+        :param candidates: population of the epoch
+        :param n_must_die: number of candidates to die
+        :param premature_death_reincarnation: number of dead candidates to replace by mutation of still living one
+        :param fast_forward: compute the death time directly once there are no pending purchases
+        :param evaluator: pool of worker processes, None to simulate in this process only
+        :return: surviving candidates and time at which the elimination has finished
+        """
+        self.spawn_table.reset()
+
+        population = list(candidates)
+        fitness_cache = self.__get_fitness_cache()
+        if fitness_cache is not None:
             for candidate in candidates:
-                candidate.refresh()
+                candidate.fitness = fitness_cache.get(candidate.genome)
 
-            print("[{: 4}] Threshold time: {: 6}    |    All time high: {: 6}".format(i, threshold_time, highest_score))
-            all_time_highs += [str(highest_score)]
+        if evaluator is not None and premature_death_reincarnation == 0 and n_must_die > 0:
+            # Without reincarnation the candidates do not affect each other
+            self.__evaluate_in_parallel(evaluator, candidates, fast_forward)
+            return self.__select_survivors(candidates, n_must_die)
 
-        return best_candidate, all_time_highs
+        if self.engine != "batch":
+            candidates, threshold_time = self.__eliminate(
+                candidates, n_must_die, premature_death_reincarnation, fast_forward, evaluator
+            )
+        else:
+            with self.profiler.phase("elimination"):
+                candidates, simulator = self.__eliminate_batched(
+                    candidates, n_must_die, premature_death_reincarnation
+                )
+            threshold_time = simulator.time
+            if evaluator is None:
+                with self.profiler.phase("tail"):
+                    simulator.run_to_death(fast_forward)
+            else:
+                with self.profiler.phase("tail"):
+                    simulator.store()
+                    for candidate in candidates:
+                        if candidate.fitness is not None:
+                            candidate.apply_fitness()
+                        elif candidate.base_hp > 0 and candidate.reincarnated:
+                            candidate.simulate_until_death(fast_forward)
+
+                # Survivors which have not been reincarnated are simulated again from scratch
+                self.__evaluate_in_parallel(
+                    evaluator,
+                    [candidate for candidate in candidates if candidate.base_hp > 0 and not candidate.reincarnated],
+                    fast_forward
+                )
+
+        if fitness_cache is not None:
+            for candidate in population:
+                if candidate.fitness is None and not candidate.reincarnated:
+                    fitness_cache.put(
+                        candidate.genome, Fitness(candidate.time, candidate.gold, candidate.base_hp)
+                    )
+
+        survivors = {id(candidate) for candidate in candidates}
+        for candidate in population:
+            if id(candidate) not in survivors:
+                candidate.release_state()
+
+        return candidates, threshold_time
@@ -0,0 +1,132 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Adaptive selection of the reproduction operators.
+"""
+import numpy as np
+from collections import defaultdict
+from typing import List, Dict, Optional
+
+UNARY = "unary"
+BINARY = "binary"
+
+
+class OperatorBandit:
+    def __init__(
+        self,
+        unary_operators: List[str],
+        binary_operators: List[str],
+        p_binary: Optional[np.ndarray] = None,
+        p_unary_ops: Optional[np.ndarray] = None,
+        p_binary_ops: Optional[np.ndarray] = None,
+        learning_rate: float = 0.3,
+        min_probability: float = 0.02
+    ) -> None:
+        """
+        Multi-armed bandit choosing the reproduction operators by probability matching. Each operator is rewarded
+        with the survival time its offspring gained over their parents per second spent on it: on its attempts,
+        failed ones included, and on simulating its offspring. The rewards are averaged over epochs with
+        exponential decay and the operators, as well as unary against binary reproduction, are drawn
+        proportionally to them, every one with at least the minimum probability.
+
+        :param unary_operators: names of the unary operators
+        :param binary_operators: names of the binary operators
+        :param p_binary: initial probabilities of unary and binary reproduction, uniform if None
+        :param p_unary_ops: initial probabilities of the unary operators, uniform if None
+        :param p_binary_ops: initial probabilities of the binary operators, uniform if None
+        :param learning_rate: weight of the reward of the last epoch in the average
+        :param min_probability: probability below which no arm falls, so that none is abandoned for good
+        """
+        self.learning_rate = learning_rate
+        self.min_probability = min_probability
+        self.arms = {
+            "kind": [UNARY, BINARY],
+            UNARY: list(unary_operators),
+            BINARY: list(binary_operators),
+        }
+        self.kinds = dict(
+            [(name, UNARY) for name in unary_operators] + [(name, BINARY) for name in binary_operators]
+        )
+        self.probabilities = {
+            group: np.array(p, dtype=float) if p is not None else np.ones(len(self.arms[group])) / len(self.arms[group])
+            for group, p in (("kind", p_binary), (UNARY, p_unary_ops), (BINARY, p_binary_ops))
+        }
+        self.rewards = {}
+        self.history = []
+
+        self.attempts = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.offspring = []
+
+    def record(self, operator: str, seconds: float, parent_time: int, offspring=None) -> None:
+        """
+        Record an attempt of an operator.
+
+        :param operator: name of the operator
+        :param seconds: time spent on the attempt
+        :param parent_time: survival time of the (first) parent
+        :param offspring: candidate created, None if the attempt failed
+        :return:
+        """
+        self.attempts[operator] += 1
+        self.seconds[operator] += seconds
+        if offspring is not None:
+            self.offspring.append((operator, parent_time, offspring))
+
+    def update(self, seconds_per_candidate: float) -> None:
+        """
+        Update the probabilities once the offspring recorded since the last update have been simulated.
+
+        :param seconds_per_candidate: time spent on simulating a candidate in the last epoch
+        :return:
+        """
+        gains = defaultdict(float)
+        successes = defaultdict(int)
+        for operator, parent_time, offspring in self.offspring:
+            gains[operator] += max(offspring.time - parent_time, 0)
+            successes[operator] += 1
+
+        costs = {
+            operator: self.seconds[operator] + successes[operator] * seconds_per_candidate
+            for operator in self.attempts
+        }
+        rates = {operator: gains[operator] / cost if cost > 0 else 0.0 for operator, cost in costs.items()}
+        for kind in self.arms["kind"]:
+            operators = [operator for operator in self.attempts if self.kinds[operator] == kind]
+            cost = sum(costs[operator] for operator in operators)
+            if operators:
+                rates[kind] = sum(gains[operator] for operator in operators) / cost if cost > 0 else 0.0
+
+        for arm, rate in rates.items():
+            previous = self.rewards.get(arm)
+            self.rewards[arm] = (
+                rate if previous is None else (1 - self.learning_rate) * previous + self.learning_rate * rate
+            )
+
+        for group, arms in self.arms.items():
+            known = [self.rewards[arm] for arm in arms if arm in self.rewards]
+            if not known or sum(known) <= 0:
+                continue
+            # Arms not tried yet are assumed to be as good as the average of the others
+            rewards = np.array([self.rewards.get(arm, np.mean(known)) for arm in arms])
+            self.probabilities[group] = (
+                self.min_probability + (1 - len(arms) * self.min_probability) * rewards / rewards.sum()
+            )
+
+        self.history.append(self.get_probabilities())
+        self.attempts.clear()
+        self.seconds.clear()
+        self.offspring = []
+
+    def get_probabilities(self) -> Dict[str, Dict[str, float]]:
+        """
+        Current probabilities of the arms by group: 'kind' (unary or binary reproduction), 'unary' and 'binary'.
+
+        :return:
+        """
+        return {
+            group: {arm: float(p) for arm, p in zip(arms, self.probabilities[group])}
+            for group, arms in self.arms.items()
+        }
@@ -0,0 +1,138 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Archive of the best purchases lists found.
+"""
+# Required for typing class inside itself
+from __future__ import annotations
+
+from tower_defence_solver import TowerDefenceSolver
+from tower_defence_solver.candidate import Candidate
+from tower_defence_solver.genome import Genome
+from typing import List, Dict, Callable, Iterator, NamedTuple, Optional
+
+
+class Elite(NamedTuple):
+    """
+    Purchases list in the archive with its survival time.
+    """
+    time: int
+    genome: Genome
+    # Candidate reproducing the survival time, None until simulated on demand
+    candidate: Optional[Candidate] = None
+
+
+class EliteArchive:
+    def __init__(self, size: int = 10) -> None:
+        """
+        Archive of the purchases lists with the longest survival times, each list kept once.
+        Elites with the same survival time are ranked in the order they were added.
+
+        Only the purchases lists are kept, the candidates are simulated again on demand. Candidates whose simulation
+        does not follow their purchases list, i.e. reincarnated ones or any with a random spawning function,
+        have to be added along with themselves (copied), which is then kept instead.
+
+        :param size: number of elites kept
+        """
+        self.size = size
+        self.elites: List[Elite] = []
+        self.times: Dict[bytes, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.elites)
+
+    def __iter__(self) -> Iterator[Elite]:
+        return iter(self.elites)
+
+    def __getitem__(self, rank: int) -> Elite:
+        return self.elites[rank]
+
+    @property
+    def best(self) -> Optional[Elite]:
+        """
+        Elite with the longest survival time.
+
+        :return: None if the archive is empty
+        """
+        return self.elites[0] if self.elites else None
+
+    def admits(self, genome: Genome, time: int) -> bool:
+        """
+        Check if a purchases list with the given survival time would enter the archive.
+
+        :param genome: purchases list
+        :param time: survival time
+        :return:
+        """
+        known_time = self.times.get(genome.tobytes())
+        if known_time is not None:
+            return time > known_time
+        return len(self.elites) < self.size or time > self.elites[-1].time
+
+    def add(self, genome: Genome, time: int, candidate: Optional[Candidate] = None) -> bool:
+        """
+        Add a purchases list, replacing its previous entry if it has survived longer.
+
+        :param genome: purchases list
+        :param time: survival time
+        :param candidate: candidate whose survival time is not reproduced by simulating the purchases list
+        :return: whether the purchases list has entered the archive
+        """
+        if not self.admits(genome, time):
+            return False
+
+        key = genome.tobytes()
+        if key in self.times:
+            self.elites = [elite for elite in self.elites if elite.genome.tobytes() != key]
+        self.times[key] = time
+
+        rank = len(self.elites)
+        while rank > 0 and self.elites[rank - 1].time < time:
+            rank -= 1
+        self.elites.insert(rank, Elite(time, genome.copy(), candidate))
+
+        if len(self.elites) > self.size:
+            del self.times[self.elites.pop().genome.tobytes()]
+        return True
+
+    def get_candidate(self, game: TowerDefenceSolver, rank: int = 0) -> Candidate:
+        """
+        Candidate of an elite, simulated until death on the first request.
+
+        :param game: Instance of tower defence emulator
+        :param rank: rank of the elite, 0 for the best one
+        :return:
+        """
+        elite = self.elites[rank]
+        if elite.candidate is None:
+            candidate = Candidate(elite.genome, game)
+            candidate.simulate_until_death()
+            elite = self.elites[rank] = elite._replace(candidate=candidate)
+        return elite.candidate
+
+    def get_lazy_candidate(self, game: TowerDefenceSolver, rank: int = 0) -> Callable[[], Candidate]:
+        """
+        Function returning the candidate of an elite as it is now, simulated on the first call only,
+        even once the elite has been pushed out of the archive.
+
+        :param game: Instance of tower defence emulator
+        :param rank: rank of the elite, 0 for the best one
+        :return:
+        """
+        elite = self.elites[rank]
+
+        def get_candidate() -> Candidate:
+            nonlocal elite
+            for other_rank, other in enumerate(self.elites):
+                if other.genome is elite.genome:
+                    return self.get_candidate(game, other_rank)
+
+            if elite.candidate is None:
+                candidate = Candidate(elite.genome, game)
+                candidate.simulate_until_death()
+                elite = elite._replace(candidate=candidate)
+            return elite.candidate
+
+        return get_candidate
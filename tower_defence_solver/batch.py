@@ -0,0 +1,310 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Population-batched simulation.
+"""
+import numpy as np
+from tower_defence_solver import TowerDefenceSolver
+from tower_defence_solver.candidate import Candidate, Snapshot
+from tower_defence_solver.genome import get_empty_genome
+from typing import List, Optional
+
+
+class BatchSimulator:
+    def __init__(self, game: TowerDefenceSolver, candidates: List[Candidate], time: Optional[int] = None) -> None:
+        """
+        Simulator advancing the whole population at once.
+
+        The state of every live candidate is held as rows of stacked arrays indexed by the position on the path,
+        all candidates are stepped together with the same time. Candidates are loaded from their path-space state
+        and the state is stored back into them once they die (or on request). Candidates resumed at a later time
+        join the simulation once it reaches their time.
+
+        :param game: Instance of tower defence emulator
+        :param candidates: candidates to simulate
+        :param time: time to start the simulation at, the earliest time of the candidates by default
+        """
+        self.game = game
+        self.time = time if time is not None else min([candidate.time for candidate in candidates], default=0)
+        self.waiting = []
+
+        path_len = len(game.path)
+        self.candidates = []
+        self.opponent_hp = np.zeros((0, path_len), dtype=game.dtype)
+        self.dmg = np.zeros((0, path_len), dtype=game.dtype)
+        self.gold = np.zeros(0, dtype=game.dtype)
+        self.base_hp = np.zeros(0, dtype=game.dtype)
+
+        # Pending purchases of all candidates flattened, each row reads them from cursor to end
+        self.purchases = get_empty_genome()
+        self.purchase_cost = np.zeros(0)
+        self.cursor = np.zeros(0, dtype=int)
+        self.end = np.zeros(0, dtype=int)
+        self.head_time = np.zeros(0, dtype=int)
+        self.towers = []
+        self.bought = []
+
+        self.n_bought = np.zeros(0, dtype=int)
+        self.recording = np.zeros(0, dtype=bool)
+        self.snapshot_n_bought = np.zeros(0, dtype=int)
+
+        self.add(candidates)
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def add(self, candidates: List[Candidate]) -> None:
+        """
+        Load candidates into the simulation.
+
+        :param candidates: candidates to load, those ahead of the simulation time wait until it reaches them
+        :return:
+        """
+        for candidate in candidates:
+            if candidate.time < self.time:
+                raise ValueError(f"Candidate at time {candidate.time} cannot join simulation at time {self.time}")
+
+        self.waiting.extend(candidate for candidate in candidates if candidate.time > self.time)
+        candidates = [candidate for candidate in candidates if candidate.time == self.time]
+        if not candidates:
+            return
+
+        pending = [candidate.pending[candidate.cursor:] for candidate in candidates]
+        end = len(self.purchases) + np.cumsum([len(purchases) for purchases in pending], dtype=int)
+        cursor = end - [len(purchases) for purchases in pending]
+        self.purchases = np.concatenate([self.purchases] + pending)
+
+        for candidate in candidates:
+            self.towers.append(dict(candidate.towers))
+            self.bought.append([dict(tower) for tower in candidate.bought_purchases])
+
+        self.candidates.extend(candidates)
+        # The state of candidates which have not started the simulation yet is not allocated
+        empty = np.zeros(self.opponent_hp.shape[1], dtype=self.opponent_hp.dtype)
+        self.opponent_hp = np.vstack([self.opponent_hp] + [
+            candidate.opponent_hp if candidate.opponent_hp is not None else empty for candidate in candidates
+        ])
+        self.dmg = np.vstack([self.dmg] + [
+            candidate.dmg_map if candidate.dmg_map is not None else empty for candidate in candidates
+        ])
+        self.gold = np.append(self.gold, np.array([candidate.gold for candidate in candidates], dtype=self.gold.dtype))
+        self.base_hp = np.append(
+            self.base_hp, np.array([candidate.base_hp for candidate in candidates], dtype=self.base_hp.dtype)
+        )
+
+        self.purchase_cost = np.append(
+            self.purchase_cost,
+            [self.game.tower_types[tower_type]["cost"] for tower_type in self.purchases["type"][cursor[0]:].tolist()]
+        )
+        self.cursor = np.append(self.cursor, cursor)
+        self.end = np.append(self.end, end)
+        self.head_time = np.append(self.head_time, [candidate.head_time for candidate in candidates])
+
+        self.n_bought = np.append(self.n_bought, [len(candidate.bought_purchases) for candidate in candidates])
+        self.recording = np.append(self.recording, [candidate.record_snapshots for candidate in candidates])
+        self.snapshot_n_bought = np.append(
+            self.snapshot_n_bought,
+            [candidate.snapshots[-1].n_bought if candidate.snapshots else -1 for candidate in candidates]
+        )
+
+    def __join_waiting(self) -> None:
+        """
+        Load the waiting candidates which are at the simulation time.
+
+        :return:
+        """
+        if not self.waiting:
+            return
+
+        joining = [candidate for candidate in self.waiting if candidate.time == self.time]
+        if joining:
+            self.waiting = [candidate for candidate in self.waiting if candidate.time != self.time]
+            self.add(joining)
+
+    def __take_snapshots(self) -> None:
+        """
+        Record snapshots of the recording rows with a purchase due, once per purchase.
+
+        :return:
+        """
+        rows = np.flatnonzero(
+            (self.head_time == self.time) & self.recording & (self.snapshot_n_bought != self.n_bought)
+        )
+        for row in rows:
+            self.candidates[row].snapshots.append(Snapshot(
+                time=self.time,
+                n_bought=int(self.n_bought[row]),
+                head_time=int(self.head_time[row]),
+                opponent_hp=self.opponent_hp[row].copy(),
+                gold=self.gold[row],
+                base_hp=self.base_hp[row],
+                bought_purchases=list(self.bought[row]),
+                delayed_purchases=list(self.candidates[row].delayed_purchases)
+            ))
+        self.snapshot_n_bought[rows] = self.n_bought[rows]
+
+    def __get_head_time(self, cursor: np.array, end: np.array) -> np.array:
+        """
+        Time of the first pending purchase of each row, -1 when there are no more purchases.
+
+        :param cursor: indexes of the first pending purchases
+        :param end: indexes past the last purchases of the rows
+        :return:
+        """
+        head_time = np.full(len(cursor), -1, dtype=int)
+        pending = cursor < end
+        head_time[pending] = self.purchases["time"][cursor[pending]]
+        return head_time
+
+    def __do_purchases(self) -> None:
+        """
+        Do purchases due at the current time for all rows, postpone those which cannot be afforded.
+
+        :return:
+        """
+        due = np.flatnonzero(self.head_time == self.time)
+        while len(due) > 0:
+            cost = self.purchase_cost[self.cursor[due]]
+            affordable = cost <= self.gold[due]
+            if self.game.record_delays:
+                for row in due[~affordable]:
+                    _, purchase_row, purchase_col, tower_type = self.purchases[self.cursor[row]].tolist()
+                    self.candidates[row].delayed_purchases.append(
+                        (int(self.head_time[row]), purchase_row, purchase_col, tower_type)
+                    )
+            self.head_time[due[~affordable]] += 1
+
+            buyers = due[affordable]
+            if len(buyers) == 0:
+                break
+
+            rows, path_indices, path_dmg = [], [], []
+            for row in buyers:
+                _, purchase_row, purchase_col, tower_type = self.purchases[self.cursor[row]].tolist()
+                purchase = {"time": self.time, "coords": (purchase_row, purchase_col), "type": tower_type}
+                prior_type = self.towers[row].get(purchase["coords"])
+                if prior_type is not None:
+                    # Rebuy - the tower standing on the spot is removed first
+                    prior_footprint = self.game.influence_index.get_footprint(purchase["coords"], prior_type)
+                    self.dmg[row, prior_footprint.path_indices] -= prior_footprint.path_dmg
+                self.towers[row].setdefault(purchase["coords"], purchase["type"])
+                self.bought[row].append(purchase)
+
+                footprint = self.game.influence_index.get_footprint(purchase["coords"], purchase["type"])
+                rows.append(np.full(len(footprint.path_indices), row))
+                path_indices.append(footprint.path_indices)
+                path_dmg.append(footprint.path_dmg)
+
+            self.gold[buyers] -= cost[affordable]
+            # Every buyer has a single purchase done at once, so the (row, path index) pairs do not repeat
+            self.dmg[np.concatenate(rows), np.concatenate(path_indices)] += np.concatenate(path_dmg)
+
+            self.cursor[buyers] += 1
+            self.n_bought[buyers] += 1
+            self.head_time[buyers] = self.__get_head_time(self.cursor[buyers], self.end[buyers])
+            due = buyers[self.head_time[buyers] == self.time]
+
+    def store(self, rows: np.array = None) -> None:
+        """
+        Store the simulation state back into the candidates.
+
+        :param rows: rows to store, all if None
+        :return:
+        """
+        rows = range(len(self.candidates)) if rows is None else rows
+        for row in rows:
+            candidate = self.candidates[row]
+            candidate.opponent_hp = self.opponent_hp[row].copy()
+            candidate.dmg_map = self.dmg[row].copy()
+            candidate.gold = self.gold[row]
+            candidate.base_hp = self.base_hp[row]
+            candidate.time = self.time
+
+            candidate.pending = self.purchases[self.cursor[row]:self.end[row]]
+            candidate.cursor = 0
+            candidate.head_time = int(self.head_time[row])
+            candidate.bought_purchases = self.bought[row]
+            candidate.towers = self.towers[row]
+
+    def __drop(self, keep: np.array) -> None:
+        """
+        Drop rows from the simulation.
+
+        :param keep: boolean mask of rows to keep
+        :return:
+        """
+        self.candidates = [candidate for candidate, alive in zip(self.candidates, keep) if alive]
+        self.towers = [towers for towers, alive in zip(self.towers, keep) if alive]
+        self.bought = [bought for bought, alive in zip(self.bought, keep) if alive]
+        self.opponent_hp = self.opponent_hp[keep]
+        self.dmg = self.dmg[keep]
+        self.gold = self.gold[keep]
+        self.base_hp = self.base_hp[keep]
+        self.cursor = self.cursor[keep]
+        self.end = self.end[keep]
+        self.head_time = self.head_time[keep]
+        self.n_bought = self.n_bought[keep]
+        self.recording = self.recording[keep]
+        self.snapshot_n_bought = self.snapshot_n_bought[keep]
+
+    def step(self) -> List[Candidate]:
+        """
+        Simulate one step of all loaded candidates.
+
+        :return: candidates which died in this step (in the order they were loaded), already stored and dropped
+        """
+        self.__join_waiting()
+        if self.recording.any():
+            self.__take_snapshots()
+
+        # Apply damage to opponent units and obtain gold
+        dealt_dmg = np.minimum(self.opponent_hp, self.dmg)
+        self.gold += self.game.dmg_to_gold_factor * np.sum(dealt_dmg, axis=1)
+        self.opponent_hp -= dealt_dmg
+
+        # Apply damage to the bases
+        self.base_hp -= self.opponent_hp[:, -1]
+
+        self.__do_purchases()
+
+        # Move opponent units forward
+        self.opponent_hp[:, 1:] = self.opponent_hp[:, :-1]
+        self.opponent_hp[:, 0] = self.game.spawn_table.get(self.time)
+
+        self.time += 1
+        self.game.profiler.ticks += len(self.base_hp)
+
+        dead = self.base_hp <= 0
+        if not dead.any():
+            return []
+
+        dead_rows = np.flatnonzero(dead)
+        self.store(dead_rows)
+        dead_candidates = [self.candidates[row] for row in dead_rows]
+        self.__drop(~dead)
+
+        return dead_candidates
+
+    def run_to_death(self, fast_forward: bool = False) -> None:
+        """
+        Simulate all loaded candidates until every one of them dies.
+
+        :param fast_forward: compute the death time directly for candidates with no pending purchases
+        :return:
+        """
+        while self.candidates or self.waiting:
+            self.__join_waiting()
+            if fast_forward:
+                exhausted = self.head_time < self.time
+                if exhausted.any():
+                    rows = np.flatnonzero(exhausted)
+                    self.store(rows)
+                    for row in rows:
+                        self.candidates[row].fast_forward()
+                    self.__drop(~exhausted)
+                    continue
+
+            self.step()
+
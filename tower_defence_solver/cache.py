@@ -0,0 +1,125 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Fitness memoization.
+"""
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from tower_defence_solver.genome import Genome, to_genome
+from typing import List, Tuple, Dict, Optional, NamedTuple, Union
+
+
+class Fitness(NamedTuple):
+    """
+    Summary of the final state of a simulated candidate.
+    """
+    time: int
+    gold: float
+    base_hp: float
+
+
+def get_scenario_fingerprint(
+    map_width: int,
+    map_height: int,
+    path: List[Tuple[int, int]],
+    tower_types: Dict[int, Dict],
+    enemy_spawning_function,
+    initial_hp: int,
+    initial_gold: int,
+    dmg_to_gold_factor: float,
+    dtype: str = "float64"
+) -> str:
+    """
+    Hash of all the parameters a simulation result depends on, besides the purchases.
+
+    :return:
+    """
+    digest = hashlib.sha1()
+    digest.update(repr((map_width, map_height, [tuple(map(int, cell)) for cell in path])).encode())
+    for tower_type in sorted(tower_types):
+        patch = np.asarray(tower_types[tower_type]["dmg"], dtype=float)
+        digest.update(repr((int(tower_type), patch.shape, float(tower_types[tower_type]["cost"]))).encode())
+        digest.update(patch.tobytes())
+    spawning_function_name = getattr(enemy_spawning_function, "__qualname__", repr(enemy_spawning_function))
+    digest.update(repr((
+        getattr(enemy_spawning_function, "__module__", None), spawning_function_name,
+        float(initial_hp), float(initial_gold), float(dmg_to_gold_factor)
+    )).encode())
+    # Results of the default double precision stay valid for fingerprints from before the option existed
+    if np.dtype(dtype) != np.float64:
+        digest.update(np.dtype(dtype).str.encode())
+    return digest.hexdigest()
+
+
+class FitnessCache:
+    def __init__(self, max_size: int, scenario: str = "") -> None:
+        """
+        Least recently used cache of simulation results keyed by the purchases list.
+        The order of the list is kept in the key, as purchases are done in that order.
+
+        :param max_size: maximal number of kept results
+        :param scenario: fingerprint of the scenario the results come from
+        """
+        self.max_size = max_size
+        self.scenario = scenario
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_key(self, purchases: Union[Genome, List[Dict]]) -> str:
+        """
+        Key of the purchases list in the scenario.
+
+        :param purchases: genome or list of purchases
+        :return:
+        """
+        digest = hashlib.sha1(self.scenario.encode())
+        digest.update(to_genome(purchases).tobytes())
+        return digest.hexdigest()
+
+    def get(self, purchases: Union[Genome, List[Dict]]) -> Optional[Fitness]:
+        """
+        Get the result of simulating the purchases list.
+
+        :param purchases: genome or list of purchases
+        :return: the result if known, None otherwise
+        """
+        key = self.get_key(purchases)
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return fitness
+
+    def put(self, purchases: Union[Genome, List[Dict]], fitness: Fitness) -> None:
+        """
+        Store the result of simulating the purchases list.
+
+        :param purchases: genome or list of purchases
+        :param fitness: result of the simulation
+        :return:
+        """
+        key = self.get_key(purchases)
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Counters of the cache usage.
+
+        :return:
+        """
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
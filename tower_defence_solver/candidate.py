@@ -12,29 +12,131 @@ import copy
 import numpy as np
 from tower_defence_solver.utils import get_dmg_patch
 from tower_defence_solver import TowerDefenceSolver, utils
-from typing import List, Dict
+from tower_defence_solver.genome import Genome, to_genome, to_purchases, sort_genome, get_common_prefix
+from typing import List, Dict, Tuple, NamedTuple, Optional, Union
+
+
+class Snapshot(NamedTuple):
+    """
+    State of the simulation at the beginning of a step with a purchase due.
+    """
+    time: int
+    n_bought: int  # number of purchases from the purchases list done so far
+    head_time: int  # time of the first pending purchase, might be already postponed
+    opponent_hp: np.array  # opponent health along the path
+    gold: float
+    base_hp: float
+    bought_purchases: List[Dict]
+    delayed_purchases: List[Tuple]
 
 
 class Candidate:
-    def __init__(self, purchases: List[Dict], game: TowerDefenceSolver, time: int = 0) -> None:
+    __slots__ = (
+        "game", "time", "dmg_map", "opponent_hp", "gold", "base_hp", "genome", "pending", "cursor", "head_time",
+        "delayed_purchases", "bought_purchases", "towers", "fitness", "reincarnated", "record_snapshots",
+        "snapshots", "snapshots_genome"
+    )
+
+    def __init__(
+        self,
+        purchases: Union[Genome, List[Dict]],
+        game: TowerDefenceSolver,
+        time: int = 0,
+        parent: Optional[Candidate] = None,
+        record_snapshots: bool = False
+    ) -> None:
         """
         Candidate instance.
 
-        :param purchases:
+        :param purchases: genome or list of purchases
         :param game:
+        :param time:
+        :param parent: candidate whose purchases this candidate's purchases are derived from,
+                       its snapshots are used to resume the simulation
+        :param record_snapshots: record snapshots of the simulation state at purchases (inherited from parent)
         """
         self.game = game
-        self.purchases = purchases
         self.time = time
-        self.dmg_map = np.zeros((self.game.map_height, self.game.map_width))
-        self.opponent_hp = np.zeros((self.game.map_height, self.game.map_width))
-        self.gold = self.game.initial_gold
-        self.base_hp = self.game.initial_hp
+        # Simulation state, allocated once the simulation starts and released once the candidate is eliminated
+        self.dmg_map = None
+        self.opponent_hp = None
+        self.gold = self.game.dtype.type(self.game.initial_gold)
+        self.base_hp = self.game.dtype.type(self.game.initial_hp)
 
-        self.initial_purchases = copy.deepcopy(purchases)
+        # Initial purchases, never modified
+        self.genome = to_genome(purchases)
+        # Purchases queue read from the cursor, the first pending one is planned for head_time
+        self.pending = self.genome
+        self.cursor = 0
+        self.head_time = self.__get_head_time()
 
+        # Delayed purchases as (time, row, col, type) tuples, recorded only if the game records delays
         self.delayed_purchases = []
         self.bought_purchases = []
+        # Type of the first tower bought on each occupied spot
+        self.towers = {}
+
+        # Known result of simulating the initial purchases, the simulation is skipped if available
+        self.fitness = None
+        # Whether the state was replaced by mutation of another candidate
+        self.reincarnated = False
+
+        # Snapshots taken while simulating snapshots_genome
+        if parent is None:
+            self.record_snapshots = record_snapshots
+            self.snapshots = []
+            self.snapshots_genome = self.genome
+        else:
+            self.record_snapshots = parent.record_snapshots
+            self.snapshots = parent.snapshots
+            self.snapshots_genome = parent.snapshots_genome
+
+    def __deepcopy__(self, memo: Dict) -> Candidate:
+        """
+        Copy of the candidate sharing the game and the purchases lists, which are never modified in place.
+
+        :param memo: objects already copied
+        :return:
+        """
+        candidate = Candidate.__new__(Candidate)
+        memo[id(self)] = candidate
+        for name in self.__slots__:
+            setattr(candidate, name, getattr(self, name))
+
+        for name in ("dmg_map", "opponent_hp", "bought_purchases", "towers"):
+            setattr(candidate, name, copy.deepcopy(getattr(self, name), memo))
+        candidate.delayed_purchases = list(self.delayed_purchases)
+        candidate.snapshots = list(self.snapshots)
+        return candidate
+
+    @property
+    def initial_purchases(self) -> List[Dict]:
+        """
+        Initial purchases as a list of dictionaries.
+
+        :return:
+        """
+        return to_purchases(self.genome)
+
+    @property
+    def purchases(self) -> List[Dict]:
+        """
+        Pending purchases as a list of dictionaries, the first one with the time it is currently planned for.
+
+        :return:
+        """
+        purchases = to_purchases(self.pending[self.cursor:])
+        if purchases:
+            purchases[0]["time"] = self.head_time
+        return purchases
+
+    def __get_head_time(self) -> int:
+        """
+        Planned time of the purchase at the cursor, -1 when there are no more purchases.
+
+        :return:
+        """
+        return int(self.pending[self.cursor]["time"]) if self.cursor < len(self.pending) else -1
 
     def __repr__(self) -> str:
         """
@@ -43,8 +145,9 @@ class Candidate:
         :return:
         """
         frame = "\n[CANDIDATE]\n\tTIME = {}, HP = {}, GOLD = {}".format(self.time, self.base_hp, self.gold)
-        frame += "\n\nOPPONENT HP MAP:\n" + str(self.opponent_hp)
-        frame += "\n\nTOWER DAMAGE MAP:\n" + str(self.dmg_map)
+        opponent_hp = self.opponent_hp if self.opponent_hp is not None else self.get_empty_state()
+        frame += "\n\nOPPONENT HP MAP:\n" + str(opponent_hp)
+        frame += "\n\nTOWER DAMAGE MAP:\n" + str(self.get_dmg_map())
         frame += "\n\nPlanned purchases:\n\t" + str(self.initial_purchases) + "\n"
 
         unique_delays = self.get_unique_delays()
@@ -67,51 +170,188 @@ class Candidate:
         while base_candidate == self:
             base_candidate = np.random.choice(candidates)
 
-        self.purchases = copy.deepcopy(base_candidate.purchases)
+        if base_candidate.fitness is not None:
+            base_candidate.catch_up()
+
+        pending = base_candidate.pending[base_candidate.cursor:].copy()
+        if len(pending) > 0:
+            pending[0]["time"] = base_candidate.head_time
         self.dmg_map = np.copy(base_candidate.dmg_map)
         self.opponent_hp = np.copy(base_candidate.opponent_hp)
         self.time = base_candidate.time
         self.gold = base_candidate.gold
 
-        purchases_todo = [purchase for purchase in self.purchases if purchase["time"] >= self.time]
-        for purchase in purchases_todo:
-            modified_purchase = utils.get_random_purchase(self.game, self.purchases, self.time)
+        # From now on the simulation does not follow the initial purchases
+        self.reincarnated = True
+        self.fitness = None
+
+        for i in np.flatnonzero(pending["time"] >= self.time):
             # Randomly change tower type, position and maybe buy a bit later
-            purchase["type"] = modified_purchase["type"]
-            purchase["coords"] = modified_purchase["coords"]
-            purchase["time"] = modified_purchase["time"]
+            purchase = utils.get_random_purchase(self.game, pending, self.time)
+            if purchase is not None:
+                pending[i] = purchase
 
         future_purchases = np.random.choice(3)
         for _ in range(future_purchases):
-            self.purchases.append(utils.get_random_purchase(self.game, self.purchases, self.time))
+            purchase = utils.get_random_purchase(self.game, pending, self.time)
+            if purchase is not None:
+                pending = np.append(pending, np.array([purchase], dtype=pending.dtype))
 
-        self.purchases = sorted(self.purchases, key=lambda x: x["time"])
+        self.pending = sort_genome(pending)
+        self.cursor = 0
+        self.head_time = self.__get_head_time()
 
-    def refresh(self) -> None:
+    def refresh(self, reuse_snapshots: bool = False) -> None:
         """
         Refresh candidate to the state before simulation.
 
+        :param reuse_snapshots: resume from the latest snapshot which is shared with the simulation of the
+                                initial purchases (exact for deterministic spawning functions)
         :return:
         """
-        self.purchases = copy.deepcopy(self.initial_purchases)
-        self.dmg_map = np.zeros((self.game.map_height, self.game.map_width))
-        self.opponent_hp = np.zeros((self.game.map_height, self.game.map_width))
+        self.pending = self.genome
+        self.cursor = 0
+        self.head_time = self.__get_head_time()
+        self.dmg_map = None
+        self.opponent_hp = None
         self.time = 0
-        self.gold = self.game.initial_gold
-        self.base_hp = self.game.initial_hp
+        self.gold = self.game.dtype.type(self.game.initial_gold)
+        self.base_hp = self.game.dtype.type(self.game.initial_hp)
 
         self.delayed_purchases = []
         self.bought_purchases = []
+        self.towers = {}
+
+        self.fitness = None
+        self.reincarnated = False
+
+        self.record_snapshots = reuse_snapshots
+        if reuse_snapshots:
+            self.__resume_from_snapshot()
+        else:
+            self.snapshots = []
+        self.snapshots_genome = self.genome
+
+    def get_snapshot(self) -> Snapshot:
+        """
+        Take snapshot of the current state.
+
+        :return:
+        """
+        if self.game.engine != "map":
+            opponent_hp = self.opponent_hp.copy()
+        else:
+            opponent_hp = self.opponent_hp[self.game.path_rows, self.game.path_cols]
+
+        return Snapshot(
+            time=self.time,
+            n_bought=len(self.bought_purchases),
+            head_time=self.head_time,
+            opponent_hp=opponent_hp,
+            gold=self.gold,
+            base_hp=self.base_hp,
+            bought_purchases=list(self.bought_purchases),
+            delayed_purchases=list(self.delayed_purchases)
+        )
+
+    def __resume_from_snapshot(self) -> None:
+        """
+        Resume the refreshed candidate from the latest snapshot shared by its initial purchases.
+
+        Simulations of two purchases lists are the same until the time of the first purchase in which they differ,
+        as purchases are done in the order of the list, each one not earlier than planned.
+
+        :return:
+        """
+        n_common = get_common_prefix(self.genome, self.snapshots_genome)
+        first_difference = min(
+            [genome[n_common]["time"] for genome in (self.genome, self.snapshots_genome) if n_common < len(genome)],
+            default=np.inf
+        )
+
+        snapshots = [snapshot for snapshot in self.snapshots if snapshot.time <= first_difference]
+        self.snapshots = snapshots
+        if not snapshots:
+            return
+
+        snapshot = snapshots[-1]
+        self.allocate_state()
+        self.time = snapshot.time
+        self.gold = snapshot.gold
+        self.base_hp = snapshot.base_hp
+        self.bought_purchases = list(snapshot.bought_purchases)
+        self.delayed_purchases = list(snapshot.delayed_purchases)
+
+        self.cursor = snapshot.n_bought
+        self.head_time = snapshot.head_time if snapshot.n_bought < n_common else self.__get_head_time()
+
+        if self.game.engine != "map":
+            self.opponent_hp = snapshot.opponent_hp.copy()
+        else:
+            self.opponent_hp[self.game.path_rows, self.game.path_cols] = snapshot.opponent_hp
+
+        for purchase in self.bought_purchases:
+            utils.check_for_tower_rebuy(self.game, purchase, self.towers, self.dmg_map)
+            utils.add_tower_dmg(self.game, self.dmg_map, purchase["coords"], purchase["type"])
+
+    def get_empty_state(self) -> np.array:
+        """
+        Allocate zeroed simulation state in the layout used by the game's engine.
+
+        :return: map sized array for the 'map' engine, vector of path length for the path-space engines
+        """
+        if self.game.engine != "map":
+            return np.zeros(len(self.game.path), dtype=self.game.dtype)
+        return np.zeros((self.game.map_height, self.game.map_width), dtype=self.game.dtype)
+
+    def allocate_state(self) -> None:
+        """
+        Allocate the simulation state unless it is already allocated.
+
+        :return:
+        """
+        if self.opponent_hp is None:
+            self.dmg_map = self.get_empty_state()
+            self.opponent_hp = self.get_empty_state()
+
+    def release_state(self) -> None:
+        """
+        Release the simulation state of an eliminated candidate, its survival time and purchases are kept.
+
+        :return:
+        """
+        self.dmg_map = None
+        self.opponent_hp = None
+
+    def get_dmg_map(self) -> np.array:
+        """
+        Get the full damage map of the bought towers, regardless of the engine used.
+
+        :return: array of the map size with the damage dealt on each cell
+        """
+        if self.game.engine == "map":
+            return self.dmg_map if self.dmg_map is not None else self.get_empty_state()
+
+        dmg_map = np.zeros((self.game.map_height, self.game.map_width), dtype=self.game.dtype)
+        towers = {}
+        for purchase in self.bought_purchases:
+            prior_type = towers.get(purchase["coords"])
+            if prior_type is not None:
+                dmg_map -= get_dmg_patch(self.game, purchase["coords"], prior_type)
+            dmg_map += get_dmg_patch(self.game, purchase["coords"], purchase["type"])
+            towers.setdefault(purchase["coords"], purchase["type"])
+
+        return dmg_map
 
     def get_unique_delays(self):
         used_purchases_coords = {}
-        for dp in self.delayed_purchases:
-            unique = dp['coords'], dp['type']
+        for time, row, col, tower_type in self.delayed_purchases:
+            unique = (row, col), tower_type
 
             if unique not in used_purchases_coords:
-                used_purchases_coords[unique] = dp.copy(), dp['time']
+                used_purchases_coords[unique] = {"time": time, "coords": (row, col), "type": tower_type}, time
             else:
-                used_purchases_coords[unique] = used_purchases_coords[unique][0], dp['time']
+                used_purchases_coords[unique] = used_purchases_coords[unique][0], time
 
         return used_purchases_coords
 
@@ -121,32 +361,171 @@ class Candidate:
 
         :return:
         """
+        if self.opponent_hp is None:
+            self.allocate_state()
+
+        if (
+                self.record_snapshots
+                and not self.reincarnated
+                and self.head_time == self.time
+                and (not self.snapshots or self.snapshots[-1].n_bought != len(self.bought_purchases))
+        ):
+            self.snapshots.append(self.get_snapshot())
+
         # Apply damage to opponent units and obtain gold
         new_opponent_hp = np.maximum(self.opponent_hp - self.dmg_map, 0.0)
         self.gold += self.game.dmg_to_gold_factor * np.sum(self.opponent_hp - new_opponent_hp)
         self.opponent_hp = new_opponent_hp
 
         # Apply damage to your base and check if you are still alive
-        self.base_hp -= self.opponent_hp[self.game.path[-1]]
+        if self.game.engine != "map":
+            self.base_hp -= self.opponent_hp[-1]
+        else:
+            self.base_hp -= self.opponent_hp[self.game.path[-1]]
 
         # Do purchases if possible, if not set those purchases for the next time
-        while len(self.purchases) > 0 and self.purchases[0]["time"] == self.time:
-            # print(self.game.tower_types, self.purchases)
-            tower_cost = self.game.tower_types[self.purchases[0]["type"]]["cost"]
+        while self.head_time == self.time:
+            _, row, col, tower_type = self.pending[self.cursor].tolist()
+            tower_cost = self.game.tower_types[tower_type]["cost"]
             if tower_cost <= self.gold:
-                purchase = self.purchases.pop(0)
-                utils.check_for_tower_rebuy(self.game, purchase, self.bought_purchases, self.dmg_map)
+                purchase = {"time": self.time, "coords": (row, col), "type": tower_type}
+                utils.check_for_tower_rebuy(self.game, purchase, self.towers, self.dmg_map)
                 self.gold -= tower_cost
-                self.dmg_map += get_dmg_patch(self.game, purchase["coords"], purchase["type"])
-                self.bought_purchases.append(purchase.copy())
+                utils.add_tower_dmg(self.game, self.dmg_map, purchase["coords"], purchase["type"])
+                self.bought_purchases.append(purchase)
+                self.cursor += 1
+                self.head_time = self.__get_head_time()
             else:
-                self.delayed_purchases.append(self.purchases[0].copy())
-                self.purchases[0]["time"] += 1
+                if self.game.record_delays:
+                    self.delayed_purchases.append((self.head_time, row, col, tower_type))
+                self.head_time += 1
 
         # Move opponent units forward
-        for _, (coords_to, coords_from) in enumerate(self.game.move_generator):
-            self.opponent_hp[coords_to] = self.opponent_hp[coords_from]
-        self.opponent_hp[self.game.path[0]] = self.game.enemy_spawning_function(self.time)
+        if self.game.engine != "map":
+            self.opponent_hp[1:] = self.opponent_hp[:-1]
+            self.opponent_hp[0] = self.game.spawn_table.get(self.time)
+        else:
+            for _, (coords_to, coords_from) in enumerate(self.game.move_generator):
+                self.opponent_hp[coords_to] = self.opponent_hp[coords_from]
+            self.opponent_hp[self.game.path[0]] = self.game.spawn_table.get(self.time)
 
         # Increment time
         self.time += 1
+        self.game.profiler.ticks += 1
+
+    def skip_step(self) -> None:
+        """
+        Advance the time of a candidate with known fitness without simulating,
+        the final state summary is set once the time of death is reached.
+
+        :return:
+        """
+        self.time += 1
+        if self.time >= self.fitness.time:
+            self.apply_fitness()
+
+    def apply_fitness(self) -> None:
+        """
+        Set the final state summary of a candidate with known fitness.
+
+        :return:
+        """
+        self.time, self.gold, self.base_hp = self.fitness
+
+    def catch_up(self) -> None:
+        """
+        Simulate a candidate with known fitness up to the time it has skipped to.
+
+        :return:
+        """
+        time = self.time
+        record_snapshots = self.record_snapshots
+        self.refresh()
+        self.record_snapshots = record_snapshots
+
+        while self.time < time:
+            self.simulate_step()
+
+    def has_pending_purchases(self) -> bool:
+        """
+        Check if any purchase can still be done. The first purchase planned before the current time
+        blocks the remaining ones forever.
+
+        :return:
+        """
+        return self.head_time >= self.time
+
+    def simulate_until_death(self, fast_forward: bool = False) -> None:
+        """
+        Simulate steps until the base is destroyed (at least one step).
+
+        :param fast_forward: once there are no pending purchases, compute the death time directly
+        :return:
+        """
+        while True:
+            if fast_forward and not self.has_pending_purchases():
+                self.fast_forward()
+                break
+
+            self.simulate_step()
+            if self.base_hp <= 0:
+                break
+
+    def fast_forward(self) -> None:
+        """
+        Simulate steps until the base is destroyed (at least one step), assuming no more purchases are done.
+
+        The damage along the path stays fixed, so every enemy reaches the base with its health reduced
+        by the damage of all the cells it has yet to pass. The death time is found on the cumulative damage
+        dealt to the base, extended by chunks of spawned enemies, instead of stepping through the time.
+
+        :return:
+        """
+        self.allocate_state()
+        if self.game.engine != "map":
+            opponent_hp, dmg = self.opponent_hp, self.dmg_map
+        else:
+            opponent_hp = self.opponent_hp[self.game.path_rows, self.game.path_cols]
+            dmg = self.dmg_map[self.game.path_rows, self.game.path_cols]
+
+        path_len = len(opponent_hp)
+        cumulative_dmg = np.concatenate((np.zeros(1, dtype=dmg.dtype), np.cumsum(dmg)))
+
+        # Enemies in the order of reaching the base, first those already on the path
+        enemies = opponent_hp[::-1]
+        base_dmg = np.maximum(enemies - (cumulative_dmg[-1] - cumulative_dmg[-2::-1]), 0.0)
+        cumulative_base_dmg = np.cumsum(base_dmg)
+
+        chunk = path_len
+        while cumulative_base_dmg[-1] < self.base_hp:
+            spawned = self.game.spawn_table.get_range(self.time + len(enemies) - path_len, chunk)
+            enemies = np.concatenate((enemies, spawned))
+            base_dmg = np.maximum(spawned - cumulative_dmg[-1], 0.0)
+            cumulative_base_dmg = np.concatenate((cumulative_base_dmg, cumulative_base_dmg[-1] + np.cumsum(base_dmg)))
+            chunk *= 2
+
+        n_steps = int(np.searchsorted(cumulative_base_dmg, self.base_hp)) + 1
+
+        # Enemies spawned until the last step
+        n_enemies = path_len + n_steps
+        if len(enemies) < n_enemies:
+            spawned = self.game.spawn_table.get_range(self.time + len(enemies) - path_len, n_enemies - len(enemies))
+            enemies = np.concatenate((enemies, spawned))
+        enemies = enemies[:n_enemies]
+
+        # Damage dealt to each enemy on the cells passed until the last step
+        start = path_len - 1 - np.arange(n_enemies)
+        dealt_dmg = np.minimum(
+            enemies,
+            cumulative_dmg[np.clip(start + n_steps, 0, path_len)] - cumulative_dmg[np.clip(start, 0, path_len)]
+        )
+
+        self.gold += self.game.dmg_to_gold_factor * np.sum(dealt_dmg)
+        self.base_hp -= cumulative_base_dmg[n_steps - 1]
+        self.time += n_steps
+
+        opponent_hp = (enemies - dealt_dmg)[n_steps:][::-1]
+        if self.game.engine != "map":
+            self.opponent_hp = opponent_hp.copy()
+        else:
+            self.opponent_hp[self.game.path_rows, self.game.path_cols] = opponent_hp
@@ -0,0 +1,110 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Checkpoints of solving, kept as a single .npz file.
+"""
+import os
+import tempfile
+import numpy as np
+from tower_defence_solver.genome import Genome, PURCHASE_DTYPE
+from typing import List, Tuple, Optional, NamedTuple
+
+# Version of the layout of the checkpoint file
+FORMAT_VERSION = 1
+
+
+class Checkpoint(NamedTuple):
+    """
+    State of solving at the end of an epoch.
+    """
+    epoch: int
+    scenario: str
+    genomes: List[Genome]
+    survival_times: np.ndarray
+    best_genome: Optional[Genome]
+    all_time_highs: List[str]
+    random_state: Tuple
+
+
+def save_checkpoint(
+    path: str,
+    epoch: int,
+    scenario: str,
+    genomes: List[Genome],
+    survival_times: List[int],
+    best_genome: Optional[Genome],
+    all_time_highs: List[str],
+    random_state: Tuple
+) -> None:
+    """
+    Write a checkpoint atomically: to a temporary file in the same directory, replacing the previous one
+    only once the file is complete.
+
+    :param path: path of the checkpoint file
+    :param epoch: number of the last finished epoch
+    :param scenario: fingerprint of the scenario solved
+    :param genomes: purchases of the population of the next epoch
+    :param survival_times: survival times of the survivors of the last finished epoch
+    :param best_genome: purchases of the best candidate so far, None if there is none
+    :param all_time_highs: all time highs of the finished epochs
+    :param random_state: state of numpy's global random generator, as returned by np.random.get_state
+    :return:
+    """
+    name, key, position, has_gauss, cached_gaussian = random_state
+    lengths = np.array([len(genome) for genome in genomes], dtype=np.int64)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+    try:
+        with os.fdopen(file_descriptor, mode="wb") as file:
+            np.savez(
+                file,
+                format_version=FORMAT_VERSION,
+                epoch=epoch,
+                scenario=scenario,
+                purchases=np.concatenate(genomes) if genomes else np.zeros(0, dtype=PURCHASE_DTYPE),
+                lengths=lengths,
+                survival_times=np.array(survival_times, dtype=np.int64),
+                best_genome=best_genome if best_genome is not None else np.zeros(0, dtype=PURCHASE_DTYPE),
+                has_best=best_genome is not None,
+                all_time_highs=np.array([int(score) for score in all_time_highs], dtype=np.int64),
+                random_name=name,
+                random_key=key,
+                random_position=position,
+                random_has_gauss=has_gauss,
+                random_cached_gaussian=cached_gaussian,
+            )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    """
+    Read a checkpoint.
+
+    :param path: path of the checkpoint file
+    :return:
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format_version"]) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format {int(data['format_version'])} of '{path}'")
+
+        offsets = np.cumsum(data["lengths"])[:-1]
+        return Checkpoint(
+            epoch=int(data["epoch"]),
+            scenario=str(data["scenario"]),
+            genomes=np.split(data["purchases"], offsets) if len(data["lengths"]) else [],
+            survival_times=data["survival_times"],
+            best_genome=data["best_genome"] if bool(data["has_best"]) else None,
+            all_time_highs=[str(score) for score in data["all_time_highs"].tolist()],
+            random_state=(
+                str(data["random_name"]), data["random_key"], int(data["random_position"]),
+                int(data["random_has_gauss"]), float(data["random_cached_gaussian"])
+            ),
+        )
@@ -0,0 +1,108 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Genome - purchases list kept as a structured array.
+"""
+import numpy as np
+from typing import List, Dict, Tuple, Set, Union
+
+PURCHASE_DTYPE = np.dtype([("time", np.int32), ("row", np.int16), ("col", np.int16), ("type", np.int16)])
+MAX_TIME = np.iinfo(np.int32).max
+
+# Purchases in the order they are done, each one not earlier than its time
+Genome = np.ndarray
+
+
+def get_empty_genome(size: int = 0) -> Genome:
+    """
+    Genome of the given number of zeroed purchases.
+
+    :param size: number of purchases
+    :return:
+    """
+    return np.zeros(size, dtype=PURCHASE_DTYPE)
+
+
+def get_purchase(time: int, coords: Tuple[int, int], tower_type: int) -> Tuple[int, int, int, int]:
+    """
+    Single purchase in the form assignable to a genome element.
+
+    :param time: time of the purchase, times beyond the range of the genome are clipped (never reached anyway)
+    :param coords: position of the tower
+    :param tower_type: integer indicating the tower type
+    :return:
+    """
+    return min(int(time), MAX_TIME), int(coords[0]), int(coords[1]), int(tower_type)
+
+
+def to_genome(purchases: Union[Genome, List[Dict]]) -> Genome:
+    """
+    Genome of a purchases list, genomes are returned as they are.
+
+    :param purchases: list of purchases or genome
+    :return:
+    """
+    if isinstance(purchases, np.ndarray) and purchases.dtype == PURCHASE_DTYPE:
+        return purchases
+
+    return np.array(
+        [get_purchase(purchase["time"], purchase["coords"], purchase["type"]) for purchase in purchases],
+        dtype=PURCHASE_DTYPE
+    )
+
+
+def to_purchases(genome: Genome) -> List[Dict]:
+    """
+    Purchases list of a genome.
+
+    :param genome: genome
+    :return: list of {"time", "coords", "type"} dictionaries
+    """
+    return [
+        {"time": time, "coords": (row, col), "type": tower_type} for time, row, col, tower_type in genome.tolist()
+    ]
+
+
+def get_coords(purchase: np.void) -> Tuple[int, int]:
+    """
+    Position of the tower of a genome element.
+
+    :param purchase: genome element
+    :return:
+    """
+    return int(purchase["row"]), int(purchase["col"])
+
+
+def get_occupancy(genome: Genome) -> Set[Tuple[int, int]]:
+    """
+    Cells occupied by the towers of a genome.
+
+    :param genome: genome
+    :return: set of (row, col) positions
+    """
+    return set(zip(genome["row"].tolist(), genome["col"].tolist()))
+
+
+def sort_genome(genome: Genome) -> Genome:
+    """
+    Genome sorted by the time of purchases, purchases planned at the same time keep their order.
+
+    :param genome: genome
+    :return:
+    """
+    return genome[np.argsort(genome["time"], kind="stable")]
+
+
+def get_common_prefix(genome_a: Genome, genome_b: Genome) -> int:
+    """
+    Number of leading purchases the genomes share.
+
+    :param genome_a: genome
+    :param genome_b: genome
+    :return:
+    """
+    n = min(len(genome_a), len(genome_b))
+    different = np.flatnonzero(genome_a[:n] != genome_b[:n])
+    return int(different[0]) if len(different) else n
@@ -0,0 +1,113 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Sparse tower influence index.
+"""
+import numpy as np
+from typing import List, Tuple, Dict, NamedTuple
+
+
+class Footprint(NamedTuple):
+    """
+    Cells damaged by a tower of some type placed on some cell.
+    """
+    flat_indices: np.array  # indexes of the damaged cells in the flattened map
+    dmg: np.array  # damage dealt on those cells
+    path_indices: np.array  # positions on the path of the damaged path cells
+    path_dmg: np.array  # damage dealt on those path cells
+
+
+class TowerInfluenceIndex:
+    def __init__(
+        self,
+        map_width: int,
+        map_height: int,
+        path: List[Tuple[int, int]],
+        tower_types: Dict[int, Dict],
+        dtype: np.dtype = np.dtype(float)
+    ):
+        """
+        Index of the footprints of towers, built once per map.
+
+        Every tower type keeps only the non-zero cells of its damage patch as offsets from the tower position,
+        footprints of particular (tower type, cell) pairs are derived from them when first needed and kept.
+
+        :param map_width: Width of the map.
+        :param map_height: Height of the map.
+        :param path: Path from enemy base to player base.
+        :param tower_types: Dictionary of available tower types.
+        :param dtype: type of the damage values of the footprints
+        """
+        self.map_width = map_width
+        self.dtype = dtype
+        self.map_height = map_height
+        self.footprints = {}
+
+        self.path_positions = {}
+        for i, (row, col) in enumerate(path):
+            self.path_positions.setdefault(row * map_width + col, []).append(i)
+
+        self.offsets = {}
+        for tower_type, tower in tower_types.items():
+            patch = tower["dmg"]
+            radius_row, radius_col = patch.shape[0] // 2, patch.shape[1] // 2
+            rows, cols = np.nonzero(patch)
+            self.offsets[tower_type] = rows - radius_row, cols - radius_col, (patch[rows, cols] / 2).astype(dtype)
+
+        path_mask = np.zeros((map_height, map_width))
+        path_rows, path_cols = np.array(path).T
+        path_mask[path_rows, path_cols] = 1.0
+
+        self.path_coverage = {}
+        for tower_type, (row_offsets, col_offsets, dmg) in self.offsets.items():
+            coverage = np.zeros((map_height, map_width))
+            for row_offset, col_offset, cell_dmg in zip(row_offsets, col_offsets, dmg):
+                # The tower placed on (row, col) damages (row + row_offset, col + col_offset)
+                coverage[
+                    max(-row_offset, 0):map_height - max(row_offset, 0),
+                    max(-col_offset, 0):map_width - max(col_offset, 0)
+                ] += cell_dmg * path_mask[
+                    max(row_offset, 0):map_height - max(-row_offset, 0),
+                    max(col_offset, 0):map_width - max(-col_offset, 0)
+                ]
+            self.path_coverage[tower_type] = coverage
+
+    def get_footprint(self, coords: Tuple[int, int], tower_type: int) -> Footprint:
+        """
+        Cells damaged by a tower of given type placed on a given position.
+
+        :param coords: position of the tower
+        :param tower_type: integer indicating the tower type
+        :return:
+        """
+        key = coords, tower_type
+        if key not in self.footprints:
+            row_offsets, col_offsets, dmg = self.offsets[tower_type]
+            rows, cols = coords[0] + row_offsets, coords[1] + col_offsets
+            inside = (0 <= rows) & (rows < self.map_height) & (0 <= cols) & (cols < self.map_width)
+            flat_indices = rows[inside] * self.map_width + cols[inside]
+            dmg = dmg[inside]
+
+            path_indices, path_dmg = [], []
+            for flat_index, cell_dmg in zip(flat_indices, dmg):
+                for position in self.path_positions.get(flat_index, []):
+                    path_indices.append(position)
+                    path_dmg.append(cell_dmg)
+
+            self.footprints[key] = Footprint(
+                flat_indices, dmg, np.array(path_indices, dtype=int), np.array(path_dmg, dtype=self.dtype)
+            )
+
+        return self.footprints[key]
+
+    def get_path_coverage(self, coords: Tuple[int, int], tower_type: int) -> float:
+        """
+        Total damage dealt on the path by a tower of given type placed on a given position.
+
+        :param coords: position of the tower
+        :param tower_type: integer indicating the tower type
+        :return:
+        """
+        return self.path_coverage[tower_type][coords]
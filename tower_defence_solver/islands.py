@@ -0,0 +1,149 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Island model - populations evolving in separate processes and exchanging their best candidates.
+"""
+import multiprocessing
+import numpy as np
+from tower_defence_solver.candidate import Candidate
+from tower_defence_solver.parallel import get_game_params
+from tower_defence_solver.genome import Genome
+from typing import List, Dict, Tuple, Optional
+
+TOPOLOGIES = ("ring", "random")
+
+
+def run_island(
+    game_params: Dict,
+    solve_params: Dict,
+    seed: int,
+    migration_interval: int,
+    n_migrants: int,
+    connection
+) -> None:
+    """
+    Evolve a single population in a worker process. The best survivors are sent through the connection
+    every migration_interval epochs and replaced by the received ones.
+
+    :param game_params: parameters of the game constructor
+    :param solve_params: parameters of the solve method
+    :param seed: seed of the random generator of the island
+    :param migration_interval: number of epochs between migrations
+    :param n_migrants: number of candidates sent on each migration
+    :param connection: end of a pipe to the main process
+    :return:
+    """
+    # Imported here, as the solver module imports this one
+    from tower_defence_solver.TowerDefenceSolver import TowerDefenceSolver
+
+    np.random.seed(seed)
+    game = TowerDefenceSolver(**game_params)
+
+    def migrate(epoch: int, survivors: List[Candidate]) -> List[Genome]:
+        if (epoch + 1) % migration_interval != 0 or epoch + 1 >= solve_params["epochs"]:
+            return []
+
+        emigrants = sorted(survivors, key=lambda candidate: candidate.time, reverse=True)[:n_migrants]
+        connection.send([candidate.genome for candidate in emigrants])
+        return connection.recv()
+
+    best_candidate, all_time_highs = game.solve(**solve_params, migration=migrate)
+    connection.send((all_time_highs, best_candidate.genome if best_candidate is not None else None))
+    connection.close()
+
+
+def get_migration_sources(n_islands: int, topology: str, random_state: np.random.RandomState) -> List[int]:
+    """
+    Islands the migrants of each island come from.
+
+    :param n_islands: number of islands
+    :param topology: 'ring' - from the previous island, 'random' - from a random other island
+    :param random_state: random generator of the migrations
+    :return:
+    """
+    if topology == "ring" or n_islands < 2:
+        return [(k - 1) % n_islands for k in range(n_islands)]
+
+    sources = []
+    for k in range(n_islands):
+        source = random_state.randint(n_islands - 1)
+        sources.append(source if source < k else source + 1)
+    return sources
+
+
+def solve_islands(
+    game,
+    islands: int = 4,
+    migration_interval: int = 5,
+    migrants: int = 2,
+    topology: str = "ring",
+    seed: Optional[int] = None,
+    **solve_params
+) -> Tuple[Optional[Candidate], List[str], List[List[str]]]:
+    """
+    Evolve populations in separate processes, exchanging the best candidates between them.
+    Only genomes are sent between the processes.
+
+    :param game: instance of the solver
+    :param islands: number of populations, each evolving in its own process
+    :param migration_interval: number of epochs between migrations
+    :param migrants: number of best survivors sent to another island on each migration,
+                     at most the number of offspring of an epoch
+    :param topology: 'ring' - each island sends to the next one, 'random' - each island receives
+                     from a random other one on each migration
+    :param seed: seed of the islands' random generators, drawn from the global one if None
+    :param solve_params: parameters of the solve method used by each island
+    :return: best candidate, all time highs over all islands and all time highs of each island
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology '{topology}', expected one of {TOPOLOGIES}")
+
+    epochs = solve_params.setdefault("epochs", 100)
+    if seed is None:
+        seed = np.random.randint(2 ** 31 - islands)
+    random_state = np.random.RandomState(seed)
+
+    game_params = get_game_params(game)
+    if game.fitness_cache is not None:
+        game_params["fitness_cache_size"] = game.fitness_cache.max_size
+
+    connections, processes = [], []
+    try:
+        for k in range(islands):
+            connection, island_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_island,
+                args=(game_params, solve_params, seed + k, migration_interval, migrants, island_connection),
+                daemon=True
+            )
+            process.start()
+            island_connection.close()
+            connections.append(connection)
+            processes.append(process)
+
+        for _ in range((epochs - 1) // migration_interval):
+            emigrants = [connection.recv() for connection in connections]
+            sources = get_migration_sources(islands, topology, random_state)
+            for connection, source in zip(connections, sources):
+                connection.send(emigrants[source])
+
+        results = [connection.recv() for connection in connections]
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    island_all_time_highs = [all_time_highs for all_time_highs, _ in results]
+    all_time_highs = [str(max(int(score) for score in scores)) for scores in zip(*island_all_time_highs)]
+
+    best_candidate = None
+    best_island = int(np.argmax([int(scores[-1]) if scores else -1 for scores in island_all_time_highs]))
+    if results[best_island][1] is not None:
+        best_candidate = Candidate(results[best_island][1], game)
+        best_candidate.simulate_until_death()
+
+    return best_candidate, all_time_highs, island_all_time_highs
@@ -0,0 +1,131 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Parallel evaluation of candidates.
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from tower_defence_solver.candidate import Candidate
+from tower_defence_solver.cache import Fitness
+from tower_defence_solver.genome import Genome
+from typing import List, Dict, Optional
+
+# Game of the worker process, created once by the pool initializer
+worker_game = None
+
+
+def get_game_params(game) -> Dict:
+    """
+    Parameters of the game constructor recreating the game in another process.
+
+    :param game: instance of the solver
+    :return:
+    """
+    return dict(
+        map_width=game.map_width,
+        map_height=game.map_height,
+        path=game.path,
+        tower_types=game.tower_types,
+        enemy_spawning_function=game.enemy_spawning_function,
+        initial_hp=game.initial_hp,
+        initial_gold=game.initial_gold,
+        binary_op_prob=game.p_binary[1] if game.p_binary is not None else None,
+        unary_ops_prob_distribution=game.p_unary_ops,
+        binary_ops_prob_distribution=game.p_binary_ops,
+        dmg_to_gold_factor=game.dmg_to_gold_factor,
+        engine=game.engine,
+        stochastic_spawning=game.spawn_table.stochastic,
+        placement=game.placement,
+        dtype=game.dtype.name,
+        reproduction=game.reproduction,
+        operator_selection=game.operator_selection,
+        record_delays=game.record_delays,
+    )
+
+
+def init_worker(game_params: Dict) -> None:
+    """
+    Create the game in a worker process.
+
+    :param game_params: parameters of the game constructor
+    :return:
+    """
+    global worker_game
+    # Imported here, as the solver module imports this one
+    from tower_defence_solver.TowerDefenceSolver import TowerDefenceSolver
+    worker_game = TowerDefenceSolver(**game_params)
+
+
+def evaluate_genomes(genomes: List[Genome], fast_forward: bool, spawn_seed: Optional[int] = None) -> List[Fitness]:
+    """
+    Simulate the genomes until death in a worker process.
+
+    :param genomes: purchases to simulate
+    :param fast_forward: compute the death time directly once there are no pending purchases
+    :param spawn_seed: seed of the realization of a stochastic spawning function faced by the genomes
+    :return: final state summary of each genome
+    """
+    spawn_table = worker_game.spawn_table
+    if spawn_table.stochastic and spawn_seed != spawn_table.seed:
+        spawn_table.reset(spawn_seed)
+
+    results = []
+    for genome in genomes:
+        candidate = Candidate(genome, worker_game)
+        candidate.simulate_until_death(fast_forward)
+        results.append(Fitness(candidate.time, candidate.gold, candidate.base_hp))
+
+    return results
+
+
+class ParallelEvaluator:
+    def __init__(self, game, workers: int, shards_per_worker: int = 4) -> None:
+        """
+        Pool of processes simulating candidates from scratch until death.
+
+        Workers get the genomes and return the final state summaries, the game is created
+        once per worker, so the spawning function and the tower types have to be picklable.
+
+        :param game: game the candidates are evaluated in
+        :param workers: number of worker processes
+        :param shards_per_worker: number of parts the evaluated candidates are split into per worker
+        """
+        self.workers = workers
+        self.shards_per_worker = shards_per_worker
+        self.executor = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(get_game_params(game),))
+
+    def evaluate(
+        self, genomes: List[Genome], fast_forward: bool = False, spawn_seed: Optional[int] = None
+    ) -> List[Fitness]:
+        """
+        Simulate the genomes until death.
+
+        :param genomes: genomes to simulate
+        :param fast_forward: compute the death time directly once there are no pending purchases
+        :param spawn_seed: seed of the realization of a stochastic spawning function faced by the genomes
+        :return: final state summary of each genome, in the same order
+        """
+        if not genomes:
+            return []
+
+        n_shards = min(len(genomes), self.workers * self.shards_per_worker)
+        shards = [list(shard) for shard in np.array_split(np.arange(len(genomes)), n_shards)]
+
+        results = []
+        for shard_results in self.executor.map(
+            evaluate_genomes, [[genomes[j] for j in shard] for shard in shards], [fast_forward] * n_shards,
+            [spawn_seed] * n_shards
+        ):
+            results += shard_results
+
+        return results
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes.
+
+        :return:
+        """
+        self.executor.shutdown()
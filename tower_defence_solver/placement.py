@@ -0,0 +1,140 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Placement of towers sampled by their coverage of the path.
+"""
+import numpy as np
+from typing import List, Tuple, Set, Optional
+
+# Tower type standing for towers of any type
+ANY_TYPE = None
+# Free share of the weights below which positions are drawn from the free cells directly instead of rejecting
+# draws of occupied cells
+MIN_FREE_SHARE = 0.1
+
+
+class AliasTable:
+    def __init__(self, weights: np.array) -> None:
+        """
+        Walker's alias table, sampling indexes proportionally to the weights in constant time.
+
+        :param weights: non-negative weights, not all zero
+        """
+        n = len(weights)
+        prob = np.asarray(weights, dtype=float) * n / np.sum(weights)
+        alias = np.arange(n)
+
+        small = [i for i in range(n) if prob[i] < 1.0]
+        large = [i for i in range(n) if prob[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            alias[less] = more
+            prob[more] -= 1.0 - prob[less]
+            if prob[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Leftovers are equal to 1 up to rounding errors
+        prob[small + large] = 1.0
+
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def sample(self, size: int) -> np.array:
+        """
+        Draw indexes.
+
+        :param size: number of indexes
+        :return:
+        """
+        columns = np.random.randint(len(self.prob), size=size)
+        return np.where(np.random.rand(size) < self.prob[columns], columns, self.alias[columns])
+
+
+class PlacementSampler:
+    def __init__(self, map_width: int, map_height: int, path_mask: np.array, path_coverage: dict) -> None:
+        """
+        Sampler of tower positions, each cell next to the path drawn proportionally to the damage
+        a tower placed there deals on the path. Cells on the path and those from which a tower
+        does not reach the path are never drawn.
+
+        :param map_width: Width of the map.
+        :param map_height: Height of the map.
+        :param path_mask: boolean map of the path cells
+        :param path_coverage: total damage dealt on the path from each cell, by tower type
+        """
+        self.map_width = map_width
+        self.map_height = map_height
+
+        coverages = dict(path_coverage)
+        coverages[ANY_TYPE] = sum(path_coverage.values())
+
+        # Per tower type: flat indexes of the drawn cells, their weights, total weight and the alias table
+        self.cells, self.weights, self.total_weights, self.tables = {}, {}, {}, {}
+        # Per tower type: index of each cell of the map among the drawn cells, -1 if never drawn
+        self.ranks = {}
+        for tower_type, coverage in coverages.items():
+            weights = np.where(path_mask, 0.0, coverage).ravel()
+            cells = np.flatnonzero(weights > 0)
+            self.cells[tower_type] = cells
+            self.weights[tower_type] = weights[cells]
+            self.total_weights[tower_type] = np.sum(weights[cells])
+            self.tables[tower_type] = AliasTable(weights[cells]) if len(cells) else None
+            self.ranks[tower_type] = np.full(len(weights), -1, dtype=int)
+            self.ranks[tower_type][cells] = np.arange(len(cells))
+
+    def sample(
+        self, tower_type: Optional[int], occupancy: Set[Tuple[int, int]], size: int = 1
+    ) -> List[Tuple[int, int]]:
+        """
+        Draw distinct free positions for towers of the given type.
+
+        Positions are drawn from the alias table in batches sized by the free share of the weights, and only
+        the draws of occupied cells, or of cells drawn earlier, are drawn again. Once less than MIN_FREE_SHARE
+        of the weights is free, the rest is drawn from the free cells directly. Fewer positions are returned
+        only when no more free cells are left.
+
+        :param tower_type: integer indicating the tower type, ANY_TYPE for positions good for any tower
+        :param occupancy: cells occupied by the planned towers
+        :param size: number of positions
+        :return: list of (row, col) positions
+        """
+        table = self.tables[tower_type]
+        if table is None:
+            return []
+
+        cells, weights, ranks = self.cells[tower_type], self.weights[tower_type], self.ranks[tower_type]
+        total_weight = self.total_weights[tower_type]
+
+        # Ranks of the occupied cells which could be drawn
+        taken = set()
+        for row, col in occupancy:
+            if 0 <= row < self.map_height and 0 <= col < self.map_width and ranks[row * self.map_width + col] >= 0:
+                taken.add(int(ranks[row * self.map_width + col]))
+        free_share = 1 - (np.sum(weights[list(taken)]) / total_weight if taken else 0.0)
+
+        size = min(size, len(cells) - len(taken))
+        drawn = []
+        while len(drawn) < size and free_share >= MIN_FREE_SHARE:
+            # Occupied cells and cells drawn earlier are skipped, the rest of the batch is kept in the order drawn
+            for rank in table.sample(int(np.ceil((size - len(drawn)) / free_share)) + 1).tolist():
+                if rank not in taken:
+                    taken.add(rank)
+                    drawn.append(rank)
+                    free_share -= weights[rank] / total_weight
+                    if len(drawn) == size:
+                        break
+
+        if len(drawn) < size:
+            free = np.setdiff1d(np.arange(len(cells)), list(taken))
+            drawn += np.random.choice(
+                free, size=size - len(drawn), replace=False, p=weights[free] / np.sum(weights[free])
+            ).tolist()
+
+        return [divmod(int(flat_index), self.map_width) for flat_index in cells[drawn]]
@@ -0,0 +1,155 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Profiling of the phases of solving.
+"""
+import json
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+
+class PhaseTimer:
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        """
+        Context adding the wall time spent inside it to a phase of the profiler.
+
+        :param profiler: profiler to record in
+        :param name: name of the phase
+        """
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.profiler.phase_times[self.name] += time.perf_counter() - self.start
+        self.profiler.phase_calls[self.name] += 1
+
+
+class Profiler:
+    def __init__(self, per_epoch: bool = False, path: Optional[str] = None) -> None:
+        """
+        Record of where the time of solving goes: wall time of the phases, number of simulated steps,
+        attempts and successes of the reproduction operators and fitness cache statistics.
+        Steps simulated by worker processes are not counted.
+
+        :param per_epoch: keep the totals reached at the end of each epoch
+        :param path: file to append the totals reached at the end of each epoch to, as JSON lines
+        """
+        self.enabled = True
+        self.per_epoch = per_epoch
+        self.path = path
+
+        self.phase_times = defaultdict(float)
+        self.phase_calls = defaultdict(int)
+        self.ticks = 0
+        self.operator_attempts = defaultdict(int)
+        self.operator_successes = defaultdict(int)
+        self.cache_stats = {}
+        self.epochs = []
+
+    def phase(self, name: str) -> PhaseTimer:
+        """
+        Context timing a phase.
+
+        :param name: name of the phase
+        :return:
+        """
+        return PhaseTimer(self, name)
+
+    def count_operator(self, name: str, success: bool) -> None:
+        """
+        Record an attempt of a reproduction operator.
+
+        :param name: name of the operator
+        :param success: whether the operator returned a candidate
+        :return:
+        """
+        self.operator_attempts[name] += 1
+        if success:
+            self.operator_successes[name] += 1
+
+    def end_epoch(self, epoch: int, cache_stats: Optional[Dict] = None) -> None:
+        """
+        Record the end of an epoch.
+
+        :param epoch: number of the epoch
+        :param cache_stats: statistics of the fitness cache, None if there is no cache
+        :return:
+        """
+        if cache_stats is not None:
+            self.cache_stats = dict(cache_stats)
+
+        if self.per_epoch or self.path is not None:
+            record = dict(epoch=epoch, **self.to_dict())
+            if self.per_epoch:
+                self.epochs.append(record)
+            if self.path is not None:
+                with open(self.path, mode="a") as file:
+                    file.write(json.dumps(record) + "\n")
+
+    def to_dict(self) -> Dict:
+        """
+        Totals recorded so far.
+
+        :return:
+        """
+        return {
+            "phases": {
+                name: {"seconds": seconds, "calls": self.phase_calls[name]}
+                for name, seconds in self.phase_times.items()
+            },
+            "ticks": self.ticks,
+            "operators": {
+                name: {"attempts": attempts, "successes": self.operator_successes[name]}
+                for name, attempts in self.operator_attempts.items()
+            },
+            "cache": dict(self.cache_stats),
+        }
+
+    def to_json(self) -> str:
+        """
+        Totals recorded so far as JSON, with the per epoch records if kept.
+
+        :return:
+        """
+        return json.dumps(dict(self.to_dict(), epochs=self.epochs), indent=2)
+
+
+class NullTimer:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+class NullProfiler:
+    """
+    Profiler recording nothing, used when profiling is disabled.
+    """
+    enabled = False
+    timer = NullTimer()
+
+    def __init__(self) -> None:
+        self.ticks = 0
+
+    def phase(self, name: str) -> NullTimer:
+        return self.timer
+
+    def count_operator(self, name: str, success: bool) -> None:
+        pass
+
+    def end_epoch(self, epoch: int, cache_stats: Optional[Dict] = None) -> None:
+        pass
+
+    def to_dict(self) -> Dict:
+        return {}
+
+    def to_json(self) -> str:
+        return "{}"
@@ -5,14 +5,14 @@ Tower Defence Solver.
 
 Genetic operations.
 """
-import copy
 import numpy as np
+from time import perf_counter
 import tower_defence_solver.utils as utils
 from tower_defence_solver.candidate import Candidate
 from tower_defence_solver import TowerDefenceSolver
-from typing import List, Dict, Tuple, Optional, Union
+from tower_defence_solver.genome import Genome, get_purchase, get_coords, get_occupancy, sort_genome
+from typing import List, Tuple, Callable, Optional, Union
 
-Purchases = List[Dict]
 MAX_TRIES = 10
 
 
@@ -29,17 +29,16 @@ def addition(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candidate]
     :return: candidate with newly added purchase if possible, None otherwise
     """
     time = origin.time
-    new_purchases = copy.deepcopy(origin.initial_purchases)
     position = utils.get_random_position_near_path(
-        game, game.map_height // 2, game.map_width // 2, origin.initial_purchases, game.map_height * game.map_width
+        game, game.map_height // 2, game.map_width // 2, origin.genome, game.map_height * game.map_width
     )
     if position is None:
         return None
     tower_id = np.random.choice(list(game.tower_types.keys()))
-    to_be_added = {"time": utils.get_random_purchase_time(time), "coords": position, "type": tower_id}
-    new_purchases.append(to_be_added)
-    new_purchases = sorted(new_purchases, key=lambda x: x["time"])
-    return Candidate(new_purchases, game, time=time)
+    to_be_added = get_purchase(utils.get_random_purchase_time(time), position, tower_id)
+    new_purchases = np.append(origin.genome, np.array([to_be_added], dtype=origin.genome.dtype))
+    new_purchases = sort_genome(new_purchases)
+    return Candidate(new_purchases, game, time=time, parent=origin)
 
 
 def deletion(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candidate]:
@@ -56,17 +55,18 @@ def deletion(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candidate]
     (
         purchases_before_simulation_has_finished,
         purchases_after_simulation_has_finished,
-    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(1, time, origin.initial_purchases)
+    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(1, time, origin.genome)
 
     if purchases_before_simulation_has_finished is None:
         return None
 
     id_to_be_removed = np.random.choice(len(purchases_before_simulation_has_finished))
-    new_purchases = purchases_before_simulation_has_finished.copy()
-    new_purchases.pop(id_to_be_removed)
-    new_purchases.extend(purchases_after_simulation_has_finished)
+    new_purchases = np.concatenate((
+        np.delete(purchases_before_simulation_has_finished, id_to_be_removed),
+        purchases_after_simulation_has_finished
+    ))
 
-    return Candidate(new_purchases, game, time=time)
+    return Candidate(new_purchases, game, time=time, parent=origin)
 
 
 def permutation(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candidate]:
@@ -84,7 +84,7 @@ def permutation(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candida
     (
         purchases_before_simulation_has_finished,
         purchases_after_simulation_has_finished,
-    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(2, time, origin.initial_purchases)
+    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(2, time, origin.genome)
 
     if purchases_before_simulation_has_finished is None:
         return None
@@ -95,21 +95,13 @@ def permutation(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candida
     while second_id == first_id:
         second_id = np.random.choice(len(purchases_before_simulation_has_finished))
 
-    new_purchases = copy.deepcopy(purchases_before_simulation_has_finished)
+    new_purchases = np.concatenate((purchases_before_simulation_has_finished, purchases_after_simulation_has_finished))
 
-    new_purchases[first_id]["coords"], new_purchases[second_id]["coords"] = (
-        new_purchases[second_id]["coords"],
-        new_purchases[first_id]["coords"],
-    )
-
-    new_purchases[first_id]["type"], new_purchases[second_id]["type"] = (
-        new_purchases[second_id]["type"],
-        new_purchases[first_id]["type"],
-    )
+    # Towers are swapped, times stay in place
+    for field in ("row", "col", "type"):
+        new_purchases[field][[first_id, second_id]] = new_purchases[field][[second_id, first_id]]
 
-    new_purchases.extend(purchases_after_simulation_has_finished)
-
-    return Candidate(new_purchases, game, time=time)
+    return Candidate(new_purchases, game, time=time, parent=origin)
 
 
 def time_translation(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candidate]:
@@ -127,23 +119,24 @@ def time_translation(game: TowerDefenceSolver, origin: Candidate) -> Optional[Ca
     (
         purchases_before_simulation_has_finished,
         purchases_after_simulation_has_finished,
-    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(1, time, origin.initial_purchases)
+    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(1, time, origin.genome)
 
     if purchases_before_simulation_has_finished is None:
         return None
 
     id_to_be_translated = np.random.choice(len(purchases_before_simulation_has_finished))
-    new_purchases = copy.deepcopy(purchases_before_simulation_has_finished)
-
-    purchase = copy.deepcopy(new_purchases.pop(id_to_be_translated))
-    new_purchase_time = max(purchase.get("time") + np.random.standard_cauchy() * 0.5, 1)
-    new_purchases.extend(purchases_after_simulation_has_finished)
+    purchase = purchases_before_simulation_has_finished[id_to_be_translated:id_to_be_translated + 1].copy()
+    new_purchase_time = max(purchase["time"][0] + np.random.standard_cauchy() * 0.5, 1)
 
-    purchase["time"] = int(new_purchase_time)
-    new_purchases.append(purchase)
-    new_purchases = sorted(new_purchases, key=lambda x: x["time"])
+    purchase[0] = get_purchase(new_purchase_time, get_coords(purchase[0]), purchase["type"][0])
+    new_purchases = np.concatenate((
+        np.delete(purchases_before_simulation_has_finished, id_to_be_translated),
+        purchases_after_simulation_has_finished,
+        purchase
+    ))
+    new_purchases = sort_genome(new_purchases)
 
-    return Candidate(new_purchases, game, time=time)
+    return Candidate(new_purchases, game, time=time, parent=origin)
 
 
 def replace_tower_with_another(game: TowerDefenceSolver, origin: Candidate) -> Optional[Candidate]:
@@ -160,27 +153,26 @@ def replace_tower_with_another(game: TowerDefenceSolver, origin: Candidate) -> O
     (
         purchases_before_simulation_has_finished,
         purchases_after_simulation_has_finished,
-    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(1, time, origin.initial_purchases)
+    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(1, time, origin.genome)
 
     if purchases_before_simulation_has_finished is None:
         return None
 
     id_to_be_translated = np.random.choice(len(purchases_before_simulation_has_finished))
-    new_purchases = copy.deepcopy(purchases_before_simulation_has_finished)
-
-    purchase = copy.deepcopy(new_purchases[id_to_be_translated])
-    current_type = purchase["type"]
+    purchase = purchases_before_simulation_has_finished[id_to_be_translated:id_to_be_translated + 1].copy()
+    current_type = int(purchase["type"][0])
 
-    new_purchase_time = purchase.get("time") + 5 + utils.get_random_initial_purchase_time(0.2)
-    new_purchases.extend(purchases_after_simulation_has_finished)
+    new_purchase_time = purchase["time"][0] + 5 + utils.get_random_initial_purchase_time(0.2)
+    new_type = np.random.choice([tower[0] for tower in game.tower_types.items()
+                                 if tower[1]["cost"] >= game.tower_types[current_type]["cost"]])
 
-    purchase["time"] = int(new_purchase_time)
-    purchase["type"] = np.random.choice([tower[0] for tower in game.tower_types.items()
-                                         if tower[1]["cost"] >= game.tower_types[current_type]["cost"]])
-    new_purchases.append(purchase)
-    new_purchases = sorted(new_purchases, key=lambda x: x["time"])
+    purchase[0] = get_purchase(new_purchase_time, get_coords(purchase[0]), new_type)
+    new_purchases = np.concatenate((
+        purchases_before_simulation_has_finished, purchases_after_simulation_has_finished, purchase
+    ))
+    new_purchases = sort_genome(new_purchases)
 
-    return Candidate(new_purchases, game, time=time)
+    return Candidate(new_purchases, game, time=time, parent=origin)
 
 
 # ========== BINARY OPERATORS ==========
@@ -203,7 +195,7 @@ def cross(game: TowerDefenceSolver, parent_a: Candidate, parent_b: Candidate) ->
     (
         parent_a_purchases_before_simulation_has_finished,
         parent_a_purchases_after_simulation_has_finished,
-    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(2, time, parent_a.initial_purchases)
+    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(2, time, parent_a.genome)
 
     if parent_a_purchases_before_simulation_has_finished is None:
         return None
@@ -211,49 +203,50 @@ def cross(game: TowerDefenceSolver, parent_a: Candidate, parent_b: Candidate) ->
     (
         parent_b_purchases_before_simulation_has_finished,
         _,
-    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(2, time, parent_b.initial_purchases)
+    ) = split_purchases_into_minimum_n_elements_at_given_point_in_time(2, time, parent_b.genome)
 
     if parent_b_purchases_before_simulation_has_finished is None:
         return None
 
     a_starting_point, a_ending_point = get_split_points(parent_a_purchases_before_simulation_has_finished)
-    new_purchases = copy.deepcopy(parent_a_purchases_before_simulation_has_finished)
-
-    for i in range(a_starting_point, a_ending_point):
-        new_purchases.pop(a_starting_point)
-
-    new_purchases.extend(parent_a_purchases_after_simulation_has_finished)
-    new_purchases_copy = copy.deepcopy(new_purchases)
+    new_purchases_base = np.concatenate((
+        np.delete(parent_a_purchases_before_simulation_has_finished, np.s_[a_starting_point:a_ending_point]),
+        parent_a_purchases_after_simulation_has_finished
+    ))
+    new_purchases = new_purchases_base
+    occupancy_base = get_occupancy(new_purchases_base)
     was_everything_added = False
     how_many_tries = 0
 
     while not was_everything_added and how_many_tries < MAX_TRIES:
-        new_purchases = copy.deepcopy(new_purchases_copy)
         b_starting_point, b_ending_point = get_split_points(parent_b_purchases_before_simulation_has_finished)
         was_everything_added = True
 
-        for i in range(b_starting_point, b_ending_point):
-            purchase_to_be_added = parent_b_purchases_before_simulation_has_finished[i]
-            purchase_coords = purchase_to_be_added["coords"]
-
-            if not utils.validate_pos(game, purchase_coords, new_purchases):
+        # The sequence is appended after the purchases of the first parent, without sorting
+        new_purchases = np.concatenate((
+            new_purchases_base, parent_b_purchases_before_simulation_has_finished[b_starting_point:b_ending_point]
+        ))
+        occupancy = set(occupancy_base)
+        for i in range(len(new_purchases_base), len(new_purchases)):
+            coords = get_coords(new_purchases[i])
+            if not utils.validate_pos(game, coords, occupancy):
                 was_everything_added = False
                 break
+            occupancy.add(coords)
 
-            new_purchases.append(purchase_to_be_added)
         how_many_tries += 1
 
     if how_many_tries >= MAX_TRIES:
         return None
 
-    return Candidate(new_purchases, game, time=time)
+    return Candidate(new_purchases, game, time=time, parent=parent_a)
 
 
-def get_split_points(purchases: Purchases) -> Tuple[int, int]:
+def get_split_points(purchases: Genome) -> Tuple[int, int]:
     """
     Finds indexes allowing the split of the purchases list into three parts
 
-    :param purchases: list of purchases
+    :param purchases: genome
     :return: two different indexes indicating points in time which could be
              used to cut a part of the given purchases list
     """
@@ -270,30 +263,48 @@ def get_split_points(purchases: Purchases) -> Tuple[int, int]:
 
 
 def split_purchases_into_minimum_n_elements_at_given_point_in_time(
-        n: int, time: int, purchases: Purchases
-) -> Union[Tuple[Purchases, Purchases], Tuple[None, None]]:
+        n: int, time: int, purchases: Genome
+) -> Union[Tuple[Genome, Genome], Tuple[None, None]]:
     """
     Splits the given purchases list into two parts in the given point of time,
     with the first part consisting of at least n elements.
 
     :param n: number of elements which must be in the first part of the split list
     :param time: point in time
-    :param purchases: list of purchases
+    :param purchases: genome
     :return: tuple consisting of two parts of the split list if possible, None otherwise
     """
     if len(purchases) < n:
         return None, None
 
-    purchases_before_time = list(filter(lambda purchase: purchase.get("time") < time, purchases))
-    purchases_after_time = list(filter(lambda purchase: purchase.get("time") >= time, purchases))
+    before_time = purchases["time"] < time
+    purchases_before_time = purchases[before_time]
+    purchases_after_time = purchases[~before_time]
 
     if len(purchases_before_time) < n:
         purchases_before_time = purchases
-        purchases_after_time = []
+        purchases_after_time = purchases[:0]
 
     return purchases_before_time, purchases_after_time
 
 
+def apply_operator(game: TowerDefenceSolver, operator: Callable, *parents: Candidate) -> Optional[Candidate]:
+    """
+    Apply a reproduction operator, recording the attempt in the profiler and the operator bandit.
+
+    :param game: Instance of tower defence emulator
+    :param operator: unary or binary operator
+    :param parents: parents of the candidate, as many as the operator takes
+    :return: the result of the operator
+    """
+    start = perf_counter()
+    element_to_add = operator(game, *parents)
+    game.profiler.count_operator(operator.__name__, element_to_add is not None)
+    if game.operator_bandit is not None:
+        game.operator_bandit.record(operator.__name__, perf_counter() - start, parents[0].time, element_to_add)
+    return element_to_add
+
+
 UNARY_REPRODUCTION = [addition, deletion, permutation, time_translation, replace_tower_with_another]
 BINARY_REPRODUCTION = [cross]
 
@@ -315,14 +326,7 @@ def reproduction(game: TowerDefenceSolver, candidates: List[Candidate], how_many
 
     while how_many_added != how_many_to_add:
         candidates = sorted(candidates, key=lambda candidate: candidate.time)
-        if weighted_by == 'order':
-            order_range = np.arange(len(candidates), 0, -1)
-            probability_distribution = order_range / np.sum(order_range)
-        elif weighted_by == 'time':
-            times_array = np.array(list(map(lambda candidate: candidate.time, candidates)))
-            probability_distribution = times_array / np.sum(times_array)
-        else:
-            probability_distribution = None
+        probability_distribution = get_parent_distribution(candidates, weighted_by)
 
         x = np.random.choice([0, 1], p=game.p_binary)
         is_binary = x == 1
@@ -337,7 +341,7 @@ def reproduction(game: TowerDefenceSolver, candidates: List[Candidate], how_many
 
             operator = np.random.choice(BINARY_REPRODUCTION, p=game.p_binary_ops)
 
-            element_to_add = operator(game, parent_a, parent_b)
+            element_to_add = apply_operator(game, operator, parent_a, parent_b)
 
             if element_to_add is not None:
                 candidates.append(element_to_add)
@@ -346,9 +350,75 @@ def reproduction(game: TowerDefenceSolver, candidates: List[Candidate], how_many
         elif is_unary:
             operator = np.random.choice(UNARY_REPRODUCTION, p=game.p_unary_ops)
             origin = np.random.choice(candidates, p=probability_distribution)
-            element_to_add = operator(game, origin)
+            element_to_add = apply_operator(game, operator, origin)
             if element_to_add is not None:
                 candidates.append(element_to_add)
                 how_many_added += 1
 
     return candidates
+
+
+def get_parent_distribution(candidates: List[Candidate], weighted_by: str = None) -> Optional[np.ndarray]:
+    """
+    Probabilities of the candidates, sorted by survival time, being drawn as parents.
+
+    :param candidates: candidates sorted by survival time
+    :param weighted_by: see reproduction
+    :return: None for the uniform distribution
+    """
+    if weighted_by == 'order':
+        order_range = np.arange(len(candidates), 0, -1)
+        return order_range / np.sum(order_range)
+    elif weighted_by == 'time':
+        times_array = np.array([candidate.time for candidate in candidates])
+        return times_array / np.sum(times_array)
+    return None
+
+
+def batched_reproduction(game: TowerDefenceSolver, candidates: List[Candidate], how_many_to_add: int,
+                         weighted_by: str = None) -> List[Candidate]:
+    """
+    Reproduce the provided candidates by the given amount, drawing the operators and parents of all the offspring
+    at once. Unlike in reproduction, the offspring are not drawn as parents of one another, so the candidates are
+    sorted and their distribution computed only once. Slots whose operator fails are drawn again.
+
+    :param game:
+    :param candidates:
+    :param how_many_to_add:
+    :param weighted_by: see reproduction
+    :return:
+    """
+    candidates = sorted(candidates, key=lambda candidate: candidate.time)
+    probability_distribution = get_parent_distribution(candidates, weighted_by)
+    offspring = []
+
+    while len(offspring) != how_many_to_add:
+        to_add = how_many_to_add - len(offspring)
+        is_binary = np.random.choice([0, 1], size=to_add, p=game.p_binary) == 1
+        n_binary = int(np.count_nonzero(is_binary))
+        n_unary = to_add - n_binary
+
+        unary_operators = np.random.choice(len(UNARY_REPRODUCTION), size=n_unary, p=game.p_unary_ops)
+        origins = np.random.choice(len(candidates), size=n_unary, p=probability_distribution)
+
+        binary_operators = np.random.choice(len(BINARY_REPRODUCTION), size=n_binary, p=game.p_binary_ops)
+        parents_a = np.random.choice(len(candidates), size=n_binary, p=probability_distribution)
+        parents_b = np.random.choice(len(candidates), size=n_binary, p=probability_distribution)
+        same = parents_a == parents_b
+        while same.any():
+            parents_b[same] = np.random.choice(len(candidates), size=np.count_nonzero(same), p=probability_distribution)
+            same = parents_a == parents_b
+
+        for operator_id, origin in zip(unary_operators, origins):
+            element_to_add = apply_operator(game, UNARY_REPRODUCTION[operator_id], candidates[origin])
+            if element_to_add is not None:
+                offspring.append(element_to_add)
+
+        for operator_id, parent_a, parent_b in zip(binary_operators, parents_a, parents_b):
+            element_to_add = apply_operator(
+                game, BINARY_REPRODUCTION[operator_id], candidates[parent_a], candidates[parent_b]
+            )
+            if element_to_add is not None:
+                offspring.append(element_to_add)
+
+    return candidates + offspring
@@ -0,0 +1,195 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Store of experiment results - histories of runs kept in columnar binary files.
+"""
+import json
+import os
+import numpy as np
+from typing import List, Dict, Optional, Sequence
+
+RECORD_DTYPE = np.dtype([("run", np.int32), ("epoch", np.int32), ("value", np.int64)])
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def aggregate(histories: np.ndarray, quantiles: Sequence[float] = QUANTILES) -> Dict:
+    """
+    Summary of the histories of runs for each epoch, runs shorter than others are left out
+    of the epochs they have not reached.
+
+    :param histories: array of runs by epochs, NaN for the epochs not reached
+    :param quantiles: quantiles to compute
+    :return: dictionary of arrays indexed by epoch: 'count', 'mean', 'std' and 'quantiles' (by quantile)
+    """
+    reached = ~np.isnan(histories)
+    count = reached.sum(axis=0)
+    mean = np.nansum(histories, axis=0) / np.maximum(count, 1)
+    std = np.sqrt(np.nansum((histories - mean) ** 2, axis=0) / np.maximum(count, 1))
+    std[count == 0], mean[count == 0] = np.nan, np.nan
+
+    return {
+        "count": count,
+        "mean": mean,
+        "std": std,
+        "quantiles": {
+            q: values for q, values in zip(quantiles, np.nanquantile(histories, quantiles, axis=0))
+        } if reached.any() else {q: np.full(histories.shape[1], np.nan) for q in quantiles},
+    }
+
+
+def read_text_histories(path: str) -> np.ndarray:
+    """
+    Histories of a text file with one run per line, epochs separated by spaces.
+
+    :param path: path of the file
+    :return: array of runs by epochs, NaN for the epochs not reached
+    """
+    with open(path) as file:
+        runs = [np.array(line.split(), dtype=float) for line in file if line.strip()]
+
+    histories = np.full((len(runs), max((len(run) for run in runs), default=0)), np.nan)
+    for i, run in enumerate(runs):
+        histories[i, :len(run)] = run
+    return histories
+
+
+class ResultsStore:
+    def __init__(self, path: str) -> None:
+        """
+        Appendable store of the histories of runs of an experiment.
+
+        Values of all the runs are kept in <path>.bin as fixed width (run, epoch, value) records read
+        through a memory map, metadata of the runs in <path>.index.jsonl, one JSON object per run,
+        and damage maps, if given, in <path>.maps.bin. Each run is read from the offsets kept in its metadata,
+        so data left behind by a run interrupted before its metadata was written is never read.
+
+        :param path: path of the store without extension
+        """
+        self.path = path
+        self.data_path = path + ".bin"
+        self.index_path = path + ".index.jsonl"
+        self.maps_path = path + ".maps.bin"
+
+        self.runs = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as file:
+                self.runs = [json.loads(line) for line in file if line.strip()]
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    def append_run(
+        self, history: Sequence, metadata: Optional[Dict] = None, dmg_map: Optional[np.ndarray] = None
+    ) -> int:
+        """
+        Append the history of a run.
+
+        :param history: values of the consecutive epochs, e.g. all time highs
+        :param metadata: JSON serializable description of the run
+        :param dmg_map: damage map of the solution of the run
+        :return: number of the run
+        """
+        run = len(self.runs)
+        records = np.zeros(len(history), dtype=RECORD_DTYPE)
+        records["run"] = run
+        records["epoch"] = np.arange(len(history))
+        records["value"] = np.array(history, dtype=np.int64)
+
+        entry = dict(
+            metadata or {}, run=run, n_epochs=len(history),
+            data_offset=os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        )
+        if dmg_map is not None:
+            dmg_map = np.ascontiguousarray(dmg_map)
+            entry.update(
+                map_offset=os.path.getsize(self.maps_path) if os.path.exists(self.maps_path) else 0,
+                map_shape=list(dmg_map.shape),
+                map_dtype=dmg_map.dtype.str
+            )
+            with open(self.maps_path, mode="ab") as file:
+                file.write(dmg_map.tobytes())
+
+        with open(self.data_path, mode="ab") as file:
+            file.write(records.tobytes())
+        # The index is written last, so a run is listed only once its data is complete
+        with open(self.index_path, mode="a") as file:
+            file.write(json.dumps(entry) + "\n")
+
+        self.runs.append(entry)
+        return run
+
+    def get_records(self) -> np.ndarray:
+        """
+        Records of the listed runs, memory mapped unless data of unlisted runs lies between them.
+
+        :return: array of RECORD_DTYPE records
+        """
+        n_records = sum(entry["n_epochs"] for entry in self.runs)
+        if n_records == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+
+        data = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+        chunks = [
+            (entry["data_offset"], entry["data_offset"] + entry["n_epochs"] * RECORD_DTYPE.itemsize)
+            for entry in self.runs
+        ]
+        previous_ends = [0] + [end for _, end in chunks[:-1]]
+        if all(start == previous_end for (start, _), previous_end in zip(chunks, previous_ends)):
+            return data[:chunks[-1][1]].view(RECORD_DTYPE)
+        return np.concatenate([data[start:end].view(RECORD_DTYPE) for start, end in chunks])
+
+    def select(self, **metadata) -> List[int]:
+        """
+        Numbers of the runs with the given metadata values.
+
+        :param metadata: required values of the metadata
+        :return:
+        """
+        return [
+            entry["run"] for entry in self.runs if all(entry.get(key) == value for key, value in metadata.items())
+        ]
+
+    def get_histories(self, runs: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Histories of the runs as an array.
+
+        :param runs: numbers of the runs, all runs if None
+        :return: array of runs by epochs, NaN for the epochs not reached
+        """
+        runs = np.arange(len(self.runs)) if runs is None else np.asarray(runs, dtype=int)
+        records = self.get_records()
+        records = records[np.isin(records["run"], runs)]
+
+        n_epochs = int(records["epoch"].max()) + 1 if len(records) else 0
+        histories = np.full((len(runs), n_epochs), np.nan)
+        order = np.argsort(runs, kind="stable")
+        rows = order[np.searchsorted(runs[order], records["run"])]
+        histories[rows, records["epoch"]] = records["value"]
+        return histories
+
+    def aggregate(self, quantiles: Sequence[float] = QUANTILES, **metadata) -> Dict:
+        """
+        Summary of the histories of the runs with the given metadata values for each epoch.
+
+        :param quantiles: quantiles to compute
+        :param metadata: required values of the metadata
+        :return: see aggregate
+        """
+        return aggregate(self.get_histories(self.select(**metadata)), quantiles)
+
+    def get_dmg_map(self, run: int) -> Optional[np.ndarray]:
+        """
+        Damage map of the solution of a run, memory mapped.
+
+        :param run: number of the run
+        :return: None if the run was stored without one
+        """
+        entry = self.runs[run]
+        if "map_offset" not in entry:
+            return None
+        return np.memmap(
+            self.maps_path, dtype=np.dtype(entry["map_dtype"]), mode="r",
+            offset=entry["map_offset"], shape=tuple(entry["map_shape"])
+        )
@@ -0,0 +1,142 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Table of spawned enemies.
+"""
+import numpy as np
+from typing import Callable, Optional
+
+INITIAL_SIZE = 1024
+
+
+class SpawnTable:
+    def __init__(
+        self, enemy_spawning_function: Callable, stochastic: bool = False, dtype: np.dtype = np.dtype(float)
+    ) -> None:
+        """
+        Health of the enemies spawned in consecutive steps, computed once for the whole population
+        and extended when a simulation reaches later steps.
+
+        :param enemy_spawning_function: Function of time returning the amount of enemies spawned.
+        :param stochastic: whether the function is random, a new realization is then drawn on every reset
+        :param dtype: type of the health values
+        """
+        self.enemy_spawning_function = enemy_spawning_function
+        self.stochastic = stochastic
+        self.dtype = dtype
+        self.vectorized = None
+        self.values = np.zeros(0, dtype=dtype)
+        # Seed of the current realization of a stochastic function and the state of its generator
+        self.seed = None
+        self.random_state = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get(self, time: int) -> float:
+        """
+        Health of the enemies spawned in the given step.
+
+        :param time: step
+        :return:
+        """
+        if time >= len(self.values):
+            self.__extend(time + 1)
+        return self.values[time]
+
+    def get_range(self, time: int, n_steps: int) -> np.array:
+        """
+        Health of the enemies spawned in the given steps.
+
+        :param time: first step
+        :param n_steps: number of steps
+        :return: array, not to be modified
+        """
+        if time + n_steps > len(self.values):
+            self.__extend(time + n_steps)
+        return self.values[time:time + n_steps]
+
+    def reset(self, seed: Optional[int] = None) -> None:
+        """
+        Draw a new realization of a stochastic spawning function, the same for all the candidates until the next reset.
+
+        A realization is determined by its seed only, so that it can be recreated in other processes.
+
+        :param seed: seed of the realization, drawn from the global random generator if None
+        :return:
+        """
+        if self.stochastic:
+            self.values = np.zeros(0, dtype=self.dtype)
+            self.seed = int(np.random.randint(2 ** 31)) if seed is None else seed
+            self.random_state = None
+
+    def __extend(self, size: int) -> None:
+        """
+        Compute the table at least up to the given size, doubling its length.
+
+        :param size: required number of steps
+        :return:
+        """
+        times = np.arange(len(self.values), max(size, 2 * len(self.values), INITIAL_SIZE))
+        self.values = np.concatenate((self.values, self.__compute(times)))
+
+    def __compute(self, times: np.array) -> np.array:
+        """
+        Call the spawning function on whole array of steps if it supports it, step by step otherwise.
+
+        :param times: steps
+        :return:
+        """
+        if self.stochastic:
+            return self.__compute_realization(times)
+
+        if self.vectorized is None:
+            self.vectorized = self.__check_vectorized(times)
+
+        if self.vectorized:
+            return np.asarray(self.enemy_spawning_function(times), dtype=self.dtype)
+
+        return np.array([self.enemy_spawning_function(int(time)) for time in times], dtype=self.dtype)
+
+    def __compute_realization(self, times: np.array) -> np.array:
+        """
+        Call a stochastic spawning function step by step with the generator of the realization in place of the global
+        one, so that the values do not depend on the random numbers drawn in between.
+
+        :param times: steps
+        :return:
+        """
+        if self.seed is None:
+            self.seed = int(np.random.randint(2 ** 31))
+        if self.random_state is None:
+            self.random_state = np.random.RandomState(self.seed).get_state()
+
+        global_state = np.random.get_state()
+        np.random.set_state(self.random_state)
+        try:
+            return np.array([self.enemy_spawning_function(int(time)) for time in times], dtype=self.dtype)
+        finally:
+            self.random_state = np.random.get_state()
+            np.random.set_state(global_state)
+
+    def __check_vectorized(self, times: np.array) -> bool:
+        """
+        Check if the spawning function accepts arrays of steps, giving the same values as step by step.
+
+        :param times: steps
+        :return:
+        """
+        sample = times[[0, -1]]
+        try:
+            values = np.asarray(self.enemy_spawning_function(sample), dtype=float)
+        except (TypeError, ValueError):
+            return False
+
+        if values.shape != sample.shape:
+            return False
+
+        return all(
+            value == self.enemy_spawning_function(int(time)) for value, time in zip(values, sample)
+        )
@@ -0,0 +1,113 @@
+# BO 2021
+# Authors: Łukasz Kita, Mateusz Pawłowicz, Michał Szczepaniak, Marcin Zięba
+"""
+Tower Defence Solver.
+
+Per epoch records of solving.
+"""
+import json
+import numpy as np
+from typing import List, Dict, Callable, Optional, NamedTuple
+
+
+class EpochRecord(NamedTuple):
+    """
+    Summary of a finished epoch.
+    """
+    epoch: int
+    threshold_time: int
+    all_time_high: int
+    min_time: int
+    median_time: float
+    mean_time: float
+    max_time: int
+    population_size: int
+    elapsed: float
+    # Purchases list of the best candidate found so far
+    best_genome: Optional[np.ndarray] = None
+    # Function returning the best candidate found so far, simulated on the first call (shared with the solver)
+    get_best_candidate: Optional[Callable[[], object]] = None
+
+    @property
+    def best_candidate(self) -> Optional[object]:
+        """
+        Best candidate found so far, simulated on the first access if the archive holds its purchases list only.
+
+        :return:
+        """
+        return self.get_best_candidate() if self.get_best_candidate is not None else None
+
+    def to_dict(self) -> Dict:
+        """
+        Record without the best candidate, serializable to JSON.
+
+        :return:
+        """
+        record = self._asdict()
+        del record["best_genome"], record["get_best_candidate"]
+        return record
+
+
+def get_epoch_record(
+    epoch: int,
+    threshold_time: int,
+    all_time_high: int,
+    survival_times: List[int],
+    population_size: int,
+    elapsed: float,
+    best_genome: Optional[np.ndarray] = None,
+    get_best_candidate: Optional[Callable[[], object]] = None
+) -> EpochRecord:
+    """
+    Record of an epoch with the distribution of survival times of the survivors summarized.
+
+    :param epoch: number of the epoch
+    :param threshold_time: time at which the elimination has finished
+    :param all_time_high: longest survival time so far
+    :param survival_times: survival times of the survivors of the epoch
+    :param population_size: number of candidates simulated in the epoch
+    :param elapsed: seconds since the start of solving
+    :param best_genome: purchases list of the best candidate found so far
+    :param get_best_candidate: function returning the best candidate found so far
+    :return:
+    """
+    times = np.array(survival_times)
+    return EpochRecord(
+        epoch=epoch,
+        threshold_time=int(threshold_time),
+        all_time_high=int(all_time_high),
+        min_time=int(times.min()),
+        median_time=float(np.median(times)),
+        mean_time=float(times.mean()),
+        max_time=int(times.max()),
+        population_size=population_size,
+        elapsed=elapsed,
+        best_genome=best_genome,
+        get_best_candidate=get_best_candidate
+    )
+
+
+def log_epoch(record: EpochRecord) -> None:
+    """
+    Print the progress line of an epoch.
+
+    :param record: record of the epoch
+    :return:
+    """
+    print("[{: 4}] Threshold time: {: 6}    |    All time high: {: 6}".format(
+        record.epoch, record.threshold_time, record.all_time_high
+    ))
+
+
+class JsonLinesLog:
+    def __init__(self, path: str) -> None:
+        """
+        Callback appending the records of epochs to a file, one JSON object per line.
+
+        :param path: path of the file
+        """
+        self.path = path
+
+    def __call__(self, record: EpochRecord) -> None:
+        with open(self.path, mode="a") as file:
+            file.write(json.dumps(record.to_dict()) + "\n")
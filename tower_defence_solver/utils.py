@@ -7,7 +7,8 @@ Utilities.
 """
 import numpy as np
 from tower_defence_solver import TowerDefenceSolver, utils
-from typing import List, Tuple, Dict, Optional
+from tower_defence_solver.genome import Genome, get_purchase, get_occupancy
+from typing import List, Tuple, Dict, Set, Optional
 
 Purchases = List[Dict]
 
@@ -41,13 +42,13 @@ def choose_random_tower(towers: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
     return towers[np.random.choice(len(towers))]
 
 
-def validate_pos(game: TowerDefenceSolver, position: Tuple[int, int], purchases_list: Purchases) -> bool:
+def validate_pos(game: TowerDefenceSolver, position: Tuple[int, int], occupancy: Set[Tuple[int, int]]) -> bool:
     """
     Checks if the given position is inside the map and is not occupied by some tower
 
     :param game: Instance of tower defence emulator
     :param position: tuple of indexes indicating the position on map
-    :param purchases_list: list of purchases
+    :param occupancy: cells occupied by the planned towers
     :return: True if the place is not occupied and is inside the map, False otherwise
     """
     if (
@@ -55,44 +56,49 @@ def validate_pos(game: TowerDefenceSolver, position: Tuple[int, int], purchases_
             or position[1] < 0
             or position[0] >= game.map_height
             or position[1] >= game.map_width
-            or position in game.path
+            or game.path_mask[position]
     ):
         return False
 
-    for purchase in purchases_list:
-        if purchase["coords"] == position:
-            return False
-
-    return True
+    return position not in occupancy
 
 
 def get_random_position_near_path(
         game: TowerDefenceSolver,
         cov_xx: int,
         cov_yy: int,
-        purchased_towers: Purchases,
+        purchased_towers: Genome,
         max_number_of_tries: Optional[int] = None,
+        tower_type: Optional[int] = None,
 ) -> Optional[Tuple[int, int]]:
     """
     May require to increase cov_x and cov_y as function retries to find free space
     or introduce max random attempts (because if whole map is filled with towers
-    this function will attempt to find position for eternity)
+    this function will attempt to find position for eternity).
+    With the 'coverage' placement the position is drawn by the game's placement sampler instead,
+    None is returned then only if no free cell reaches the path.
 
     :param game:
     :param cov_xx:
     :param cov_yy:
     :param purchased_towers:
     :param max_number_of_tries:
+    :param tower_type: type of the tower to be placed, None if not known yet
     :return:
     """
+    if game.placement_sampler is not None:
+        positions = game.placement_sampler.sample(tower_type, get_occupancy(purchased_towers))
+        return positions[0] if positions else None
+
     position = tuple(
         np.round(
             np.random.multivariate_normal(game.path[np.random.choice(len(game.path))], cov=[[cov_xx, 0], [0, cov_yy]])
         ).astype(int)
     )
 
+    occupancy = get_occupancy(purchased_towers)
     number_of_tries = 0
-    while not validate_pos(game, position, purchased_towers):
+    while not validate_pos(game, position, occupancy):
         position = tuple(
             np.round(
                 np.random.multivariate_normal(
@@ -116,71 +122,102 @@ def get_dmg_patch(game: TowerDefenceSolver, coords: Tuple[int, int], tower_type:
     :param tower_type: integer indicating the tower type (order in game.tower_types list)
     :return: array describing the additional damage taken by a tower of the specified type placed on some coordinates
     """
-    # Prepare damage adjustment to add
-    patch = game.tower_types[tower_type]["dmg"]
-    additional_dmg = np.zeros((game.map_height, game.map_width))
+    footprint = game.influence_index.get_footprint(coords, tower_type)
+    additional_dmg = np.zeros((game.map_height, game.map_width), dtype=game.dtype)
+    additional_dmg.flat[footprint.flat_indices] = footprint.dmg
 
-    row, col = coords
-    radius_row, radius_col = patch.shape[0] // 2, patch.shape[1] // 2
+    return additional_dmg
 
-    for i in range(-radius_col, radius_col + 1):
-        if not (0 <= col + i < game.map_width):
-            continue
 
-        for j in range(-radius_row, radius_row + 1):
-            if not (0 <= row + j < game.map_height):
-                continue
+def get_path_dmg_patch(game: TowerDefenceSolver, coords: Tuple[int, int], tower_type: int) -> np.array:
+    """
+    Returns a vector of additional damage taken on each cell of the path by a tower of given type,
+    placed on a given position
 
-            additional_dmg[row + j, col + i] = patch[radius_col + i, radius_row + j]
+    :param game: instance of tower defence emulator
+    :param coords: position where the tower will be placed
+    :param tower_type: integer indicating the tower type (order in game.tower_types list)
+    :return: array indexed by position on the path, describing the additional damage taken
+    """
+    footprint = game.influence_index.get_footprint(coords, tower_type)
+    additional_dmg = np.zeros(len(game.path), dtype=game.dtype)
+    additional_dmg[footprint.path_indices] = footprint.path_dmg
 
-    return additional_dmg / 2
+    return additional_dmg
 
 
-def get_random_purchase(game: TowerDefenceSolver, purchases: Purchases, time: int) -> Dict:
+def add_tower_dmg(game: TowerDefenceSolver, dmg: np.array, coords: Tuple[int, int], tower_type: int) -> None:
     """
+    Adds damage taken by a tower of given type, placed on a given position, only on the cells it covers
+
     :param game: instance of tower defence emulator
-    :param purchases: list of towers planned to be bought
-    :param time: earliest time possible of purchase
+    :param dmg: full damage map for the 'map' engine, damage vector along the path for the path-space engines
+    :param coords: position where the tower will be placed
+    :param tower_type: integer indicating the tower type (order in game.tower_types list)
     :return:
     """
-    # Random tower type, position and time in future base on variable 'time'
-    purchase = {"type": np.random.choice(len(game.tower_types))}
-    dmg_height, dmg_width = game.tower_types[purchase["type"]]["dmg"].shape
-    purchase["coords"] = utils.get_random_position_near_path(
-        game=game,
-        cov_xx=dmg_width // 2,
-        cov_yy=dmg_height // 2,
-        purchased_towers=purchases
-    )
-    purchase["time"] = time + utils.get_random_purchase_time(0.3)
-    return purchase
+    footprint = game.influence_index.get_footprint(coords, tower_type)
+    if game.engine != "map":
+        dmg[footprint.path_indices] += footprint.path_dmg
+    else:
+        dmg.flat[footprint.flat_indices] += footprint.dmg
 
 
-def find_tower_on_this_spot(spot: Tuple[int, int], bought_towers: Purchases):
+def subtract_tower_dmg(game: TowerDefenceSolver, dmg: np.array, coords: Tuple[int, int], tower_type: int) -> None:
     """
-    :param spot: spot to check
-    :param bought_towers: list of already done purchases
+    Subtracts damage taken by a tower of given type, placed on a given position, only on the cells it covers
+
+    :param game: instance of tower defence emulator
+    :param dmg: full damage map for the 'map' engine, damage vector along the path for the path-space engines
+    :param coords: position where the tower was placed
+    :param tower_type: integer indicating the tower type (order in game.tower_types list)
     :return:
     """
-    for tower in bought_towers:
-        if tower["coords"] == spot:
-            return tower
-    return None
+    footprint = game.influence_index.get_footprint(coords, tower_type)
+    if game.engine != "map":
+        dmg[footprint.path_indices] -= footprint.path_dmg
+    else:
+        dmg.flat[footprint.flat_indices] -= footprint.dmg
+
+
+def get_random_purchase(
+        game: TowerDefenceSolver, genome: Genome, time: int
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    :param game: instance of tower defence emulator
+    :param genome: towers planned to be bought
+    :param time: earliest time possible of purchase
+    :return: purchase assignable to a genome element, None if there is no free position for the tower
+    """
+    # Random tower type, position and time in future base on variable 'time'
+    tower_type = np.random.choice(len(game.tower_types))
+    dmg_height, dmg_width = game.tower_types[tower_type]["dmg"].shape
+    coords = utils.get_random_position_near_path(
+        game=game,
+        cov_xx=dmg_width // 2,
+        cov_yy=dmg_height // 2,
+        purchased_towers=genome,
+        tower_type=tower_type
+    )
+    if coords is None:
+        return None
+    return get_purchase(time + utils.get_random_purchase_time(0.3), coords, tower_type)
 
 
 def check_for_tower_rebuy(game: TowerDefenceSolver,
                           purchase: Dict,
-                          bought_towers: Purchases,
+                          towers: Dict[Tuple[int, int], int],
                           dmg_patch: np.array):
     """
     :param game: instance of tower defence emulator
     :param purchase: purchase to check for rebuy
-    :param bought_towers: list of already done purchases
-    :param dmg_patch: array representing damage done by towers
+    :param towers: type of the first tower bought on each occupied spot, the purchase is registered in it
+    :param dmg_patch: array representing damage done by towers (in the layout of the game's engine)
     :return:
     """
     spot = purchase["coords"]
-    prior_tower = find_tower_on_this_spot(spot, bought_towers)
-    if prior_tower:
+    prior_type = towers.get(spot)
+    if prior_type is not None:
         # If there is a tower on the spot, we remove it so we can place a new tower
-        dmg_patch -= get_dmg_patch(game, spot, prior_tower["type"])
+        subtract_tower_dmg(game, dmg_patch, spot, prior_type)
+    towers.setdefault(spot, purchase["type"])